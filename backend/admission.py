@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+重量级导出接口的准入控制
+- 每个导出接口一条独立通道：同时执行的请求数有上限，超出的请求进入有界等待队列（先到先得）
+- 等待队列已满或排队超时时直接拒绝，由调用方返回503并附带Retry-After
+- 队列深度、执行中请求数、排队耗时、拒绝次数以Prometheus指标暴露
+
+/health、/api/analyze等轻量接口不经过准入控制。请求在读取请求体之前排队，排队中的请求不占用文件内存
+
+配置：
+- XMIND_EXPORT_MAX_IN_FLIGHT: 每个导出接口同时执行的请求数（默认2）
+- XMIND_EXPORT_MAX_QUEUE: 每个导出接口的等待队列长度（默认8）
+- XMIND_EXPORT_QUEUE_TIMEOUT: 最长排队时间，秒（默认30，0为不限）
+- XMIND_EXPORT_RETRY_AFTER: 拒绝时Retry-After响应头的秒数（默认5）
+- XMIND_ADMISSION_LIMITS: 按接口覆盖上限，格式为"/api/export-bundle=1:4,/api/batch-export=1:2"（执行数:队列长度）
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 需要准入控制的重量级导出接口（路由模版）
+HEAVY_ENDPOINTS = (
+    "/api/export",
+    "/api/export-xmind",
+    "/api/export-template",
+    "/api/export-hierarchical",
+    "/api/export-enhanced-hierarchical",
+    "/api/export-bundle",
+    "/api/batch-export",
+)
+
+admission_queue_depth = metrics.registry.gauge(
+    "xmind_admission_queue_depth",
+    "Number of export requests waiting for an execution slot"
+)
+admission_in_flight = metrics.registry.gauge(
+    "xmind_admission_in_flight",
+    "Number of export requests currently executing"
+)
+admission_wait = metrics.registry.histogram(
+    "xmind_admission_wait_seconds",
+    "Time export requests spent waiting for an execution slot"
+)
+admission_rejected = metrics.registry.counter(
+    "xmind_admission_rejected_total",
+    "Number of export requests rejected by admission control"
+)
+
+
+class AdmissionRejectedError(Exception):
+    """请求未获准执行（队列已满或排队超时）"""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{endpoint} 当前导出请求过多（{reason}），请 {retry_after} 秒后重试")
+
+
+class AdmissionLane:
+    """
+    单个接口的准入通道
+    只在事件循环线程中使用，计数不需要加锁
+    """
+
+    def __init__(self, endpoint: str, max_in_flight: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.endpoint = endpoint
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _publish(self):
+        admission_queue_depth.set(len(self._waiters), endpoint=self.endpoint)
+        admission_in_flight.set(self.in_flight, endpoint=self.endpoint)
+
+    def _reject(self, reason: str) -> AdmissionRejectedError:
+        admission_rejected.inc(endpoint=self.endpoint, reason=reason)
+        logger.warning(f"准入控制拒绝请求: {self.endpoint} ({reason}), 执行中 {self.in_flight}, 排队 {len(self._waiters)}")
+        return AdmissionRejectedError(self.endpoint, reason, self.retry_after)
+
+    async def acquire(self):
+        """获取执行名额，必要时排队；队列已满或超时抛出AdmissionRejectedError"""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            admission_wait.observe(0.0, endpoint=self.endpoint)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        started = time.perf_counter()
+        try:
+            # 不使用wait_for，避免超时与名额移交同时发生时丢失名额
+            await asyncio.wait({waiter}, timeout=self.queue_timeout if self.queue_timeout > 0 else None)
+        except asyncio.CancelledError:
+            # 客户端断开：已移交的名额归还，未移交的从队列中移除
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            admission_wait.observe(time.perf_counter() - started, endpoint=self.endpoint)
+
+        if not waiter.done():
+            self._discard(waiter)
+            raise self._reject("timeout")
+
+    def _discard(self, waiter: asyncio.Future):
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._publish()
+
+    def release(self):
+        """归还执行名额，直接移交给队首的等待者"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters)
+        }
+
+
+class AdmissionController:
+    """按接口划分通道的准入控制器"""
+
+    def __init__(self, endpoints: Tuple[str, ...] = HEAVY_ENDPOINTS):
+        max_in_flight = int(os.getenv("XMIND_EXPORT_MAX_IN_FLIGHT", 2))
+        max_queue = int(os.getenv("XMIND_EXPORT_MAX_QUEUE", 8))
+        queue_timeout = float(os.getenv("XMIND_EXPORT_QUEUE_TIMEOUT", 30))
+        retry_after = int(os.getenv("XMIND_EXPORT_RETRY_AFTER", 5))
+        overrides = self._parse_overrides(os.getenv("XMIND_ADMISSION_LIMITS", ""))
+
+        self._lanes: Dict[str, AdmissionLane] = {}
+        for endpoint in endpoints:
+            lane_in_flight, lane_queue = overrides.get(endpoint, (max_in_flight, max_queue))
+            self._lanes[endpoint] = AdmissionLane(endpoint, lane_in_flight, lane_queue, queue_timeout, retry_after)
+
+    @staticmethod
+    def _parse_overrides(value: str) -> Dict[str, Tuple[int, int]]:
+        """解析XMIND_ADMISSION_LIMITS，格式错误的条目记录警告后忽略"""
+        overrides: Dict[str, Tuple[int, int]] = {}
+        for item in filter(None, (part.strip() for part in value.split(","))):
+            try:
+                endpoint, limits = item.split("=", 1)
+                in_flight, queue = limits.split(":", 1)
+                overrides[endpoint.strip()] = (int(in_flight), int(queue))
+            except ValueError:
+                logger.warning(f"忽略格式错误的准入控制配置: {item}")
+        return overrides
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str) -> AsyncIterator[None]:
+        """在代码块内占用接口的执行名额，不受准入控制的接口直接执行"""
+        lane = self._lanes.get(endpoint)
+        if lane is None:
+            yield
+            return
+        await lane.acquire()
+        try:
+            yield
+        finally:
+            lane.release()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint: lane.stats() for endpoint, lane in self._lanes.items()}
+
+
+# 创建全局实例
+admission_controller = AdmissionController()
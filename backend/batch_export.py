@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+批量导出
+一次请求处理多个XMind文件（multipart多文件或zip压缩包），
+每个文件作为独立任务派发到工作进程，最终打包为一个zip并附带manifest.json
+"""
+
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import export_pipeline
+from upload_ingest import upload_ingestor, UploadRejectedError
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+# 单个批次的文件数上限（zip展开后计算）
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 50))
+
+
+class BatchTooLargeError(ValueError):
+    """批次中的文件数超过上限"""
+
+    def __init__(self, count: int, limit: Optional[int] = None):
+        self.count = count
+        self.limit = limit if limit is not None else MAX_BATCH_FILES
+        super().__init__(f"批量导出的文件过多（{count} > {self.limit}）")
+
+
+def parse_list_field(value: str) -> List[str]:
+    """
+    解析表单中的列表字段
+    支持JSON数组（["a", "b"]）和逗号分隔（a,b）两种写法
+    """
+    value = (value or "").strip()
+    if not value:
+        return []
+    if value.startswith("["):
+        items = json.loads(value)
+        if not isinstance(items, list):
+            raise ValueError("列表字段必须是JSON数组")
+        return [str(item).strip() for item in items if str(item).strip()]
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, bytes]], List[Dict[str, Any]]]:
+    """
+    展开上传内容为(文件名, XMind字节)列表
+    .zip文件中的所有.xmind成员会被展开，同名文件自动追加序号；
+    展开的成员与直接上传的文件一样检查大小上限，并校验其zip结构（成员数、解压后大小、压缩比），
+    未通过校验的成员记录为失败而不解析
+
+    Args:
+        uploads: (上传文件名, 文件字节)列表
+
+    Returns:
+        ((文件名, XMind字节)列表, 未通过校验的成员的失败记录)
+
+    Raises:
+        BatchTooLargeError: 展开后的文件数超过MAX_BATCH_FILES
+    """
+    expanded: List[Tuple[str, bytes]] = []
+    rejected: List[Dict[str, Any]] = []
+    for filename, content in uploads:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(content), 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    member_name = os.path.basename(info.filename)
+                    if info.is_dir() or not member_name.lower().endswith(".xmind") or member_name.startswith("."):
+                        continue
+                    if len(expanded) + len(rejected) >= MAX_BATCH_FILES:
+                        raise BatchTooLargeError(len(expanded) + len(rejected) + 1)
+                    try:
+                        expanded.append((member_name, read_archive_member(zip_ref, info, member_name)))
+                    except UploadRejectedError as e:
+                        logger.warning(f"拒绝压缩包成员: {str(e)}")
+                        rejected.append(failed_report(member_name, info.file_size, str(e)))
+        else:
+            expanded.append((os.path.basename(filename) or "untitled.xmind", content))
+    if len(expanded) + len(rejected) > MAX_BATCH_FILES:
+        raise BatchTooLargeError(len(expanded) + len(rejected))
+
+    # 同名文件追加序号，避免结果目录冲突
+    seen: Dict[str, int] = {}
+    result = []
+    for filename, content in expanded:
+        count = seen.get(filename, 0)
+        seen[filename] = count + 1
+        if count:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{count + 1}{ext}"
+        result.append((filename, content))
+    return result, rejected
+
+
+def read_archive_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, member_name: str) -> bytes:
+    """读取压缩包中的.xmind成员，按上传文件的规则校验大小和zip结构"""
+    if info.file_size > upload_ingestor.max_upload_bytes:
+        raise UploadRejectedError(
+            f"文件 {member_name} 超过大小上限 {upload_ingestor.max_upload_bytes:,} bytes",
+            status_code=413
+        )
+    content = zip_ref.read(info)
+    upload_ingestor.validate_archive(io.BytesIO(content), member_name, require_xmind=True)
+    return content
+
+
+def failed_report(filename: str, size: int, error: str, markers: List[str] = None) -> Dict[str, Any]:
+    """未能导出的文件在manifest中的记录"""
+    return {
+        "filename": filename,
+        "size": size,
+        "status": "failed",
+        "markers": markers or [],
+        "outputs": {},
+        "error": error
+    }
+
+
+def export_file(filename: str, file_content: bytes, selected_markers: List[str], formats: List[str]) -> Dict[str, Any]:
+    """
+    批量导出中单个文件的处理任务（在工作进程中执行）
+    未指定标识符时使用该文件中识别到的全部标识符
+
+    Returns:
+        包含status、markers、各格式导出结果（outputs）及耗时的字典
+    """
+    started = time.perf_counter()
+    report: Dict[str, Any] = {
+        "filename": filename,
+        "size": len(file_content),
+        "status": "succeeded",
+        "markers": selected_markers,
+        "outputs": {},
+        "error": None
+    }
+
+    try:
+        if not selected_markers:
+            analysis = export_pipeline.analyze_xmind(file_content, filename)
+            report["markers"] = [marker['markerId'] for marker in analysis['markers_found']]
+            if not report["markers"]:
+                raise ValueError("文件中没有识别到任何标识符")
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = str(e)
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        return report
+
+    # 单次解析生成所有格式，过滤和用例构建在各格式间共享
+    results = export_pipeline.run_bundle_export(formats, report["markers"], file_content)
+    for export_format, result in results.items():
+        if 'error' in result:
+            report["status"] = "partial"
+            report["outputs"][export_format] = {
+                "status": "failed",
+                "error": result['error'],
+                "seconds": result['seconds']
+            }
+        else:
+            report["outputs"][export_format] = {
+                "status": "succeeded",
+                "filename": result['filename'],
+                "content": result['content'],
+                "size": len(result['content']),
+                "cache_hit": result['cache_hit'],
+                "seconds": result['seconds']
+            }
+
+    if report["outputs"] and all(output["status"] == "failed" for output in report["outputs"].values()):
+        report["status"] = "failed"
+        report["error"] = "所有格式导出均失败"
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def build_batch_zip(reports: List[Dict[str, Any]], selected_markers: List[str], formats: List[str], total_seconds: float) -> bytes:
+    """
+    将各文件的导出结果打包为zip
+    每个源文件对应一个目录，根目录下的manifest.json记录耗时和失败信息
+    """
+    buffer = io.BytesIO()
+    manifest_files = []
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+        for report in reports:
+            folder = os.path.splitext(report["filename"])[0]
+            outputs = {}
+            for export_format, output in report["outputs"].items():
+                entry = {key: value for key, value in output.items() if key != "content"}
+                if output["status"] == "succeeded":
+                    entry["path"] = f"{folder}/{output['filename']}"
+                    zip_out.writestr(entry["path"], output["content"])
+                outputs[export_format] = entry
+
+            manifest_files.append({
+                "filename": report["filename"],
+                "size": report["size"],
+                "status": report["status"],
+                "markers": report["markers"],
+                "seconds": report.get("seconds"),
+                "error": report["error"],
+                "outputs": outputs
+            })
+
+        manifest = {
+            "generated_at": datetime.now().isoformat(),
+            "selected_markers": selected_markers,
+            "formats": formats,
+            "total_files": len(reports),
+            "succeeded": sum(1 for report in reports if report["status"] == "succeeded"),
+            "partial": sum(1 for report in reports if report["status"] == "partial"),
+            "failed": sum(1 for report in reports if report["status"] == "failed"),
+            "total_seconds": round(total_seconds, 3),
+            "files": manifest_files
+        }
+        zip_out.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    return buffer.getvalue()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+导出流水线取消
+客户端断开连接或请求超过截止时间后，正在执行的导出应尽快停止，把工作线程还给其他请求
+- 每个导出请求一个取消令牌，通过contextvars传递到执行器的工作线程
+- 过滤、节点提取、用例构建、写表等逐节点/逐行循环中调用check_cancelled，令牌已取消时抛出ExportCancelledError
+- 未注册令牌时check_cancelled只有一次上下文变量读取
+
+进程池中执行的阶段看不到令牌，只能在阶段之间取消
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# 导出请求的截止时间（秒，0为不限）及客户端断开检测间隔
+EXPORT_DEADLINE = float(os.getenv("XMIND_EXPORT_DEADLINE", 300))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("XMIND_DISCONNECT_POLL_INTERVAL", 0.5))
+
+# 取消原因及对应的HTTP状态码（499为客户端关闭连接，沿用nginx的约定）
+CLIENT_DISCONNECTED = "client_disconnected"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+CANCEL_STATUS_CODES = {
+    CLIENT_DISCONNECTED: 499,
+    DEADLINE_EXCEEDED: 504
+}
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("xmind_cancellation_token", default=None)
+
+
+class ExportCancelledError(Exception):
+    """导出已被取消"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.status_code = CANCEL_STATUS_CODES.get(reason, 503)
+        message = "客户端已断开连接，导出已取消" if reason == CLIENT_DISCONNECTED else "导出超过截止时间，已取消"
+        super().__init__(message)
+
+
+class CancellationToken:
+    """单个请求的取消令牌（可在任意线程中检查）"""
+
+    def __init__(self, deadline: float = 0):
+        self.deadline = time.monotonic() + deadline if deadline > 0 else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str):
+        """取消令牌，只记录第一次的原因"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    def check(self):
+        """令牌已取消时抛出ExportCancelledError"""
+        if self.cancelled:
+            raise ExportCancelledError(self.reason)
+
+
+def check_cancelled():
+    """检查当前上下文的取消令牌，未注册令牌时忽略"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """在代码块内注册取消令牌，期间派发到执行器的阶段都会检查该令牌"""
+    context_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(context_token)
+
+
+async def watch_disconnect(request: Any, token: CancellationToken, interval: float = DISCONNECT_POLL_INTERVAL):
+    """
+    定期检查客户端是否断开连接，断开或超过截止时间后取消令牌
+    应在请求体读取完成后启动，is_disconnected为非阻塞检查，不影响其他接收者
+    """
+    while not token.cancelled:
+        if await request.is_disconnected():
+            logger.warning(f"客户端已断开连接，取消导出: {request.url.path}")
+            token.cancel(CLIENT_DISCONNECTED)
+            return
+        await asyncio.sleep(interval)
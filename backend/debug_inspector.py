@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+XMind调试检查器（/api/debug/analyze）
+分页输出节点的原始字段，便于排查标识符识别问题
+- offset/limit分页，max_depth限制遍历深度，fields选择输出字段
+- 节点逐个遍历并直接写入响应流，不保存全量节点列表；原始数据只输出节点自身字段，不含子树
+- 标识符统计在同一次遍历中累加，示例数有上限
+
+内存占用只与页大小和标识符种类数有关（解析后的字典结构本身仍由解析缓存持有）
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 单页最多输出的节点数
+MAX_PAGE_SIZE = int(os.getenv("XMIND_DEBUG_MAX_LIMIT", 500))
+
+# 可选的输出字段
+NODE_FIELDS = ("sheet", "path", "title", "level", "markers", "id", "labels", "note", "link", "image", "children_count", "raw")
+DEFAULT_FIELDS = ("path", "title", "level", "markers")
+
+# 没有markers字段时检查的其他可能的标识符字段
+POSSIBLE_MARKER_FIELDS = ('marker', 'flag', 'icon', 'symbol', 'priority', 'labels', 'tags')
+
+# 标识符统计中每种标识符保留的示例数及总的标识符样本数
+MARKER_EXAMPLES = 3
+MARKER_SAMPLES = 20
+
+SUPPORTED_MARKERS = [
+    {"id": "important", "name": "重要 (红色叹号)"},
+    {"id": "priority-1", "name": "优先级1 (红色1)"},
+    {"id": "priority-2", "name": "优先级2 (橙色2)"},
+    {"id": "priority-3", "name": "优先级3 (黄色3)"},
+    {"id": "priority-4", "name": "优先级4 (绿色4)"},
+    {"id": "priority-5", "name": "优先级5 (灰色5)"},
+    {"id": "flag-red", "name": "红旗"},
+    {"id": "flag-yellow", "name": "黄旗"},
+    {"id": "star-red", "name": "红星"},
+    {"id": "star-yellow", "name": "黄星"}
+]
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """
+    解析逗号分隔的字段列表
+
+    Raises:
+        ValueError: 包含不支持的字段
+    """
+    if not fields:
+        return DEFAULT_FIELDS
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in NODE_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}，可选: {', '.join(NODE_FIELDS)}")
+    return selected or DEFAULT_FIELDS
+
+
+def iter_topics(xmind_data: List[Dict], max_depth: Optional[int] = None) -> Iterator[Tuple[int, str, str, int, Dict]]:
+    """
+    按先序遍历所有工作表的节点（显式栈，不递归）
+    没有标题的节点及其子树跳过
+
+    Yields:
+        (工作表序号, 节点路径, 标题, 层级, 原始节点)
+    """
+    for sheet_index, sheet in enumerate(xmind_data):
+        stack = [(sheet.get('topic', {}), "", 1)]
+        while stack:
+            topic, parent_path, level = stack.pop()
+            if not isinstance(topic, dict):
+                continue
+            title = topic.get('title', '').strip()
+            if not title:
+                continue
+            path = f"{parent_path} > {title}" if parent_path else title
+            yield sheet_index, path, title, level, topic
+
+            if max_depth is None or level < max_depth:
+                subtopics = topic.get('topics') or []
+                for subtopic in reversed(subtopics):
+                    stack.append((subtopic, path, level + 1))
+
+
+def project_topic(topic: Dict, sheet_index: int, path: str, title: str, level: int, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """按字段列表输出节点信息，raw只包含节点自身字段（子节点替换为数量）"""
+    node: Dict[str, Any] = {}
+    for field in fields:
+        if field == "sheet":
+            node["sheet"] = sheet_index
+        elif field == "path":
+            node["path"] = path
+        elif field == "title":
+            node["title"] = title
+        elif field == "level":
+            node["level"] = level
+        elif field == "children_count":
+            node["children_count"] = len(topic.get('topics') or [])
+        elif field == "raw":
+            node["raw"] = {key: value for key, value in topic.items() if key != 'topics'}
+        else:
+            node[field] = topic.get(field)
+    return node
+
+
+class MarkerSummary:
+    """标识符统计（种类、数量、示例），示例和样本数有上限"""
+
+    def __init__(self):
+        self.total_markers = 0
+        self.marker_types: Dict[str, Dict[str, Any]] = {}
+        self.samples: List[Dict[str, Any]] = []
+
+    def add(self, marker: Any, title: str, path: str, level: int):
+        self.total_markers += 1
+        if len(self.samples) < MARKER_SAMPLES:
+            self.samples.append({"node_path": path, "node_title": title, "node_level": level, "raw_marker": marker})
+
+        if isinstance(marker, dict):
+            marker_id = marker.get('markerId', 'unknown')
+            marker_type = marker.get('markerType', 'unknown')
+            marker_key = f"{marker_id}_{marker_type}" if marker_type != 'unknown' else marker_id
+        elif isinstance(marker, str):
+            marker_key = marker
+        else:
+            return
+
+        entry = self.marker_types.get(marker_key)
+        if entry is None:
+            entry = {"count": 0, "examples": [], "raw_data": marker}
+            self.marker_types[marker_key] = entry
+        entry["count"] += 1
+        if len(entry["examples"]) < MARKER_EXAMPLES:
+            entry["examples"].append(title)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def stream_inspection(
+    xmind_data: List[Dict],
+    filename: str,
+    offset: int,
+    limit: int,
+    max_depth: Optional[int],
+    fields: Tuple[str, ...]
+) -> Iterator[str]:
+    """
+    遍历节点并逐段输出JSON文档
+    nodes数组按页输出，summary在遍历结束后输出（统计范围为max_depth内的全部节点）
+    """
+    yield '{"filename": ' + _dumps(filename)
+    yield f', "offset": {offset}, "limit": {limit}, "max_depth": {_dumps(max_depth)}, "fields": {_dumps(list(fields))}'
+    yield ', "nodes": ['
+
+    summary = MarkerSummary()
+    node_count = 0
+    nodes_with_markers = 0
+    suspected_marker_fields = 0
+    end = offset + limit
+
+    for sheet_index, path, title, level, topic in iter_topics(xmind_data, max_depth):
+        if offset <= node_count < end:
+            prefix = "" if node_count == offset else ", "
+            yield prefix + _dumps(project_topic(topic, sheet_index, path, title, level, fields))
+        node_count += 1
+
+        markers = topic.get('markers') or []
+        if markers:
+            nodes_with_markers += 1
+            for marker in markers:
+                summary.add(marker, title, path, level)
+        elif any(topic.get(field) for field in POSSIBLE_MARKER_FIELDS):
+            suspected_marker_fields += 1
+
+    yield "]"
+    yield ', "next_offset": ' + _dumps(end if node_count > end else None)
+    yield ', "summary": ' + _dumps({
+        "sheets": len(xmind_data),
+        "total_nodes": node_count,
+        "nodes_with_markers": nodes_with_markers,
+        "nodes_with_suspected_marker_fields": suspected_marker_fields,
+        "total_markers": summary.total_markers,
+        "unique_marker_types": len(summary.marker_types),
+        "marker_types": summary.marker_types,
+        "marker_samples": summary.samples
+    })
+    yield ', "supported_markers": ' + _dumps(SUPPORTED_MARKERS) + "}"
+
+    logger.info(
+        "调试分析完成: %s, 节点=%s, 标识符=%s, 类型=%s",
+        filename, node_count, summary.total_markers, len(summary.marker_types)
+    )
@@ -4,14 +4,19 @@
 完全匹配《冒烟用例导出模版.xlsx》的合并和视觉效果
 """
 
+import io
 import logging
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, BinaryIO, Union
 from collections import defaultdict, OrderedDict
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 import copy
+from progress import report_stage, report_count
+from metrics import stage_timer, timed_stage
+from tracing import traced, span, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
 
 logger = logging.getLogger(__name__)
 
@@ -34,19 +39,21 @@ class EnhancedHierarchicalExporter:
         # 表头颜色（匹配模版）
         self.header_color = '4F81BD'  # 深蓝色表头
     
-    def export_with_enhanced_merge(self, test_cases_data: Dict[str, Any], output_path: str = None) -> str:
+    @traced()
+    def export_with_enhanced_merge(self, test_cases_data: Dict[str, Any], output_path: Union[str, BinaryIO, None] = None) -> Union[str, BinaryIO]:
         """
         增强版层级合并导出 - 优化空白节点处理
         
         Args:
             test_cases_data: 测试用例数据
-            output_path: 输出文件路径
+            output_path: 输出文件路径，也可以是可写的二进制文件对象
             
         Returns:
-            生成的文件路径
+            生成的文件路径（输出到文件对象时返回该对象）
         """
         try:
             logger.info("🚀 开始增强版层级合并导出Excel（含空白节点优化）...")
+            report_stage('render')
             
             test_cases = test_cases_data['smoke_test_suite']['test_cases']
             metadata = test_cases_data['smoke_test_suite']['metadata']
@@ -79,6 +86,7 @@ class EnhancedHierarchicalExporter:
             # 4. 按层级写入数据并智能合并
             current_row = 2
             total_rows = self._write_enhanced_hierarchical_data(ws_main, grouped_data, row_mappings, current_row)
+            set_attributes(test_cases=len(test_cases), groups=len(grouped_data), rows=total_rows - current_row)
             
             # 5. 设置精确的列宽和行高（匹配模版）
             self._set_precise_column_widths(ws_main, total_rows)
@@ -92,10 +100,14 @@ class EnhancedHierarchicalExporter:
                 timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
                 output_path = f"优化版层级合并_冒烟测试用例_{timestamp}.xlsx"
             
-            wb.save(output_path)
+            check_cancelled()
+            report_stage('save')
+            with stage_timer('save', 'openpyxl'), span('Workbook.save'):
+                wb.save(output_path)
+            output_name = output_path if isinstance(output_path, str) else "内存缓冲区"
             
             # 8. 输出详细统计信息
-            logger.info(f"✅ 优化版层级合并Excel导出完成: {output_path}")
+            logger.info(f"✅ 优化版层级合并Excel导出完成: {output_name}")
             logger.info(f"   📊 原始用例: {optimization_stats['original_cases']} 个")
             logger.info(f"   ✨ 有效用例: {optimization_stats['valid_cases']} 个")
             logger.info(f"   🗑️  过滤无效: {optimization_stats['filtered_cases']} 个")
@@ -106,10 +118,18 @@ class EnhancedHierarchicalExporter:
             
             return output_path
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"❌ 增强版层级合并导出失败: {str(e)}")
             raise Exception(f"增强版层级合并导出失败: {str(e)}")
     
+    def export_to_bytes(self, test_cases_data: Dict[str, Any]) -> bytes:
+        """增强版层级合并导出Excel并直接返回文件字节（不落盘）"""
+        buffer = io.BytesIO()
+        self.export_with_enhanced_merge(test_cases_data, buffer)
+        return buffer.getvalue()
+    
     def _smart_group_data(self, test_cases: List[Dict]) -> Tuple[OrderedDict, List[Dict]]:
         """智能数据分组，确保完美的层级结构 - 增强版数据清理"""
         
@@ -344,9 +364,12 @@ class EnhancedHierarchicalExporter:
         current_row = start_row
         
         # 写入所有数据行
-        for row_info in row_mappings:
-            self._write_enhanced_single_row(ws, current_row, row_info)
-            current_row += 1
+        with stage_timer('write_sheet', 'openpyxl'):
+            for index, row_info in enumerate(row_mappings, 1):
+                check_cancelled()
+                report_count('write_rows', index, len(row_mappings))
+                self._write_enhanced_single_row(ws, current_row, row_info)
+                current_row += 1
         
         # 应用智能合并
         self._apply_enhanced_merges(ws, hierarchy, row_mappings, start_row)
@@ -402,6 +425,8 @@ class EnhancedHierarchicalExporter:
             cell.border = self._get_border()
             cell.font = Font(size=10)
     
+    @timed_stage('merge_cells', 'openpyxl')
+    @traced()
     def _apply_enhanced_merges(self, ws, hierarchy: OrderedDict, row_mappings: List[Dict], start_row: int):
         """应用增强的智能合并，精确匹配模版效果 - 优化空白处理"""
         
@@ -414,7 +439,7 @@ class EnhancedHierarchicalExporter:
             if self._is_valid_merge_region(region, ws):
                 valid_merge_regions.append(region)
             else:
-                logger.debug(f"跳过无效合并区域: {region}")
+                logger.debug("跳过无效合并区域: %s", region)
         
         # 应用合并
         merge_count = 0
@@ -427,14 +452,15 @@ class EnhancedHierarchicalExporter:
                     if self._validate_merge_range(ws, region):
                         ws.merge_cells(merge_range)
                         merge_count += 1
-                        logger.debug(f"成功合并区域: {merge_range} = '{region['value']}'")
+                        logger.debug("成功合并区域: %s = '%s'", merge_range, region['value'])
                     else:
                         logger.warning(f"合并范围验证失败，跳过: {merge_range}")
                         
             except Exception as e:
                 logger.warning(f"合并失败: {region} - {e}")
         
-        logger.info(f"完成智能合并：成功合并 {merge_count} 个区域")
+        logger.info("完成智能合并：成功合并 %s 个区域", merge_count)
+        set_attributes(regions=len(merge_regions), merges=merge_count)
     
     def _calculate_merge_regions_enhanced(self, hierarchy: OrderedDict, row_mappings: List[Dict], start_row: int) -> List[Dict]:
         """计算增强版精确合并区域 - 避免空白区域问题"""
@@ -543,7 +569,7 @@ class EnhancedHierarchicalExporter:
                 cell_value = ws.cell(row=row, column=column).value
                 if cell_value and str(cell_value).strip() != expected_value:
                     # 如果单元格有值但与期望值不一致，说明数据有问题
-                    logger.debug(f"合并验证失败：行{row}列{column}值为'{cell_value}'，期望'{expected_value}'")
+                    logger.debug("合并验证失败：行%s列%s值为'%s'，期望'%s'", row, column, cell_value, expected_value)
                     return False
             
             return True
@@ -563,7 +589,7 @@ class EnhancedHierarchicalExporter:
             
             # 如果没有相关映射或者映射数量与行数不匹配，可能有问题
             if len(relevant_mappings) != row_count:
-                logger.debug(f"数据一致性验证失败：期望{row_count}行，实际{len(relevant_mappings)}行映射")
+                logger.debug("数据一致性验证失败：期望%s行，实际%s行映射", row_count, len(relevant_mappings))
                 return False
             
             return True
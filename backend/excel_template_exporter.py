@@ -9,17 +9,23 @@ import base64
 import io
 import json
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, BinaryIO, Union
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
-import xmindparser
+from progress import report_stage, report_count
+from metrics import stage_timer
+from tracing import traced, span, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
 
 logger = logging.getLogger(__name__)
 
 class TemplateExcelExporter:
     """按照模版格式的Excel导出器"""
     
+    # 输出格式版本，修改输出内容时需递增，并同步export_pipeline中的identity（用于导出结果缓存失效）
+    VERSION = "1.0.0"
+    
     def __init__(self):
         # 优先级映射
         self.priority_mapping = {
@@ -64,19 +70,21 @@ class TemplateExcelExporter:
             '用户管理': '赵六'
         }
     
-    def export_with_template_format(self, exported_data: Dict[str, Any], output_path: str = None) -> str:
+    @traced()
+    def export_with_template_format(self, exported_data: Dict[str, Any], output_path: Union[str, BinaryIO, None] = None) -> Union[str, BinaryIO]:
         """
         按照模版格式导出Excel
         
         Args:
             exported_data: 从API导出的测试用例数据
-            output_path: 输出文件路径，如果为None则生成时间戳文件名
+            output_path: 输出文件路径，如果为None则生成时间戳文件名，也可以是可写的二进制文件对象
             
         Returns:
-            生成的文件路径
+            生成的文件路径（输出到文件对象时返回该对象）
         """
         try:
             logger.info("🚀 开始按照模版格式导出Excel...")
+            report_stage('render')
             
             # 解析测试用例数据
             test_cases = exported_data['smoke_test_suite']['test_cases']
@@ -95,8 +103,12 @@ class TemplateExcelExporter:
             headers = self._create_main_sheet_headers(ws_test)
             
             # 处理每个测试用例
-            for row_idx, test_case in enumerate(test_cases, 2):
-                self._write_test_case_row(ws_test, row_idx, test_case)
+            with stage_timer('write_sheet', 'openpyxl'):
+                for row_idx, test_case in enumerate(test_cases, 2):
+                    check_cancelled()
+                    report_count('write_rows', row_idx - 1, len(test_cases))
+                    self._write_test_case_row(ws_test, row_idx, test_case)
+            set_attributes(rows=len(test_cases))
             
             # 创建导出汇总工作表
             ws_summary = wb.create_sheet("导出汇总")
@@ -108,18 +120,30 @@ class TemplateExcelExporter:
                 output_path = f"冒烟测试用例_模版格式_{timestamp}.xlsx"
             
             # 保存文件
-            wb.save(output_path)
+            check_cancelled()
+            report_stage('save')
+            with stage_timer('save', 'openpyxl'), span('Workbook.save'):
+                wb.save(output_path)
+            output_name = output_path if isinstance(output_path, str) else "内存缓冲区"
             
-            logger.info(f"✅ Excel文件已生成: {output_path}")
+            logger.info(f"✅ Excel文件已生成: {output_name}")
             logger.info(f"   📊 包含 {len(test_cases)} 个测试用例")
             logger.info(f"   📝 格式完全符合模版规范")
             
             return output_path
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"❌ 按模版格式导出Excel失败: {str(e)}")
             raise Exception(f"模版格式导出失败: {str(e)}")
     
+    def export_to_bytes(self, exported_data: Dict[str, Any]) -> bytes:
+        """按照模版格式导出Excel并直接返回文件字节（不落盘）"""
+        buffer = io.BytesIO()
+        self.export_with_template_format(exported_data, buffer)
+        return buffer.getvalue()
+    
     def _write_test_case_row(self, ws, row_idx: int, test_case: Dict[str, Any]):
         """写入测试用例数据行，严格按照目标文件格式"""
         
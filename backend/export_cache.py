@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+导出结果缓存
+按（文件内容哈希, 排序后的标识符集合, 导出器名称及版本）缓存已生成的导出文件，
+重复导出时直接返回磁盘上的结果，无需重新构建用例和渲染Excel
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from shared_files import atomic_write, remove_quietly
+
+logger = logging.getLogger(__name__)
+
+
+class ExportResultCache:
+    """
+    基于磁盘的导出结果LRU缓存（总容量上限）
+
+    每个条目保存为两个文件：<key>.bin（导出文件字节）和<key>.json（文件名、媒体类型、统计信息）
+    多个进程可共享同一缓存目录，淘汰时容忍文件已被其他进程删除
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv(
+            "EXPORT_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "xmind-export-cache")
+        )
+        # 默认512MB，设置为0时禁用缓存
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("EXPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+        # key -> 条目大小，按最近使用顺序排列
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(file_hash: str, selected_markers: List[str], exporter: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            file_hash: 文件内容的SHA-256
+            selected_markers: 选中的标识符（顺序无关）
+            exporter: 导出器名称及版本
+        """
+        raw = json.dumps([file_hash, sorted(set(selected_markers)), exporter], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".bin", base + ".json"
+
+    def _load_index(self):
+        """首次使用时扫描缓存目录，按修改时间恢复LRU顺序"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            key = name[:-4]
+            bin_path, meta_path = self._paths(key)
+            if not os.path.exists(meta_path):
+                continue
+            try:
+                stat = os.stat(bin_path)
+                entries.append((stat.st_mtime, key, stat.st_size + os.path.getsize(meta_path)))
+            except OSError:
+                continue
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+        if entries:
+            logger.info(f"导出结果缓存已加载 {len(entries)} 个条目，共 {self._total_bytes:,} bytes")
+        self._evict_to_budget()
+
+    def _remove_files(self, key: str):
+        remove_quietly(*self._paths(key))
+
+    def _evict_to_budget(self):
+        """按LRU顺序淘汰直到总大小不超过上限（需持有锁）"""
+        while self._index and self._total_bytes > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_files(key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的导出结果
+
+        Returns:
+            包含content、filename、media_type、export_details的字典，未命中返回None
+        """
+        if not self.enabled:
+            return None
+
+        bin_path, meta_path = self._paths(key)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                with open(bin_path, 'rb') as f:
+                    result['content'] = f.read()
+                # 更新修改时间，重启后仍能恢复LRU顺序
+                os.utime(bin_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"导出结果缓存条目损坏，已丢弃: {key[:12]}..., {str(e)}")
+                self._total_bytes -= self._index.pop(key)
+                self._remove_files(key)
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, content: bytes, filename: str, media_type: str, export_details: Dict[str, Any]):
+        """保存导出结果，写入失败只记录日志不影响导出"""
+        if not self.enabled:
+            return
+
+        meta = json.dumps({
+            "filename": filename,
+            "media_type": media_type,
+            "export_details": export_details
+        }, ensure_ascii=False, default=str).encode('utf-8')
+        size = len(content) + len(meta)
+        if size > self.max_bytes:
+            return
+
+        bin_path, meta_path = self._paths(key)
+        with self._lock:
+            try:
+                self._load_index()
+                # 先写临时文件再替换，避免其他进程读到半写入的文件
+                atomic_write(bin_path, content)
+                atomic_write(meta_path, meta)
+            except OSError as e:
+                logger.warning(f"写入导出结果缓存失败: {str(e)}")
+                return
+
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = size
+            self._total_bytes += size
+            self._evict_to_budget()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove_files(key)
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "cache_dir": self.cache_dir,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# 创建全局实例
+export_result_cache = ExportResultCache()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+异步导出任务管理
+大文件导出提交为后台任务后立即返回job_id，客户端轮询或订阅（SSE/WebSocket）状态（阶段/百分比/计数），
+完成后再下载结果，避免长时间占用HTTP连接
+
+任务状态和结果文件写入共享目录，多进程服务下轮询、订阅和下载请求可以落到任一工作进程
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import export_pipeline
+from progress import SharedProgressChannel, progress_scope
+from shared_files import atomic_write, read_json, remove_quietly, scan_files
+
+# job_id为uuid4的十六进制串，来自请求路径，校验后才拼接文件路径
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """未完成的导出任务已达上限"""
+
+    def __init__(self, max_pending: int, retry_after: int):
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        super().__init__(f"导出任务过多（未完成任务已达上限{max_pending}个），请 {retry_after} 秒后重试")
+
+
+class ExportJob(SharedProgressChannel):
+    """
+    单个导出任务的状态及结果（同时作为进度通道，可通过SSE/WebSocket订阅）
+    状态写入<job_dir>/<job_id>.json，结果文件写入<job_dir>/<job_id>.bin
+    """
+
+    def __init__(self, export_format: str, selected_markers: List[str], job_dir: Optional[str] = None, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.job_dir = job_dir
+        super().__init__(os.path.join(job_dir, f"{self.job_id}.json") if job_dir else None)
+        self.export_format = export_format
+        self.selected_markers = selected_markers
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.content: Optional[bytes] = None
+        self.filename: Optional[str] = None
+        self.media_type: Optional[str] = None
+        self.export_details: Optional[Dict[str, Any]] = None
+        self.cache_hit: Optional[bool] = None
+        # 结果文件大小（其他进程加载的任务不持有结果内容）
+        self.size: Optional[int] = None
+
+    @classmethod
+    def load(cls, job_dir: str, job_id: str) -> Optional["ExportJob"]:
+        """从共享目录加载其他进程中的任务（只读），不存在时返回None"""
+        state = read_json(os.path.join(job_dir, f"{job_id}.json"))
+        if state is None:
+            return None
+        job = cls(state.get("format", ""), state.get("selected_markers") or [], job_dir, job_id)
+        job._readonly = True
+        job.apply_state(state)
+        return job
+
+    @property
+    def result_path(self) -> Optional[str]:
+        return os.path.join(self.job_dir, f"{self.job_id}.bin") if self.job_dir else None
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            **self.to_dict(),
+            "selected_markers": self.selected_markers,
+            "media_type": self.media_type,
+            "version": self.version,
+            "updated_at": self.updated_at
+        }
+
+    def apply_state(self, state: Dict[str, Any]):
+        super().apply_state(state)
+        self.created_at = state.get("created_at", self.created_at)
+        self.started_at = state.get("started_at")
+        self.finished_at = state.get("finished_at")
+        self.filename = state.get("filename")
+        self.media_type = state.get("media_type")
+        self.size = state.get("size")
+        self.export_details = state.get("export_details")
+        self.cache_hit = state.get("cache_hit")
+
+    def set_result(self, result: Dict[str, Any]):
+        """保存导出结果，结果文件写入共享目录供其他进程下载"""
+        self.content = result['content']
+        self.size = len(self.content)
+        self.filename = result['filename']
+        self.media_type = result['media_type']
+        self.export_details = result['export_details']
+        self.cache_hit = result['cache_hit']
+        if self.result_path is not None:
+            try:
+                atomic_write(self.result_path, self.content)
+            except OSError as e:
+                logger.warning(f"写入导出任务结果失败，只能从当前进程下载: {self.job_id}, {str(e)}")
+
+    def read_content(self) -> Optional[bytes]:
+        """结果文件内容，本进程没有时从共享目录读取（读取磁盘，应在执行器中调用）"""
+        if self.content is not None:
+            return self.content
+        try:
+            with open(self.result_path, 'rb') as f:
+                return f.read()
+        except (OSError, TypeError):
+            return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态（不含结果文件内容）"""
+        return {
+            "job_id": self.job_id,
+            "format": self.export_format,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "counters": self.snapshot()["counters"],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "filename": self.filename,
+            "size": self.size,
+            "export_details": self.export_details,
+            "cache_hit": self.cache_hit
+        }
+
+
+class ExportJobManager:
+    """
+    导出任务管理器
+
+    任务在独立线程池中执行，完成后结果保留result_ttl秒，过期自动清理
+    本进程中排队和执行中的任务总数不超过max_pending，超出时拒绝提交
+    任务状态和结果写入job_dir，其他工作进程查询时从该目录加载
+    """
+
+    # 两次扫描共享目录清理过期文件的最小间隔（秒）
+    DISK_CLEANUP_INTERVAL = 60
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        result_ttl: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        job_dir: Optional[str] = None
+    ):
+        self.max_workers = max_workers or int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+        self.result_ttl = result_ttl if result_ttl is not None else int(os.getenv("EXPORT_JOB_RESULT_TTL", "1800"))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv("EXPORT_JOB_MAX_PENDING", "16"))
+        # 队列已满时建议客户端等待的秒数
+        self.retry_after = int(os.getenv("EXPORT_JOB_RETRY_AFTER", "10"))
+        self.job_dir = job_dir or os.getenv(
+            "EXPORT_JOB_DIR",
+            os.path.join(tempfile.gettempdir(), "xmind-export-jobs")
+        )
+
+        self._last_disk_cleanup = 0.0
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """获取（必要时创建）任务线程池"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="xmind-export-job"
+                )
+            return self._pool
+
+    def _cleanup_expired(self):
+        """清理已过期的已完成任务"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.done and job.finished_at is not None and now - job.finished_at > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            cleanup_disk = now - self._last_disk_cleanup >= self.DISK_CLEANUP_INTERVAL
+            if cleanup_disk:
+                self._last_disk_cleanup = now
+        if expired:
+            logger.info(f"🧹 清理过期导出任务 {len(expired)} 个")
+
+        # 共享目录中超过result_ttl未更新的状态和结果文件（包括其他进程的任务）
+        if cleanup_disk:
+            for suffix in (".json", ".bin"):
+                for job_id, mtime, _ in scan_files(self.job_dir, suffix):
+                    if now - mtime > self.result_ttl:
+                        remove_quietly(os.path.join(self.job_dir, f"{job_id}{suffix}"))
+
+    def submit(self, export_format: str, selected_markers: List[str], file_data: Union[str, bytes]) -> ExportJob:
+        """
+        提交导出任务
+
+        Args:
+            export_format: 导出格式，取值见export_pipeline.EXPORT_FORMATS
+            selected_markers: 选中的标识符列表
+            file_data: XMind文件字节或base64编码数据
+
+        Returns:
+            新建的任务对象
+
+        Raises:
+            ValueError: 导出格式不支持或未选择标识符
+            JobQueueFullError: 未完成的任务已达上限
+        """
+        if export_format not in export_pipeline.EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {export_format}")
+        if not selected_markers:
+            raise ValueError("请至少选择一个标识符")
+
+        self._cleanup_expired()
+
+        try:
+            os.makedirs(self.job_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"无法创建导出任务目录 {self.job_dir}: {str(e)}")
+        job = ExportJob(export_format, selected_markers, self.job_dir)
+        with self._lock:
+            pending = sum(1 for existing in self._jobs.values() if not existing.done)
+            if pending >= self.max_pending:
+                raise JobQueueFullError(self.max_pending, self.retry_after)
+            self._jobs[job.job_id] = job
+        job.persist()
+
+        self._get_pool().submit(self._run_job, job, file_data)
+        logger.info(f"📥 导出任务已提交: {job.job_id} ({export_format})")
+        return job
+
+    def _run_job(self, job: ExportJob, file_data: Union[str, bytes]):
+        """在工作线程中执行导出流水线"""
+        job.started_at = time.time()
+        job.start()
+
+        try:
+            with progress_scope(job):
+                result = export_pipeline.run_export(job.export_format, job.selected_markers, file_data)
+
+            job.set_result(result)
+            job.finished_at = time.time()
+            job.finish("succeeded")
+            logger.info(f"✅ 导出任务完成: {job.job_id}, 耗时 {job.finished_at - job.started_at:.2f}s")
+        except Exception as e:
+            job.finished_at = time.time()
+            job.finish("failed", str(e))
+            logger.error(f"❌ 导出任务失败: {job.job_id}, {str(e)}")
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """获取任务（本进程的任务或从共享目录加载其他进程的任务），不存在或已过期返回None"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        self._cleanup_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+
+        job = ExportJob.load(self.job_dir, job_id)
+        if job is None:
+            return None
+        if job.done and job.finished_at is not None and time.time() - job.finished_at > self.result_ttl:
+            return None
+        return job
+
+    def shutdown(self, wait: bool = False):
+        """关闭任务线程池"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+# 创建全局实例
+export_job_manager = ExportJobManager()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+导出流水线阶段函数
+每个阶段都是可独立派发到执行器（线程池/进程池）的模块级函数，
+接口层只负责参数校验和响应组装
+
+解析器、过滤器和各导出器（及xmindparser、lxml、openpyxl）在首次使用时才导入并创建，
+服务冷启动只加载接口层；设置XMIND_WARMUP=1时在启动后于后台线程中预先加载（见warm_up）
+"""
+
+import base64
+import importlib
+import io
+import json
+import logging
+import threading
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from progress import report_stage
+from metrics import stage_timer
+from parse_cache import parsed_map_cache
+from export_cache import export_result_cache
+from cancellation import ExportCancelledError
+from marker_normalizer import marker_normalizer
+
+logger = logging.getLogger(__name__)
+
+
+class LazyInstance:
+    """
+    首次使用时导入模块并获取（或创建）对象，线程安全
+    factory=True时调用该属性创建实例，否则直接使用模块中的全局实例
+    identity为"类名@VERSION"，参与导出结果缓存键；查缓存时不导入模块，加载后核对与实际类的VERSION是否一致
+    """
+
+    def __init__(self, module_name: str, attribute: str, factory: bool = True, identity: Optional[str] = None):
+        self.module_name = module_name
+        self.attribute = attribute
+        self.factory = factory
+        self.identity = identity
+        self._instance: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    target = getattr(importlib.import_module(self.module_name), self.attribute)
+                    self._instance = target() if self.factory else target
+                    self._check_identity(self._instance)
+                instance = self._instance
+        return instance
+
+    def _check_identity(self, instance: Any):
+        if self.identity is None:
+            return
+        actual = f"{type(instance).__name__}@{instance.VERSION}"
+        if actual != self.identity:
+            logger.error(f"导出器标识与实际版本不一致: 声明{self.identity}，实际{actual}，请同步更新export_pipeline中的identity")
+
+
+# 分析器、构建器、过滤器和导出器（进程池模式下每个工作进程各自持有一份）
+xmind_analyzer = LazyInstance("xmind_parser", "XMindAnalyzer")
+smoke_builder = LazyInstance("smoke_case_builder", "SmokeCaseBuilder", identity="SmokeCaseBuilder@1.2.0")
+xmind_filter = LazyInstance("xmind_marker_filter", "xmind_filter", factory=False, identity="XMindMarkerFilter@1.2.0")
+template_exporter = LazyInstance("excel_template_exporter", "TemplateExcelExporter", identity="TemplateExcelExporter@1.0.0")
+hierarchical_exporter = LazyInstance("hierarchical_excel_exporter", "HierarchicalExcelExporter", identity="HierarchicalExcelExporter@1.0.0")
+enhanced_hierarchical_exporter = LazyInstance("enhanced_hierarchical_exporter", "EnhancedHierarchicalExporter")
+xmind_to_excel = LazyInstance("xmind_to_excel_converter", "xmind_to_excel", factory=False, identity="XMindToExcelConverter@1.0.0")
+
+LAZY_INSTANCES = {
+    "xmind_analyzer": xmind_analyzer,
+    "smoke_builder": smoke_builder,
+    "xmind_filter": xmind_filter,
+    "template_exporter": template_exporter,
+    "hierarchical_exporter": hierarchical_exporter,
+    "enhanced_hierarchical_exporter": enhanced_hierarchical_exporter,
+    "xmind_to_excel": xmind_to_excel
+}
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    预先加载所有分析器、过滤器和导出器
+
+    Returns:
+        名称 -> 加载耗时（秒），已加载的对象耗时为0
+    """
+    timings = {}
+    for name, lazy in LAZY_INSTANCES.items():
+        started = time.perf_counter()
+        lazy.get()
+        timings[name] = round(time.perf_counter() - started, 4)
+    return timings
+
+# 支持的导出格式及对应的媒体类型
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XMIND_MEDIA_TYPE = "application/vnd.xmind.workbook"
+EXPORT_FORMATS = {
+    'json': "application/json",
+    'template': XLSX_MEDIA_TYPE,
+    'hierarchical': XLSX_MEDIA_TYPE,
+    'enhanced': XLSX_MEDIA_TYPE,
+    'xmind': XMIND_MEDIA_TYPE
+}
+
+# Excel导出的列定义（与《冒烟用例导出模版.xlsx》一致）
+EXPORT_COLUMNS = ["节点1", "节点2", "节点3", "节点4", "节点5", "端/API/服务", "冒烟结果", "研发对应负责人", "showcase问题", "是否核心功能", "是否影响主流程", "执行时间"]
+
+
+def parse_xmind(file_content: bytes) -> List[Dict]:
+    """解析阶段：将XMind文件解析为工作表字典结构"""
+    from xmind_parser import xmind_bytes_to_dict
+    return xmind_bytes_to_dict(file_content)
+
+
+def analyze_xmind(file_content: bytes, filename: str) -> Dict[str, Any]:
+    """分析阶段：提取标识符统计信息"""
+    return xmind_analyzer.get().analyze_markers(file_content, filename)
+
+
+def preview_marker_selection(file_content: bytes, selected_markers: List[str]) -> Dict[str, Any]:
+    """选择预览阶段：统计标识符组合命中的节点数（节点表未缓存时解析并构建一次）"""
+    from xmind_parser import xmind_bytes_to_node_table
+    return xmind_bytes_to_node_table(file_content).selection_counts(selected_markers)
+
+
+def preview_cached_marker_selection(file_id: str, selected_markers: List[str]) -> Optional[Dict[str, Any]]:
+    """按file_id从已缓存的节点表统计标识符组合命中的节点数，只查索引，未缓存时返回None"""
+    node_table = parsed_map_cache.peek_node_table(file_id)
+    if node_table is None:
+        return None
+    return node_table.selection_counts(selected_markers)
+
+
+def build_smoke_cases(selected_markers: List[str], file_data: Union[str, bytes]) -> Dict[str, Any]:
+    """用例构建阶段：根据选中的标识符生成冒烟测试用例"""
+    return smoke_builder.get().build_smoke_cases(selected_markers, file_data)
+
+
+def filter_xmind(file_data: Union[str, bytes], selected_markers: List[str], engine: str = 'lxml') -> Dict[str, Any]:
+    """过滤阶段：按标识符过滤XMind文件，返回过滤后的文件字节和处理统计"""
+    return xmind_filter.get().filter_xmind_by_markers(
+        file_data=file_data,
+        selected_markers=selected_markers,
+        engine=engine,
+        return_bytes=True
+    )
+
+
+def load_filtered_content(file_bytes: bytes) -> Optional[Any]:
+    """读取过滤后XMind文件的工作表结构（content.json或content.xml），都不存在时返回None"""
+    from xmind_reader import read_sheets, XMindFormatError
+    # 过滤结果因标识符组合而异，直接在内存中读取，不进入解析缓存
+    try:
+        with stage_timer('parse', 'xmind_reader'):
+            sheets, _ = read_sheets(file_bytes)
+    except XMindFormatError:
+        return None
+    return sheets
+
+
+def render_template_excel(smoke_cases: Dict[str, Any]) -> bytes:
+    """渲染阶段：按模版格式生成Excel并返回文件字节"""
+    return template_exporter.get().export_to_bytes(smoke_cases)
+
+
+def render_hierarchical_excel(smoke_cases: Dict[str, Any]) -> bytes:
+    """渲染阶段：按层级合并格式生成Excel并返回文件字节"""
+    return hierarchical_exporter.get().export_to_bytes(smoke_cases)
+
+
+def render_xmind_excel(filtered_data: Any) -> bytes:
+    """渲染阶段：将过滤后的XMind结构直接转换为Excel并返回文件字节"""
+    return xmind_to_excel.get().convert_to_bytes(filtered_data)
+
+
+def export_filename(export_format: str) -> str:
+    """生成各导出格式的带时间戳文件名"""
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    if export_format == 'template':
+        return f"冒烟测试用例_模版格式_{timestamp}.xlsx"
+    if export_format == 'hierarchical':
+        return f"层级合并_冒烟测试用例_{timestamp}.xlsx"
+    if export_format == 'enhanced':
+        return f"XMind结构化导出_冒烟测试用例_{timestamp}.xlsx"
+    if export_format == 'xmind':
+        return "filtered_markers.xmind"
+    return f"冒烟测试用例_{timestamp}.json"
+
+
+def exporter_identity(export_format: str) -> str:
+    """
+    导出格式对应的导出器名称及版本（参与导出结果缓存键，不导入导出器模块）
+    各导出格式都按规范化后的标识符筛选节点，末尾附加生效别名表的指纹，修改别名配置后旧缓存不再命中
+    """
+    if export_format == 'template':
+        chain = [smoke_builder, template_exporter]
+    elif export_format == 'hierarchical':
+        chain = [smoke_builder, hierarchical_exporter]
+    elif export_format == 'enhanced':
+        chain = [xmind_filter, xmind_to_excel]
+    elif export_format == 'xmind':
+        chain = [xmind_filter]
+    else:
+        chain = [smoke_builder]
+    return f"{export_format}:" + "+".join(lazy.identity for lazy in chain) + f"+aliases@{marker_normalizer.fingerprint}"
+
+
+def decode_file_data(file_data: Union[str, bytes]) -> bytes:
+    """将base64编码数据或文件字节统一为文件字节"""
+    if isinstance(file_data, (bytes, bytearray)):
+        return bytes(file_data)
+    with stage_timer('decode', 'base64'):
+        return base64.b64decode(file_data)
+
+
+def lookup_cached_export(
+    export_format: str,
+    selected_markers: List[str],
+    file_data: Union[str, bytes]
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    查询导出结果缓存
+    
+    Returns:
+        (缓存键, 命中的导出结果)，未命中时结果为None
+    """
+    file_hash = parsed_map_cache.compute_hash(decode_file_data(file_data))
+    cache_key = export_result_cache.make_key(file_hash, selected_markers, exporter_identity(export_format))
+    return cache_key, export_result_cache.get(cache_key)
+
+
+def store_cached_export(cache_key: str, result: Dict[str, Any]):
+    """保存导出结果到缓存"""
+    export_result_cache.put(
+        cache_key,
+        result['content'],
+        result['filename'],
+        result['media_type'],
+        result['export_details']
+    )
+
+
+def template_export_details(total_cases: int, selected_markers: List[str]) -> Dict[str, Any]:
+    """模版格式导出的统计信息"""
+    return {
+        "total_cases": total_cases,
+        "selected_markers": selected_markers,
+        "export_format": "模版格式",
+        "columns": EXPORT_COLUMNS
+    }
+
+
+def hierarchical_export_details(total_cases: int, selected_markers: List[str]) -> Dict[str, Any]:
+    """层级合并导出的统计信息"""
+    return {
+        "total_cases": total_cases,
+        "selected_markers": selected_markers,
+        "export_format": "层级合并格式",
+        "features": ["智能单元格合并", "层级背景色", "直观树状结构"],
+        "columns": EXPORT_COLUMNS
+    }
+
+
+def enhanced_export_details(processing_details: Dict[str, Any], selected_markers: List[str]) -> Dict[str, Any]:
+    """增强版层级合并（XMind结构化）导出的统计信息"""
+    return {
+        "total_cases": processing_details.get('nodes_processed', 0),
+        "selected_markers": selected_markers,
+        "export_format": "XMind结构化导出",
+        "features": [
+            "与XMind导出完全一致的数据流", 
+            "精确保留原始结构",
+            "智能单元格合并", 
+            "层级背景色优化",
+            "完整数据映射",
+            "精确列宽设置"
+        ],
+        "processing_details": processing_details,
+        "columns": EXPORT_COLUMNS,
+        "improvements": [
+            "与XMind导出完全一致的数据处理",
+            "不再使用中间解构重建流程",
+            "直接转换确保完整性",
+            "增强的视觉层级效果"
+        ]
+    }
+
+
+def _render_export(
+    export_format: str,
+    selected_markers: List[str],
+    file_content: bytes,
+    shared: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    生成单个格式的导出结果
+    shared保存可在多个格式间共享的中间结果（过滤结果、冒烟用例），按需计算一次
+    """
+    filename = export_filename(export_format)
+    
+    if export_format in ('xmind', 'enhanced'):
+        if 'filter_result' not in shared:
+            shared['filter_result'] = filter_xmind(file_content, selected_markers)
+        filter_result = shared['filter_result']
+        processing_details = filter_result['processing_details']
+        
+        if export_format == 'xmind':
+            content = filter_result['file_bytes']
+            export_details = {"processing_details": processing_details}
+        else:
+            filtered_data = load_filtered_content(filter_result['file_bytes'])
+            if not filtered_data:
+                raise ValueError("无法提取XMind数据结构")
+            content = render_xmind_excel(filtered_data)
+            export_details = enhanced_export_details(processing_details, selected_markers)
+    else:
+        if 'smoke_cases' not in shared:
+            shared['smoke_cases'] = build_smoke_cases(selected_markers, file_content)
+        smoke_cases = shared['smoke_cases']
+        total_cases = smoke_cases['smoke_test_suite']['metadata']['total_cases']
+        
+        if export_format == 'template':
+            content = render_template_excel(smoke_cases)
+            export_details = template_export_details(total_cases, selected_markers)
+        elif export_format == 'hierarchical':
+            content = render_hierarchical_excel(smoke_cases)
+            export_details = hierarchical_export_details(total_cases, selected_markers)
+        else:
+            report_stage('render')
+            with stage_timer('encode', 'json'):
+                content = json.dumps(smoke_cases, ensure_ascii=False).encode('utf-8')
+            export_details = {"total_cases": total_cases, "selected_markers": selected_markers}
+    
+    return {
+        'content': content,
+        'filename': filename,
+        'media_type': EXPORT_FORMATS[export_format],
+        'export_details': export_details
+    }
+
+
+def run_export(export_format: str, selected_markers: List[str], file_data: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    按指定格式执行完整的导出流水线（解析 → 过滤 → 构建用例 → 渲染 → 保存）
+    各阶段通过report_stage上报进度
+    
+    Args:
+        export_format: 导出格式，取值见EXPORT_FORMATS
+        selected_markers: 选中的标识符列表
+        file_data: XMind文件字节或base64编码数据
+        
+    Returns:
+        包含content（文件字节）、filename、media_type、export_details、cache_hit的字典
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    
+    file_content = decode_file_data(file_data)
+    cache_key, cached = lookup_cached_export(export_format, selected_markers, file_content)
+    if cached is not None:
+        logger.info(f"♻️ 命中导出结果缓存: {export_format}")
+        report_stage('save')
+        cached['cache_hit'] = True
+        return cached
+    
+    result = _render_export(export_format, selected_markers, file_content, {})
+    store_cached_export(cache_key, result)
+    result['cache_hit'] = False
+    return result
+
+
+def run_bundle_export(
+    export_formats: List[str],
+    selected_markers: List[str],
+    file_data: Union[str, bytes]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    单次解析生成多种格式的导出结果
+    文件只解码/解析一次，标识符过滤和冒烟用例构建在各格式间共享，单个格式失败不影响其他格式
+    
+    Args:
+        export_formats: 导出格式列表，取值见EXPORT_FORMATS
+        selected_markers: 选中的标识符列表
+        file_data: XMind文件字节或base64编码数据
+        
+    Returns:
+        格式 -> 结果字典；成功时同run_export的返回值，失败时包含error
+    """
+    file_content = decode_file_data(file_data)
+    shared: Dict[str, Any] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    
+    for export_format in export_formats:
+        started = time.perf_counter()
+        try:
+            if export_format not in EXPORT_FORMATS:
+                raise ValueError(f"不支持的导出格式: {export_format}")
+            
+            cache_key, result = lookup_cached_export(export_format, selected_markers, file_content)
+            if result is not None:
+                result['cache_hit'] = True
+            else:
+                result = _render_export(export_format, selected_markers, file_content, shared)
+                store_cached_export(cache_key, result)
+                result['cache_hit'] = False
+        except ExportCancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ {export_format} 格式导出失败: {str(e)}")
+            result = {'error': str(e)}
+        
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        results[export_format] = result
+    
+    return results
+
+
+def build_bundle_zip(results: Dict[str, Dict[str, Any]], selected_markers: List[str]) -> bytes:
+    """将多格式导出结果打包为zip，根目录下的manifest.json记录各格式的统计、耗时和失败信息"""
+    buffer = io.BytesIO()
+    manifest_formats = {}
+    
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+        for export_format, result in results.items():
+            if 'error' in result:
+                manifest_formats[export_format] = {
+                    "status": "failed",
+                    "error": result['error'],
+                    "seconds": result['seconds']
+                }
+                continue
+            
+            zip_out.writestr(result['filename'], result['content'])
+            manifest_formats[export_format] = {
+                "status": "succeeded",
+                "path": result['filename'],
+                "size": len(result['content']),
+                "cache_hit": result['cache_hit'],
+                "seconds": result['seconds'],
+                "export_details": result['export_details']
+            }
+        
+        manifest = {
+            "generated_at": datetime.now().isoformat(),
+            "selected_markers": selected_markers,
+            "formats": manifest_formats
+        }
+        zip_out.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2, default=str))
+    
+    return buffer.getvalue()
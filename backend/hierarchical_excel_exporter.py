@@ -4,20 +4,28 @@
 实现智能的单元格合并，完全匹配《冒烟用例导出模版.xlsx》的视觉效果
 """
 
+import io
 import logging
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, BinaryIO, Union
 from collections import defaultdict, OrderedDict
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 import copy
+from progress import report_stage, report_count
+from metrics import stage_timer, timed_stage
+from tracing import traced, span, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
 
 logger = logging.getLogger(__name__)
 
 class HierarchicalExcelExporter:
     """支持层级合并的Excel导出器"""
     
+    # 输出格式版本，修改输出内容时需递增，并同步export_pipeline中的identity（用于导出结果缓存失效）
+    VERSION = "1.0.0"
+    
     def __init__(self):
         # 层级背景色配置
         self.level_colors = {
@@ -31,19 +39,21 @@ class HierarchicalExcelExporter:
         # 其他列的背景色
         self.other_column_color = 'FAFAFA'  # 浅灰色
     
-    def export_with_hierarchical_merge(self, test_cases_data: Dict[str, Any], output_path: str = None) -> str:
+    @traced()
+    def export_with_hierarchical_merge(self, test_cases_data: Dict[str, Any], output_path: Union[str, BinaryIO, None] = None) -> Union[str, BinaryIO]:
         """
         按照层级合并导出Excel
         
         Args:
             test_cases_data: 测试用例数据
-            output_path: 输出文件路径
+            output_path: 输出文件路径，也可以是可写的二进制文件对象
             
         Returns:
-            生成的文件路径
+            生成的文件路径（输出到文件对象时返回该对象）
         """
         try:
             logger.info("🚀 开始按层级合并导出Excel...")
+            report_stage('render')
             
             test_cases = test_cases_data['smoke_test_suite']['test_cases']
             metadata = test_cases_data['smoke_test_suite']['metadata']
@@ -63,6 +73,7 @@ class HierarchicalExcelExporter:
             # 4. 写入分组数据并合并单元格
             current_row = 2  # 从第2行开始写数据
             total_rows = self._write_hierarchical_data(ws_main, grouped_data, current_row)
+            set_attributes(test_cases=len(test_cases), groups=len(grouped_data), rows=total_rows - current_row)
             
             # 5. 设置列宽
             self._set_column_widths(ws_main)
@@ -76,18 +87,30 @@ class HierarchicalExcelExporter:
                 timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
                 output_path = f"层级合并_冒烟测试用例_{timestamp}.xlsx"
             
-            wb.save(output_path)
+            check_cancelled()
+            report_stage('save')
+            with stage_timer('save', 'openpyxl'), span('Workbook.save'):
+                wb.save(output_path)
+            output_name = output_path if isinstance(output_path, str) else "内存缓冲区"
             
-            logger.info(f"✅ 层级合并Excel导出完成: {output_path}")
+            logger.info(f"✅ 层级合并Excel导出完成: {output_name}")
             logger.info(f"   📊 包含 {len(test_cases)} 个测试用例")
             logger.info(f"   🎯 实现了完整的层级合并效果")
             
             return output_path
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"❌ 层级合并导出失败: {str(e)}")
             raise Exception(f"层级合并导出失败: {str(e)}")
     
+    def export_to_bytes(self, test_cases_data: Dict[str, Any]) -> bytes:
+        """按照层级合并导出Excel并直接返回文件字节（不落盘）"""
+        buffer = io.BytesIO()
+        self.export_with_hierarchical_merge(test_cases_data, buffer)
+        return buffer.getvalue()
+    
     def _group_data_hierarchically(self, test_cases: List[Dict]) -> OrderedDict:
         """按层级分组数据"""
         
@@ -161,9 +184,12 @@ class HierarchicalExcelExporter:
         self._collect_all_rows(hierarchy, all_rows, [], 1)
         
         # 第二次遍历：写入数据
-        for row_info in all_rows:
-            self._write_single_row(ws, current_row, row_info)
-            current_row += 1
+        with stage_timer('write_sheet', 'openpyxl'):
+            for index, row_info in enumerate(all_rows, 1):
+                check_cancelled()
+                report_count('write_rows', index, len(all_rows))
+                self._write_single_row(ws, current_row, row_info)
+                current_row += 1
         
         # 第三次遍历：计算并应用合并
         self._apply_merges(ws, all_rows, start_row)
@@ -240,12 +266,16 @@ class HierarchicalExcelExporter:
                 elif value == '失败':
                     cell.fill = PatternFill(start_color='FFE8E8', end_color='FFE8E8', fill_type='solid')
     
+    @timed_stage('merge_cells', 'openpyxl')
+    @traced()
     def _apply_merges(self, ws, all_rows: List, start_row: int):
         """应用智能合并"""
         
         # 按列分别处理合并
         for col in range(1, 6):  # 只对节点列进行合并
             self._merge_column(ws, all_rows, col, start_row)
+        
+        set_attributes(rows=len(all_rows), merges=len(ws.merged_cells.ranges))
     
     def _merge_column(self, ws, all_rows: List, col: int, start_row: int):
         """合并指定列的相同值"""
@@ -275,7 +305,7 @@ class HierarchicalExcelExporter:
                 if current_value and merge_start < row_num - 1:
                     try:
                         ws.merge_cells(f'{get_column_letter(col)}{merge_start}:{get_column_letter(col)}{row_num-1}')
-                        logger.debug(f"合并 {get_column_letter(col)}{merge_start}:{get_column_letter(col)}{row_num-1} = {current_value}")
+                        logger.debug("合并 %s%s:%s%s = %s", get_column_letter(col), merge_start, get_column_letter(col), row_num - 1, current_value)
                     except Exception as e:
                         logger.warning(f"合并失败: {e}")
                 
@@ -288,7 +318,7 @@ class HierarchicalExcelExporter:
             try:
                 end_row = start_row + len(all_rows) - 1
                 ws.merge_cells(f'{get_column_letter(col)}{merge_start}:{get_column_letter(col)}{end_row}')
-                logger.debug(f"最后合并 {get_column_letter(col)}{merge_start}:{get_column_letter(col)}{end_row} = {current_value}")
+                logger.debug("最后合并 %s%s:%s%s = %s", get_column_letter(col), merge_start, get_column_letter(col), end_row, current_value)
             except Exception as e:
                 logger.warning(f"最后合并失败: {e}")
     
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+热路径日志
+逐节点循环中不再每个节点输出一条INFO日志，而是在阶段内按事件累加计数，阶段结束时输出一条汇总记录
+- 计数保存在当前上下文的阶段日志中，并发请求之间互不影响
+- 逐节点明细按采样以DEBUG级别输出（默认关闭），使用%格式延迟格式化，未启用的级别不产生格式化开销
+
+采样配置：
+- XMIND_LOG_SAMPLE_EVERY: 每N个同类事件输出一条明细（默认0，不输出明细）
+- XMIND_LOG_SAMPLE_LIMIT: 每个阶段每类事件最多输出的明细条数（默认20）
+"""
+
+import contextvars
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+SAMPLE_EVERY = int(os.getenv("XMIND_LOG_SAMPLE_EVERY", 0))
+SAMPLE_LIMIT = int(os.getenv("XMIND_LOG_SAMPLE_LIMIT", 20))
+
+_current_stage_log: contextvars.ContextVar = contextvars.ContextVar("xmind_stage_log", default=None)
+
+
+class StageLog:
+    """单个阶段内的节点事件计数及明细采样"""
+
+    def __init__(self, stage: str, stage_logger: logging.Logger, sample_every: int = SAMPLE_EVERY, sample_limit: int = SAMPLE_LIMIT):
+        self.stage = stage
+        self.logger = stage_logger
+        self.sample_every = sample_every
+        self.sample_limit = sample_limit
+        self.counts: Dict[str, int] = {}
+        self._sampled: Dict[str, int] = {}
+        # 阶段开始时确定一次是否输出明细，循环内无需重复判断日志级别
+        self._detail_enabled = sample_every > 0 and sample_limit > 0 and stage_logger.isEnabledFor(logging.DEBUG)
+
+    def event(self, name: str, msg: Optional[str] = None, *args: Any):
+        """
+        记录一个节点事件，采样命中时以DEBUG级别输出明细
+
+        Args:
+            name: 事件名（如kept_marked、removed），作为汇总记录中的计数键
+            msg: 明细日志格式串（%格式），为None时只计数
+            *args: 明细日志参数，仅在实际输出时格式化
+        """
+        count = self.counts.get(name, 0) + 1
+        self.counts[name] = count
+        if msg is None or not self._detail_enabled or (count - 1) % self.sample_every:
+            return
+        sampled = self._sampled.get(name, 0)
+        if sampled < self.sample_limit:
+            self._sampled[name] = sampled + 1
+            self.logger.debug(msg, *args)
+
+    def summary(self):
+        """输出阶段汇总记录（没有任何事件时不输出）"""
+        if self.counts and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "%s阶段汇总: %s",
+                self.stage,
+                self.counts,
+                extra={"stage": self.stage, "event_counts": dict(self.counts)}
+            )
+
+
+@contextmanager
+def stage_log(stage: str, stage_logger: logging.Logger) -> Iterator[StageLog]:
+    """在代码块内汇总节点事件，结束时输出一条汇总记录"""
+    log = StageLog(stage, stage_logger)
+    token = _current_stage_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_stage_log.reset(token)
+        log.summary()
+
+
+def node_event(name: str, msg: Optional[str] = None, *args: Any):
+    """记录当前阶段的一个节点事件，不在阶段日志范围内时忽略"""
+    log = _current_stage_log.get()
+    if log is not None:
+        log.event(name, msg, *args)
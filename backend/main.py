@@ -3,34 +3,45 @@
 XMind冒烟测试用例导出系统API
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from starlette.routing import Match
+from typing import List, Dict, Any, Optional, Union
 import uvicorn
 import logging
 import base64
-import io
 import json
-import zipfile
-import shutil
-import tempfile
+import asyncio
+import time
 import os
+import re
 from pathlib import Path
 from datetime import datetime
 from pythonjsonlogger import jsonlogger
 import sys
+from urllib.parse import quote
 
-from xmind_parser import XMindAnalyzer
-from smoke_case_builder import SmokeCaseBuilder
-from xmind_marker_filter import xmind_filter
-import xmindparser
-from excel_template_exporter import TemplateExcelExporter
-from hierarchical_excel_exporter import HierarchicalExcelExporter
-from enhanced_hierarchical_exporter import EnhancedHierarchicalExporter
-from xmind_to_excel_converter import xmind_to_excel
+import export_pipeline
+import batch_export
+import debug_inspector
+from upload_store import upload_store
+from upload_ingest import upload_ingestor, UploadRejectedError
+from task_executor import pipeline_executor
+from export_jobs import export_job_manager, JobQueueFullError
+from parse_cache import parsed_map_cache
+from export_cache import export_result_cache
+from marker_normalizer import marker_normalizer
+import metrics
+from metrics import stage_timer
+from request_profiler import profile_store, profile_scope, profiling_requested, ProfileSession
+from tracing import trace_buffer, trace_scope
+import serving
+from admission import admission_controller, AdmissionRejectedError
+from progress import ProgressChannel, progress_hub, progress_scope
+from cancellation import CancellationToken, ExportCancelledError, EXPORT_DEADLINE, cancellation_scope, watch_disconnect
 
 # 配置日志
 logger = logging.getLogger()
@@ -51,7 +62,71 @@ app = FastAPI(
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def route_template(request: Request) -> str:
+    """请求匹配的路由模板（如/api/jobs/{job_id}），用作指标标签以避免路径参数导致标签膨胀"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    重量级导出接口的准入控制
+    每个导出接口的同时执行数和等待队列有上限，队列已满或排队超时时返回503和Retry-After；其他接口直接放行
+    """
+    try:
+        async with admission_controller.admit(route_template(request)):
+            return await call_next(request)
+    except AdmissionRejectedError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """
+    记录请求耗时、各流水线阶段耗时和链路追踪
+    阶段耗时汇总后写入Server-Timing响应头，同时计入/metrics的直方图；trace ID通过X-Trace-Id响应头返回
+    """
+    endpoint = route_template(request)
+    with metrics.request_timing_scope(endpoint) as timing, trace_scope(f"{request.method} {endpoint}") as trace:
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            response.headers["Server-Timing"] = timing.server_timing()
+            if trace is not None:
+                response.headers["X-Trace-Id"] = trace.trace_id
+            return response
+        finally:
+            seconds = time.perf_counter() - timing.started
+            metrics.http_request_duration.observe(seconds, endpoint=endpoint, method=request.method)
+            metrics.http_requests.inc(endpoint=endpoint, method=request.method, status=status)
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    按请求剖析（需设置XMIND_PROFILING=1）
+    请求头X-Profile: 1或查询参数profile=true时，执行器中的各阶段在cProfile下运行，
+    剖析ID通过X-Profile-Id响应头返回，从/api/debug/profiles/{profile_id}查看
+    """
+    if not profile_store.enabled or not profiling_requested(request.headers, request.query_params):
+        return await call_next(request)
+    
+    session = ProfileSession(route_template(request))
+    with profile_scope(session):
+        response = await call_next(request)
+    
+    if await pipeline_executor.run(profile_store.save, session, cpu_bound=False):
+        response.headers["X-Profile-Id"] = session.profile_id
+    return response
+
 # 配置CORS - 允许所有来源（生产环境）
+# 在所有HTTP中间件之后注册，CORS成为最外层，准入控制返回的503等中间件直接生成的响应也带有CORS响应头
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -62,36 +137,261 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "X-Export-Details", "X-Export-Cache", "Server-Timing", "X-Profile-Id", "X-Trace-Id", "Retry-After"],  # 二进制下载模式及503重试时前端需要读取的响应头
 )
 
-# 初始化分析器和构建器
-xmind_analyzer = XMindAnalyzer()
-smoke_builder = SmokeCaseBuilder()
-template_exporter = TemplateExcelExporter()
-hierarchical_exporter = HierarchicalExcelExporter()
-enhanced_hierarchical_exporter = EnhancedHierarchicalExporter()
+async def export_cancellation(raw_request: Request):
+    """
+    导出请求的取消令牌（依赖项，在请求体读取完成后执行）
+    客户端断开连接或超过XMIND_EXPORT_DEADLINE秒后令牌被取消，流水线各阶段在下一个节点/行处停止
+    """
+    token = CancellationToken(EXPORT_DEADLINE)
+    watcher = asyncio.create_task(watch_disconnect(raw_request, token))
+    try:
+        with cancellation_scope(token):
+            yield token
+    finally:
+        watcher.cancel()
+
+# 客户端生成的进度通道ID（如UUID）
+PROGRESS_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+PROGRESS_POLL_INTERVAL = 0.25
+PROGRESS_HEARTBEAT_SECONDS = 15
+
+async def export_progress(raw_request: Request):
+    """
+    同步导出请求的进度通道（依赖项）
+    请求头X-Progress-Id指定通道ID时，导出过程中的阶段切换和行计数写入该通道，
+    客户端可在发起导出前后从/api/progress/{id}/events或/api/progress/{id}/ws订阅
+    """
+    progress_id = raw_request.headers.get("x-progress-id")
+    if not progress_id or not PROGRESS_ID_PATTERN.match(progress_id):
+        yield None
+        return
+    
+    channel = progress_hub.channel(progress_id)
+    channel.start()
+    try:
+        with progress_scope(channel):
+            yield channel
+    except ExportCancelledError:
+        channel.finish("cancelled", "导出已取消")
+        raise
+    except Exception as e:
+        channel.finish("failed", str(e.detail) if isinstance(e, HTTPException) else str(e))
+        raise
+    else:
+        channel.finish("succeeded")
+
+async def resolve_progress_channel(channel_id: str) -> Optional[ProgressChannel]:
+    """进度通道：异步导出任务ID或同步导出请求的X-Progress-Id（导出在其他工作进程中时读取共享目录）"""
+    job = await pipeline_executor.run(export_job_manager.get, channel_id, cpu_bound=False)
+    if job is not None:
+        return job
+    if PROGRESS_ID_PATTERN.match(channel_id):
+        return progress_hub.subscribe(channel_id)
+    return None
+
+async def progress_updates(channel: ProgressChannel):
+    """
+    进度更新的异步生成器
+    版本变化时产出进度快照，长时间无变化时产出None作为心跳，通道结束或闲置超时后停止
+    """
+    last_version = -1
+    last_sent = time.monotonic()
+    while True:
+        channel.refresh()
+        if channel.version != last_version:
+            last_version = channel.version
+            last_sent = time.monotonic()
+            yield channel.snapshot()
+            if channel.done:
+                return
+        elif time.time() - channel.updated_at > progress_hub.ttl:
+            return
+        elif time.monotonic() - last_sent >= PROGRESS_HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield None
+        await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+
+@app.exception_handler(ExportCancelledError)
+async def export_cancelled_handler(request: Request, exc: ExportCancelledError):
+    """已取消的导出：客户端断开时返回499（客户端通常已收不到），超过截止时间返回504"""
+    logger.warning(f"导出已取消: {route_template(request)} ({exc.reason})")
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.on_event("startup")
+async def schedule_warm_up():
+    """XMIND_WARMUP=1时在后台加载解析器和导出器，服务先开始接受请求，首个导出请求不再承担加载耗时"""
+    if os.getenv("XMIND_WARMUP", "0").lower() not in ("1", "true", "yes"):
+        return
+
+    async def warm_up():
+        try:
+            timings = await pipeline_executor.run(export_pipeline.warm_up, cpu_bound=False)
+            logger.info(f"后台预热完成: {', '.join(f'{name}={seconds * 1000:.0f}ms' for name, seconds in timings.items())}")
+        except Exception as e:
+            logger.error(f"❌ 后台预热失败: {str(e)}")
+
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    """关闭流水线执行器"""
+    pipeline_executor.shutdown(wait=False)
+    export_job_manager.shutdown(wait=False)
 
 # 数据模型
 class ExportRequest(BaseModel):
     selected_markers: List[str]
-    file_data: str  # base64编码的文件数据
+    file_data: Optional[str] = None  # base64编码的文件数据
+    file_id: Optional[str] = None  # /api/analyze返回的文件ID，优先于file_data使用
 
 class XMindExportRequest(BaseModel):
     selected_markers: List[str]
-    file_data: str  # base64编码的文件数据
+    file_data: Optional[str] = None  # base64编码的文件数据
+    file_id: Optional[str] = None  # /api/analyze返回的文件ID，优先于file_data使用
     test_case_titles: List[str]  # 导出的测试用例标题列表
 
+class ExportJobRequest(BaseModel):
+    format: str = "template"  # 导出格式: json/template/hierarchical/enhanced/xmind
+    selected_markers: List[str]
+    file_data: Optional[str] = None  # base64编码的文件数据
+    file_id: Optional[str] = None  # /api/analyze返回的文件ID，优先于file_data使用
+
+class ExportBundleRequest(BaseModel):
+    formats: List[str] = ["json", "template", "enhanced", "xmind"]  # 需要打包的导出格式
+    selected_markers: List[str]
+    file_data: Optional[str] = None  # base64编码的文件数据
+    file_id: Optional[str] = None  # /api/analyze返回的文件ID，优先于file_data使用
+
+class MarkerPreviewRequest(BaseModel):
+    selected_markers: List[str]
+    file_id: str  # /api/analyze返回的文件ID
+
 class AnalyzeResponse(BaseModel):
     filename: str
     markers_found: List[Dict[str, Any]]
     total_nodes: int
     suitable_for_smoke: int
-    file_data: str  # 添加base64编码的文件数据，供导出使用
+    file_data: Optional[str] = None  # base64编码的文件数据，供导出使用（include_file_data=false时不返回）
+    file_id: Optional[str] = None  # 服务端存储的文件ID（SHA-256），导出时可代替file_data
 
 class TestDataRequest(BaseModel):
     """测试数据请求模型"""
     test_data: Dict[str, Any]
 
+async def resolve_file_data(request: Union[ExportRequest, XMindExportRequest, ExportJobRequest, ExportBundleRequest]) -> Union[str, bytes]:
+    """
+    获取导出请求对应的文件数据
+    优先通过file_id从服务端存储（共享目录，在执行器线程中读取）中读取文件字节，否则使用请求中的base64数据
+    """
+    if request.file_id:
+        file_content = await pipeline_executor.run(upload_store.get, request.file_id, cpu_bound=False)
+        if file_content is not None:
+            return file_content
+        if not request.file_data:
+            raise HTTPException(status_code=404, detail="文件已过期或不存在，请重新上传分析")
+        logger.info(f"file_id={request.file_id[:12]}... 已失效，改用请求中的文件数据")
+    
+    if not request.file_data:
+        raise HTTPException(status_code=400, detail="缺少文件数据")
+    
+    return request.file_data
+
+# 二进制下载模式使用的媒体类型
+XLSX_MEDIA_TYPE = export_pipeline.XLSX_MEDIA_TYPE
+XMIND_MEDIA_TYPE = export_pipeline.XMIND_MEDIA_TYPE
+BINARY_ACCEPT_TYPES = ("application/octet-stream", XLSX_MEDIA_TYPE, XMIND_MEDIA_TYPE)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+def wants_binary_response(raw_request: Request, download: bool = False) -> bool:
+    """
+    判断是否使用二进制下载模式
+    通过查询参数download=true，或Accept头声明octet-stream/xlsx/xmind类型启用
+    """
+    if download:
+        return True
+    accept = raw_request.headers.get("accept", "")
+    return any(media_type in accept for media_type in BINARY_ACCEPT_TYPES)
+
+def build_download_response(
+    content: bytes,
+    filename: str,
+    media_type: str,
+    export_details: Dict[str, Any],
+    cache_hit: Optional[bool] = None
+) -> StreamingResponse:
+    """
+    构建二进制下载响应
+    文件内容直接以字节流返回，导出统计信息放在X-Export-Details响应头中（JSON格式），
+    是否命中导出结果缓存放在X-Export-Cache响应头中（HIT/MISS）
+    """
+    def iter_content():
+        view = memoryview(content)
+        for offset in range(0, len(view), DOWNLOAD_CHUNK_SIZE):
+            yield bytes(view[offset:offset + DOWNLOAD_CHUNK_SIZE])
+    
+    # 中文文件名使用RFC 5987编码，同时提供ASCII回退文件名
+    ascii_filename = filename.encode("ascii", "ignore").decode("ascii").strip() or "export"
+    if ascii_filename.startswith("."):
+        ascii_filename = "export" + ascii_filename
+    headers = {
+        "Content-Disposition": f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{quote(filename)}",
+        "Content-Length": str(len(content)),
+        "X-Export-Details": json.dumps(export_details, ensure_ascii=True, default=str)
+    }
+    if cache_hit is not None:
+        headers["X-Export-Cache"] = "HIT" if cache_hit else "MISS"
+    return StreamingResponse(iter_content(), media_type=media_type, headers=headers)
+
+def encode_file_data(content: bytes) -> str:
+    """将文件字节编码为base64字符串（JSON响应模式）"""
+    with stage_timer('encode', 'base64'):
+        return base64.b64encode(content).decode('utf-8')
+
+def excel_export_response(raw_request: Request, download: bool, message: str, result: Dict[str, Any], cache_hit: bool):
+    """
+    组装Excel导出接口的响应
+    二进制下载模式直接返回文件字节流，否则返回包含base64文件数据的JSON
+    """
+    if wants_binary_response(raw_request, download):
+        return build_download_response(
+            result['content'],
+            result['filename'],
+            result['media_type'],
+            result['export_details'],
+            cache_hit=cache_hit
+        )
+    
+    return {
+        "success": True,
+        "message": message,
+        "filename": result['filename'],
+        "file_data": encode_file_data(result['content']),
+        "export_details": result['export_details'],
+        "cache_hit": cache_hit
+    }
+
+async def ingest_upload_bytes(file: UploadFile, with_hash: bool = False, require_xmind: bool = True):
+    """
+    校验上传文件并返回文件字节
+    在Starlette暂存的上传文件上完成哈希与校验后只读取一次内容；
+    校验失败时转换为对应的HTTP错误，with_hash=True时同时返回校验过程中计算的SHA-256
+    """
+    try:
+        ingested = await upload_ingestor.ingest(file, require_xmind=require_xmind)
+    except UploadRejectedError as e:
+        logger.warning(f"拒绝上传文件: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    with ingested:
+        file_content = await pipeline_executor.run(ingested.read_bytes, cpu_bound=False)
+    
+    if with_hash:
+        return file_content, ingested.sha256
+    return file_content
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
@@ -101,6 +401,68 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """
+    缓存统计信息（命中/未命中次数、占用字节数、标识符映射缓存）及导出接口准入控制的执行数和排队数
+    进程池模式下各工作进程持有独立缓存，这里只反映API主进程
+    """
+    return {
+        "parsed_maps": parsed_map_cache.stats(),
+        "export_results": export_result_cache.stats(),
+        "marker_normalizer": marker_normalizer.cache_info(),
+        "admission": admission_controller.stats()
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus文本格式的指标（阶段耗时直方图、阶段失败计数、HTTP请求耗时及计数、导出接口排队深度及排队耗时）
+    进程池模式下工作进程内的阶段耗时不计入，这里只反映API主进程
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/debug/profiles")
+async def list_profiles():
+    """列出已保存的请求剖析数据"""
+    if not profile_store.enabled:
+        raise HTTPException(status_code=404, detail="未开启请求剖析（XMIND_PROFILING）")
+    return {"profiles": profile_store.list()}
+
+@app.get("/api/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "text", sort: str = "cumulative", limit: int = 50):
+    """
+    查看请求剖析数据
+    format=text返回按sort排序的前limit个函数的文本报告，format=pstats下载原始pstats文件（可用snakeviz等工具打开）
+    """
+    if not profile_store.enabled:
+        raise HTTPException(status_code=404, detail="未开启请求剖析（XMIND_PROFILING）")
+    
+    path = profile_store.get_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="剖析数据不存在或已被清理")
+    
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+    if sort not in ("cumulative", "tottime", "calls", "ncalls", "time"):
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+    
+    report = await pipeline_executor.run(profile_store.render_report, profile_id, sort, limit, cpu_bound=False)
+    if report is None:
+        raise HTTPException(status_code=404, detail="剖析数据不存在或已被清理")
+    return PlainTextResponse(report)
+
+@app.get("/api/debug/traces")
+async def export_traces(trace_id: Optional[str] = None, limit: int = 20):
+    """
+    以Chrome trace JSON格式导出最近的请求trace（可在chrome://tracing或Perfetto中打开）
+    trace_id指定单条trace（见X-Trace-Id响应头），否则返回最近limit条
+    """
+    traces = trace_buffer.export_chrome_trace(trace_id=trace_id, limit=limit)
+    if trace_id and not traces["otherData"]["traces"]:
+        raise HTTPException(status_code=404, detail="trace不存在或已被淘汰")
+    return traces
+
 @app.get("/")
 async def read_root():
     """返回前端页面"""
@@ -183,179 +545,109 @@ async def test_analyze(request: TestDataRequest):
         raise HTTPException(status_code=500, detail=f"测试分析失败: {str(e)}")
 
 @app.post("/api/debug/analyze")
-async def debug_analyze_xmind(file: UploadFile = File(...)):
+async def debug_analyze_xmind(
+    file: UploadFile = File(...),
+    offset: int = 0,
+    limit: int = 50,
+    max_depth: Optional[int] = None,
+    fields: Optional[str] = None
+):
     """
-    调试分析XMind文件，显示原始标识符信息
+    调试分析XMind文件，分页显示节点的原始字段及标识符统计
+    offset/limit分页（limit最大XMIND_DEBUG_MAX_LIMIT），max_depth限制遍历深度，
+    fields为逗号分隔的输出字段（默认path,title,level,markers，raw为节点自身的原始字段）；
+    结果以JSON流式返回，summary在nodes之后输出，next_offset为下一页的offset（没有下一页时为null）
     """
     try:
         # 验证文件格式
         if not file.filename.endswith('.xmind'):
             raise HTTPException(status_code=400, detail="只支持.xmind格式文件")
+        if offset < 0 or not 1 <= limit <= debug_inspector.MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"offset不能为负数，limit取值范围为1~{debug_inspector.MAX_PAGE_SIZE}")
+        if max_depth is not None and max_depth < 1:
+            raise HTTPException(status_code=400, detail="max_depth必须大于0")
+        try:
+            selected_fields = debug_inspector.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # 读取文件内容
-        file_content = await file.read()
-        logger.info(f"调试分析文件: {file.filename}, 大小: {len(file_content)} bytes")
-        
-        # 使用xmindparser直接解析，查看原始结构
-        file_obj = io.BytesIO(file_content)
-        xmind_data = xmindparser.xmind_to_dict(file_obj)
-        
-        # 打印原始数据结构（用于调试）
-        logger.info(f"XMind原始数据结构: {xmind_data}")
-        
-        # 提取所有标识符信息
-        all_markers = []
-        all_raw_nodes = []  # 保存所有原始节点数据
-        node_count = 0
-        
-        def extract_markers_debug(topic, path="", level=1):
-            nonlocal node_count
-            if not isinstance(topic, dict):
-                return
-                
-            title = topic.get('title', '').strip()
-            if title:
-                node_count += 1
-                current_path = f"{path} > {title}" if path else title
-                
-                # 保存完整的原始节点数据
-                all_raw_nodes.append({
-                    "path": current_path,
-                    "title": title,
-                    "level": level,
-                    "raw_data": topic  # 完整的原始数据
-                })
-                
-                # 收集原始标识符信息
-                markers = topic.get('markers', [])
-                if markers:
-                    logger.info(f"节点 '{title}' 发现标识符: {markers}")
-                    for marker in markers:
-                        all_markers.append({
-                            "node_path": current_path,
-                            "node_title": title,
-                            "node_level": level,
-                            "raw_marker": marker
-                        })
-                else:
-                    # 检查是否有其他可能的标识符字段
-                    possible_marker_fields = ['marker', 'flag', 'icon', 'symbol', 'priority', 'labels', 'tags']
-                    for field in possible_marker_fields:
-                        if field in topic and topic[field]:
-                            logger.info(f"节点 '{title}' 发现可能的标识符字段 '{field}': {topic[field]}")
-                
-                # 递归处理子节点
-                subtopics = topic.get('topics', [])
-                for subtopic in subtopics:
-                    extract_markers_debug(subtopic, current_path, level + 1)
-        
-        # 处理所有工作表
-        for sheet_idx, sheet in enumerate(xmind_data):
-            logger.info(f"处理工作表 {sheet_idx}: {list(sheet.keys())}")
-            root_topic = sheet.get('topic', {})
-            extract_markers_debug(root_topic)
-        
-        # 统计标识符类型
-        marker_types = {}
-        for marker_info in all_markers:
-            marker_data = marker_info['raw_marker']
-            logger.info(f"处理标识符数据: {marker_data}")
-            
-            if isinstance(marker_data, dict):
-                marker_id = marker_data.get('markerId', 'unknown')
-                marker_type = marker_data.get('markerType', 'unknown')
-                
-                # 记录所有可能的标识符字段
-                marker_key = f"{marker_id}_{marker_type}" if marker_type != 'unknown' else marker_id
-                
-                if marker_key not in marker_types:
-                    marker_types[marker_key] = {
-                        "count": 0,
-                        "examples": [],
-                        "raw_data": marker_data
-                    }
-                marker_types[marker_key]["count"] += 1
-                if len(marker_types[marker_key]["examples"]) < 3:
-                    marker_types[marker_key]["examples"].append(marker_info['node_title'])
-            elif isinstance(marker_data, str):
-                # 字符串类型的标识符
-                if marker_data not in marker_types:
-                    marker_types[marker_data] = {
-                        "count": 0,
-                        "examples": [],
-                        "raw_data": marker_data
-                    }
-                marker_types[marker_data]["count"] += 1
-                if len(marker_types[marker_data]["examples"]) < 3:
-                    marker_types[marker_data]["examples"].append(marker_info['node_title'])
-        
-        debug_result = {
-            "filename": file.filename,
-            "total_nodes": node_count,
-            "total_markers": len(all_markers),
-            "unique_marker_types": len(marker_types),
-            "marker_types": marker_types,
-            "all_markers": all_markers[:20],  # 显示前20个标识符
-            "sample_raw_nodes": all_raw_nodes[:10],  # 显示前10个原始节点
-            "xmind_structure_sample": xmind_data[:1] if xmind_data else [],  # 显示第一个工作表的结构
-            "supported_markers": [
-                {"id": "important", "name": "重要 (红色叹号)"},
-                {"id": "priority-1", "name": "优先级1 (红色1)"},
-                {"id": "priority-2", "name": "优先级2 (橙色2)"},
-                {"id": "priority-3", "name": "优先级3 (黄色3)"},
-                {"id": "priority-4", "name": "优先级4 (绿色4)"},
-                {"id": "priority-5", "name": "优先级5 (灰色5)"},
-                {"id": "flag-red", "name": "红旗"},
-                {"id": "flag-yellow", "name": "黄旗"},
-                {"id": "star-red", "name": "红星"},
-                {"id": "star-yellow", "name": "黄星"}
-            ]
-        }
-        
-        logger.info(f"调试分析完成: 节点={node_count}, 标识符={len(all_markers)}, 类型={len(marker_types)}")
-        logger.info(f"发现的标识符类型: {list(marker_types.keys())}")
+        # 流式接收并校验文件内容
+        file_content = await ingest_upload_bytes(file)
+        logger.info(f"调试分析文件: {file.filename}, 大小: {len(file_content)} bytes, offset={offset}, limit={limit}, max_depth={max_depth}")
         
-        return debug_result
+        # 解析为工作表结构（与导出使用同一份解析缓存）
+        xmind_data = await pipeline_executor.run(export_pipeline.parse_xmind, file_content)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"调试分析失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"调试分析失败: {str(e)}")
+    
+    # 同步生成器由StreamingResponse在线程池中逐段迭代，不阻塞事件循环
+    return StreamingResponse(
+        debug_inspector.stream_inspection(xmind_data, file.filename, offset, limit, max_depth, selected_fields),
+        media_type="application/json"
+    )
 
 @app.post("/api/analyze", response_model=AnalyzeResponse)
-async def analyze_xmind(file: UploadFile = File(...)):
+async def analyze_xmind(file: UploadFile = File(...), include_file_data: bool = False):
     """
     分析XMind文件，提取标识符信息
+    导出接口通过file_id引用文件，默认不再附带base64文件数据；仍需回传文件的客户端可传include_file_data=true
     """
     try:
         # 验证文件格式
         if not file.filename.endswith('.xmind'):
             raise HTTPException(status_code=400, detail="只支持.xmind格式文件")
         
-        # 读取文件内容
-        file_content = await file.read()
+        # 校验文件内容并计算SHA-256，解析和存储共用同一份字节
+        file_content, file_id = await ingest_upload_bytes(file, with_hash=True)
         logger.info(f"接收到文件: {file.filename}, 大小: {len(file_content)} bytes")
         
-        # 将文件内容转换为base64编码（供前端传递给导出接口）
-        file_data_base64 = base64.b64encode(file_content).decode('utf-8')
-        
         # 分析XMind文件
-        analysis_result = xmind_analyzer.analyze_markers(file_content, file.filename)
+        analysis_result = await pipeline_executor.run(export_pipeline.analyze_xmind, file_content, file.filename)
         
-        # 添加file_data到返回结果
-        analysis_result["file_data"] = file_data_base64
+        # 保存到服务端存储，导出接口可直接使用file_id（超过存储上限时不保存，返回None）
+        stored_id = await pipeline_executor.run(upload_store.put, file_content, file.filename, file_id=file_id, cpu_bound=False)
+        
+        # 添加file_data（base64编码，供前端传递给导出接口）和file_id到返回结果
+        # 文件未被保存时file_id不可用，始终回传file_data
+        analysis_result["file_data"] = encode_file_data(file_content) if include_file_data or stored_id is None else None
+        analysis_result["file_id"] = stored_id
         
         logger.info(f"分析完成，找到 {len(analysis_result['markers_found'])} 种标识符")
         
         return AnalyzeResponse(**analysis_result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"分析XMind文件时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文件分析失败: {str(e)}")
 
-@app.post("/api/export")
-async def export_smoke_cases(request: ExportRequest):
+@app.post("/api/markers/preview")
+async def preview_marker_selection(request: MarkerPreviewRequest):
+    """
+    选择预览：返回标识符组合命中的节点数（带标识节点数、导出保留节点数、各标识符节点数、按工作表/层级分布）
+    直接查询分析时建立的标识符倒排索引，不重新解析文件，供前端每次调整选择时调用
+    """
+    counts = export_pipeline.preview_cached_marker_selection(request.file_id, request.selected_markers)
+    if counts is None:
+        file_content = await pipeline_executor.run(upload_store.get, request.file_id, cpu_bound=False)
+        if file_content is None:
+            raise HTTPException(status_code=404, detail="文件已过期或不存在，请重新上传分析")
+        # 在主进程的线程池中构建，节点表留在主进程的解析缓存中供后续预览直接查询
+        counts = await pipeline_executor.run(
+            export_pipeline.preview_marker_selection, file_content, request.selected_markers, cpu_bound=False
+        )
+    return {"file_id": request.file_id, "selected_markers": request.selected_markers, **counts}
+
+@app.post("/api/export", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_smoke_cases(request: ExportRequest, response: Response):
     """
     根据选中的标识符导出冒烟测试用例
+    是否命中导出结果缓存通过X-Export-Cache响应头（HIT/MISS）返回
     """
     try:
         logger.info(f"开始导出冒烟用例，选中标识符: {request.selected_markers}")
@@ -364,29 +656,57 @@ async def export_smoke_cases(request: ExportRequest):
         if not request.selected_markers:
             raise HTTPException(status_code=400, detail="请至少选择一个标识符")
         
-        if not request.file_data:
-            raise HTTPException(status_code=400, detail="缺少文件数据")
+        file_data = await resolve_file_data(request)
+        
+        cache_key, cached = await pipeline_executor.run(
+            export_pipeline.lookup_cached_export,
+            'json',
+            request.selected_markers,
+            file_data,
+            cpu_bound=False
+        )
+        if cached is not None:
+            logger.info(f"♻️ 命中导出结果缓存: {cached['filename']}")
+            response.headers["X-Export-Cache"] = "HIT"
+            return json.loads(cached['content'])
         
         # 构建冒烟测试用例
-        smoke_cases = smoke_builder.build_smoke_cases(
+        smoke_cases = await pipeline_executor.run(
+            export_pipeline.build_smoke_cases,
             request.selected_markers,
-            request.file_data
+            file_data
         )
         
         total_cases = smoke_cases['smoke_test_suite']['metadata']['total_cases']
         logger.info(f"导出完成，生成 {total_cases} 个冒烟用例")
         
+        await pipeline_executor.run(
+            export_pipeline.store_cached_export,
+            cache_key,
+            {
+                'content': json.dumps(smoke_cases, ensure_ascii=False).encode('utf-8'),
+                'filename': export_pipeline.export_filename('json'),
+                'media_type': "application/json",
+                'export_details': {"total_cases": total_cases, "selected_markers": request.selected_markers}
+            },
+            cpu_bound=False
+        )
+        response.headers["X-Export-Cache"] = "MISS"
+        
         return smoke_cases
         
+    except (HTTPException, ExportCancelledError):
+        raise
     except Exception as e:
         logger.error(f"导出冒烟用例时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
 
-@app.post("/api/export-xmind")
-async def export_xmind_filtered(request: XMindExportRequest):
+@app.post("/api/export-xmind", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_xmind_filtered(request: XMindExportRequest, raw_request: Request, download: bool = False):
     """
     基于markerId精确过滤XMind文件并导出
     完全保持原始样式和结构
+    download=true或Accept为二进制类型时直接返回文件字节流
     """
     try:
         logger.info(f"🚀 开始基于markerId过滤XMind文件")
@@ -397,51 +717,93 @@ async def export_xmind_filtered(request: XMindExportRequest):
         if not request.selected_markers:
             raise HTTPException(status_code=400, detail="请至少选择一个标识符")
         
-        if not request.file_data:
-            raise HTTPException(status_code=400, detail="缺少文件数据")
+        file_data = await resolve_file_data(request)
         
-        # 验证base64数据
-        try:
-            file_bytes = base64.b64decode(request.file_data)
-            logger.info(f"原始文件大小: {len(file_bytes):,} bytes")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"文件数据解码失败: {str(e)}")
+        # 验证base64数据（file_id方式已是文件字节，无需解码）
+        if isinstance(file_data, str):
+            try:
+                file_data = await pipeline_executor.run(export_pipeline.decode_file_data, file_data)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"文件数据解码失败: {str(e)}")
+        logger.info(f"原始文件大小: {len(file_data):,} bytes")
+        
+        output_filename = export_pipeline.export_filename('xmind')
+        
+        # 命中导出结果缓存时直接返回过滤后的文件
+        cache_key, cached = await pipeline_executor.run(
+            export_pipeline.lookup_cached_export,
+            'xmind',
+            request.selected_markers,
+            file_data,
+            cpu_bound=False
+        )
+        if cached is not None:
+            logger.info(f"♻️ 命中导出结果缓存: {output_filename}")
+            filter_result = {
+                'file_bytes': cached['content'],
+                'processing_details': cached['export_details']['processing_details']
+            }
         
         # 使用新的markerId过滤器进行精确过滤
-        try:
-            filter_result = xmind_filter.filter_xmind_by_markers(
-                file_data=request.file_data,  # 直接传递base64数据
-                selected_markers=request.selected_markers,  # 使用新的参数名
-                engine='lxml'  # 使用lxml进行高性能处理
-            )
-            
-            logger.info(f"🎉 markerId过滤完成！")
-            logger.info(f"处理统计: {filter_result['processing_details']}")
+        else:
+            try:
+                filter_result = await pipeline_executor.run(
+                    export_pipeline.filter_xmind,
+                    file_data,  # 直接传递解码后的文件字节
+                    request.selected_markers,
+                    'lxml'  # 使用lxml进行高性能处理
+                )
+                
+                logger.info(f"🎉 markerId过滤完成！")
+                logger.info(f"处理统计: {filter_result['processing_details']}")
+                
+            except Exception as e:
+                logger.error(f"❌ markerId过滤失败: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"XMind文件过滤失败: {str(e)}")
             
-        except Exception as e:
-            logger.error(f"❌ markerId过滤失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"XMind文件过滤失败: {str(e)}")
+            await pipeline_executor.run(
+                export_pipeline.store_cached_export,
+                cache_key,
+                {
+                    'content': filter_result['file_bytes'],
+                    'filename': output_filename,
+                    'media_type': XMIND_MEDIA_TYPE,
+                    'export_details': {"processing_details": filter_result['processing_details']}
+                },
+                cpu_bound=False
+            )
+        
+        if wants_binary_response(raw_request, download):
+            return build_download_response(
+                filter_result['file_bytes'],
+                output_filename,
+                XMIND_MEDIA_TYPE,
+                {"processing_details": filter_result['processing_details']},
+                cache_hit=cached is not None
+            )
         
         # 返回结果
         return {
             "success": True,
             "message": "XMind文件基于markerId精确过滤成功",
-            "file_data": filter_result['file_data'],  # 已经是base64格式
-            "filename": "filtered_markers.xmind",
-            "processing_details": filter_result['processing_details']
+            "file_data": encode_file_data(filter_result['file_bytes']),
+            "filename": output_filename,
+            "processing_details": filter_result['processing_details'],
+            "cache_hit": cached is not None
         }
                 
-    except HTTPException:
+    except (HTTPException, ExportCancelledError):
         raise
     except Exception as e:
         logger.error(f"❌ XMind文件导出过程中发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"导出过程失败: {str(e)}")
 
-@app.post("/api/export-template")
-async def export_with_template_format(request: ExportRequest):
+@app.post("/api/export-template", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_with_template_format(request: ExportRequest, raw_request: Request, download: bool = False):
     """
     按照模版格式导出Excel
     输出结构完全匹配《冒烟用例导出模版.xlsx》
+    download=true或Accept为二进制类型时直接返回文件字节流
     """
     try:
         logger.info(f"🚀 开始按模版格式导出，选中标识符: {request.selected_markers}")
@@ -450,61 +812,65 @@ async def export_with_template_format(request: ExportRequest):
         if not request.selected_markers:
             raise HTTPException(status_code=400, detail="请至少选择一个标识符")
         
-        if not request.file_data:
-            raise HTTPException(status_code=400, detail="缺少文件数据")
+        file_data = await resolve_file_data(request)
+        
+        # 命中导出结果缓存时直接返回，无需重新构建用例和渲染
+        cache_key, cached = await pipeline_executor.run(
+            export_pipeline.lookup_cached_export,
+            'template',
+            request.selected_markers,
+            file_data,
+            cpu_bound=False
+        )
+        if cached is not None:
+            logger.info(f"♻️ 命中导出结果缓存: {cached['filename']}")
+            return excel_export_response(raw_request, download, "按模版格式导出Excel成功", cached, cache_hit=True)
         
         # 先生成标准的冒烟测试用例数据
-        smoke_cases = smoke_builder.build_smoke_cases(
+        smoke_cases = await pipeline_executor.run(
+            export_pipeline.build_smoke_cases,
             request.selected_markers,
-            request.file_data
+            file_data
         )
         
         total_cases = smoke_cases['smoke_test_suite']['metadata']['total_cases']
         logger.info(f"生成 {total_cases} 个冒烟用例，开始转换为模版格式")
         
         # 使用模版导出器生成Excel文件
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_filename = f"冒烟测试用例_模版格式_{timestamp}.xlsx"
+        output_filename = export_pipeline.export_filename('template')
         
         # 生成Excel文件
-        file_path = template_exporter.export_with_template_format(
-            smoke_cases,
-            output_filename
+        excel_data = await pipeline_executor.run(
+            export_pipeline.render_template_excel,
+            smoke_cases
         )
         
-        # 读取生成的文件并转换为base64
-        with open(file_path, 'rb') as f:
-            excel_data = f.read()
-        
-        excel_base64 = base64.b64encode(excel_data).decode('utf-8')
-        
-        # 清理临时文件
-        os.remove(file_path)
-        
         logger.info(f"✅ 模版格式导出完成，文件大小: {len(excel_data):,} bytes")
         
-        return {
-            "success": True,
-            "message": "按模版格式导出Excel成功",
-            "filename": output_filename,
-            "file_data": excel_base64,
-            "export_details": {
-                "total_cases": total_cases,
-                "selected_markers": request.selected_markers,
-                "export_format": "模版格式",
-                "columns": ["节点1", "节点2", "节点3", "节点4", "节点5", "端/API/服务", "冒烟结果", "研发对应负责人", "showcase问题", "是否核心功能", "是否影响主流程", "执行时间"]
-            }
+        export_details = export_pipeline.template_export_details(total_cases, request.selected_markers)
+        
+        result = {
+            'content': excel_data,
+            'filename': output_filename,
+            'media_type': XLSX_MEDIA_TYPE,
+            'export_details': export_details
         }
+        await pipeline_executor.run(export_pipeline.store_cached_export, cache_key, result, cpu_bound=False)
         
+        return excel_export_response(raw_request, download, "按模版格式导出Excel成功", result, cache_hit=False)
+        
+    except (HTTPException, ExportCancelledError):
+        raise
     except Exception as e:
         logger.error(f"❌ 模版格式导出失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"模版格式导出失败: {str(e)}")
 
-@app.post("/api/export-hierarchical")
-async def export_with_hierarchical_merge(request: ExportRequest):
+@app.post("/api/export-hierarchical", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_with_hierarchical_merge(request: ExportRequest, raw_request: Request, download: bool = False):
     """
     按照层级合并导出Excel（完全匹配模版的视觉效果）
     实现智能的单元格合并，提供最直观的层级视图
+    download=true或Accept为二进制类型时直接返回文件字节流
     """
     try:
         logger.info(f"🚀 开始按层级合并导出，选中标识符: {request.selected_markers}")
@@ -513,63 +879,66 @@ async def export_with_hierarchical_merge(request: ExportRequest):
         if not request.selected_markers:
             raise HTTPException(status_code=400, detail="请至少选择一个标识符")
         
-        if not request.file_data:
-            raise HTTPException(status_code=400, detail="缺少文件数据")
+        file_data = await resolve_file_data(request)
+        
+        # 命中导出结果缓存时直接返回，无需重新构建用例和渲染
+        cache_key, cached = await pipeline_executor.run(
+            export_pipeline.lookup_cached_export,
+            'hierarchical',
+            request.selected_markers,
+            file_data,
+            cpu_bound=False
+        )
+        if cached is not None:
+            logger.info(f"♻️ 命中导出结果缓存: {cached['filename']}")
+            return excel_export_response(raw_request, download, "按层级合并导出Excel成功", cached, cache_hit=True)
         
         # 先生成标准的冒烟测试用例数据
-        smoke_cases = smoke_builder.build_smoke_cases(
+        smoke_cases = await pipeline_executor.run(
+            export_pipeline.build_smoke_cases,
             request.selected_markers,
-            request.file_data
+            file_data
         )
         
         total_cases = smoke_cases['smoke_test_suite']['metadata']['total_cases']
         logger.info(f"生成 {total_cases} 个冒烟用例，开始转换为层级合并格式")
         
         # 使用层级导出器生成Excel文件
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_filename = f"层级合并_冒烟测试用例_{timestamp}.xlsx"
+        output_filename = export_pipeline.export_filename('hierarchical')
         
         # 生成Excel文件
-        file_path = hierarchical_exporter.export_with_hierarchical_merge(
-            smoke_cases,
-            output_filename
+        excel_data = await pipeline_executor.run(
+            export_pipeline.render_hierarchical_excel,
+            smoke_cases
         )
         
-        # 读取生成的文件并转换为base64
-        with open(file_path, 'rb') as f:
-            excel_data = f.read()
-        
-        excel_base64 = base64.b64encode(excel_data).decode('utf-8')
-        
-        # 清理临时文件
-        os.remove(file_path)
-        
         logger.info(f"✅ 层级合并导出完成，文件大小: {len(excel_data):,} bytes")
         
-        return {
-            "success": True,
-            "message": "按层级合并导出Excel成功",
-            "filename": output_filename,
-            "file_data": excel_base64,
-            "export_details": {
-                "total_cases": total_cases,
-                "selected_markers": request.selected_markers,
-                "export_format": "层级合并格式",
-                "features": ["智能单元格合并", "层级背景色", "直观树状结构"],
-                "columns": ["节点1", "节点2", "节点3", "节点4", "节点5", "端/API/服务", "冒烟结果", "研发对应负责人", "showcase问题", "是否核心功能", "是否影响主流程", "执行时间"]
-            }
+        export_details = export_pipeline.hierarchical_export_details(total_cases, request.selected_markers)
+        
+        result = {
+            'content': excel_data,
+            'filename': output_filename,
+            'media_type': XLSX_MEDIA_TYPE,
+            'export_details': export_details
         }
+        await pipeline_executor.run(export_pipeline.store_cached_export, cache_key, result, cpu_bound=False)
         
+        return excel_export_response(raw_request, download, "按层级合并导出Excel成功", result, cache_hit=False)
+        
+    except (HTTPException, ExportCancelledError):
+        raise
     except Exception as e:
         logger.error(f"❌ 层级合并导出失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"层级合并导出失败: {str(e)}")
 
-@app.post("/api/export-enhanced-hierarchical")
-async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
+@app.post("/api/export-enhanced-hierarchical", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_with_enhanced_hierarchical_merge(request: ExportRequest, raw_request: Request, download: bool = False):
     """
     增强版层级合并导出Excel（完美匹配模版的合并和视觉效果）
     在原有层级合并基础上进一步优化，实现更精确的模版匹配
     现在直接使用XMind过滤器与XMind导出一致的数据流
+    download=true或Accept为二进制类型时直接返回文件字节流
     """
     try:
         logger.info(f"🚀 开始增强版层级合并导出，选中标识符: {request.selected_markers}")
@@ -578,15 +947,27 @@ async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
         if not request.selected_markers:
             raise HTTPException(status_code=400, detail="请至少选择一个标识符")
         
-        if not request.file_data:
-            raise HTTPException(status_code=400, detail="缺少文件数据")
+        file_data = await resolve_file_data(request)
+        
+        # 命中导出结果缓存时直接返回，无需重新构建用例和渲染
+        cache_key, cached = await pipeline_executor.run(
+            export_pipeline.lookup_cached_export,
+            'enhanced',
+            request.selected_markers,
+            file_data,
+            cpu_bound=False
+        )
+        if cached is not None:
+            logger.info(f"♻️ 命中导出结果缓存: {cached['filename']}")
+            return excel_export_response(raw_request, download, "增强版层级合并导出Excel成功", cached, cache_hit=True)
         
         # 第1步：使用与XMind导出相同的过滤器处理数据（确保一致的数据流）
         try:
-            filter_result = xmind_filter.filter_xmind_by_markers(
-                file_data=request.file_data,
-                selected_markers=request.selected_markers,
-                engine='lxml'
+            filter_result = await pipeline_executor.run(
+                export_pipeline.filter_xmind,
+                file_data,
+                request.selected_markers,
+                'lxml'
             )
             
             logger.info(f"🔍 XMind过滤完成，处理统计: {filter_result['processing_details']}")
@@ -596,8 +977,7 @@ async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
             raise HTTPException(status_code=500, detail=f"数据处理失败: {str(e)}")
         
         # 第2步：将过滤后的XMind数据直接转换为Excel（而非重建结构）
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_filename = f"XMind结构化导出_冒烟测试用例_{timestamp}.xlsx"
+        output_filename = export_pipeline.export_filename('enhanced')
         
         # 解析过滤后的XMind数据
         filtered_data = None
@@ -605,24 +985,12 @@ async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
             if 'content_json' in filter_result:
                 filtered_data = filter_result['content_json']
             else:
-                # 提取过滤后的XMind内容
-                file_bytes = base64.b64decode(filter_result['file_data'])
-                with tempfile.NamedTemporaryFile(suffix='.xmind', delete=False) as temp_file:
-                    temp_file.write(file_bytes)
-                    temp_path = temp_file.name
-                
-                # 解压并读取content.json
-                with zipfile.ZipFile(temp_path, 'r') as zip_ref:
-                    with tempfile.TemporaryDirectory() as extract_dir:
-                        zip_ref.extractall(extract_dir)
-                        content_json_path = os.path.join(extract_dir, 'content.json')
-                        if os.path.exists(content_json_path):
-                            with open(content_json_path, 'r', encoding='utf-8') as f:
-                                filtered_data = json.load(f)
-                
-                # 清理临时文件
-                if 'temp_path' in locals() and os.path.exists(temp_path):
-                    os.unlink(temp_path)
+                # 提取过滤后的XMind内容（解压并读取content.json）
+                filtered_data = await pipeline_executor.run(
+                    export_pipeline.load_filtered_content,
+                    filter_result['file_bytes'],
+                    cpu_bound=False
+                )
                     
             if not filtered_data:
                 raise Exception("无法提取XMind数据结构")
@@ -635,20 +1003,11 @@ async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
         
         # 第3步：转换为Excel格式
         try:
-            file_path = xmind_to_excel.convert_to_excel(
-                filtered_data,
-                output_filename
+            excel_data = await pipeline_executor.run(
+                export_pipeline.render_xmind_excel,
+                filtered_data
             )
             
-            # 读取生成的文件并转换为base64
-            with open(file_path, 'rb') as f:
-                excel_data = f.read()
-            
-            excel_base64 = base64.b64encode(excel_data).decode('utf-8')
-            
-            # 清理临时文件
-            os.remove(file_path)
-            
             # 获取节点统计信息
             node_count = filter_result['processing_details'].get('nodes_processed', 0)
             sheets_processed = filter_result['processing_details'].get('sheets_processed', 0)
@@ -656,42 +1015,292 @@ async def export_with_enhanced_hierarchical_merge(request: ExportRequest):
             logger.info(f"✅ 增强版层级合并导出完成，文件大小: {len(excel_data):,} bytes")
             logger.info(f"📊 处理了 {sheets_processed} 个工作表，{node_count} 个节点")
             
-            return {
-                "success": True,
-                "message": "增强版层级合并导出Excel成功",
-                "filename": output_filename,
-                "file_data": excel_base64,
-                "export_details": {
-                    "total_cases": node_count,
-                    "selected_markers": request.selected_markers,
-                    "export_format": "XMind结构化导出",
-                    "features": [
-                        "与XMind导出完全一致的数据流", 
-                        "精确保留原始结构",
-                        "智能单元格合并", 
-                        "层级背景色优化",
-                        "完整数据映射",
-                        "精确列宽设置"
-                    ],
-                    "processing_details": filter_result['processing_details'],
-                    "columns": ["节点1", "节点2", "节点3", "节点4", "节点5", "端/API/服务", "冒烟结果", "研发对应负责人", "showcase问题", "是否核心功能", "是否影响主流程", "执行时间"],
-                    "improvements": [
-                        "与XMind导出完全一致的数据处理",
-                        "不再使用中间解构重建流程",
-                        "直接转换确保完整性",
-                        "增强的视觉层级效果"
-                    ]
-                }
+            export_details = export_pipeline.enhanced_export_details(
+                filter_result['processing_details'],
+                request.selected_markers
+            )
+            
+            result = {
+                'content': excel_data,
+                'filename': output_filename,
+                'media_type': XLSX_MEDIA_TYPE,
+                'export_details': export_details
             }
+            await pipeline_executor.run(export_pipeline.store_cached_export, cache_key, result, cpu_bound=False)
+            
+            return excel_export_response(raw_request, download, "增强版层级合并导出Excel成功", result, cache_hit=False)
             
         except Exception as e:
             logger.error(f"❌ Excel转换失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Excel转换失败: {str(e)}")
         
+    except (HTTPException, ExportCancelledError):
+        raise
     except Exception as e:
         logger.error(f"❌ 增强版层级合并导出失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"增强版层级合并导出失败: {str(e)}")
 
+@app.post("/api/export-bundle", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def export_bundle(request: ExportBundleRequest):
+    """
+    单次解析导出多种格式，返回一个zip
+    文件只解析一次，标识符过滤和冒烟用例构建在各格式间共享；zip内的manifest.json记录各格式的统计、耗时和失败信息
+    """
+    try:
+        logger.info(f"🚀 开始打包导出，格式: {request.formats}，选中标识符: {request.selected_markers}")
+        
+        if not request.selected_markers:
+            raise HTTPException(status_code=400, detail="请至少选择一个标识符")
+        
+        formats = list(dict.fromkeys(request.formats))
+        if not formats:
+            raise HTTPException(status_code=400, detail="请至少选择一种导出格式")
+        unknown_formats = [fmt for fmt in formats if fmt not in export_pipeline.EXPORT_FORMATS]
+        if unknown_formats:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的导出格式: {', '.join(unknown_formats)}，可选: {', '.join(export_pipeline.EXPORT_FORMATS)}"
+            )
+        
+        file_data = await resolve_file_data(request)
+        
+        results = await pipeline_executor.run(
+            export_pipeline.run_bundle_export,
+            formats,
+            request.selected_markers,
+            file_data
+        )
+        zip_data = await pipeline_executor.run(export_pipeline.build_bundle_zip, results, request.selected_markers)
+        
+        failed = [fmt for fmt, result in results.items() if 'error' in result]
+        if len(failed) == len(formats):
+            errors = "; ".join(f"{fmt}: {results[fmt]['error']}" for fmt in failed)
+            raise HTTPException(status_code=500, detail=f"打包导出失败: {errors}")
+        
+        logger.info(f"✅ 打包导出完成，成功 {len(formats) - len(failed)} 种格式，失败 {len(failed)} 种")
+        
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        return build_download_response(
+            zip_data,
+            f"冒烟测试用例_打包导出_{timestamp}.zip",
+            "application/zip",
+            {
+                "formats": formats,
+                "failed": failed,
+                "cache_hits": [fmt for fmt, result in results.items() if result.get('cache_hit')]
+            }
+        )
+        
+    except (HTTPException, ExportCancelledError):
+        raise
+    except Exception as e:
+        logger.error(f"❌ 打包导出失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"打包导出失败: {str(e)}")
+
+@app.post("/api/jobs")
+async def create_export_job(request: ExportJobRequest):
+    """
+    提交异步导出任务，立即返回job_id
+    通过GET /api/jobs/{job_id}轮询进度，完成后从GET /api/jobs/{job_id}/result下载结果
+    """
+    if request.format not in export_pipeline.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的导出格式: {request.format}，可选: {', '.join(export_pipeline.EXPORT_FORMATS)}"
+        )
+    if not request.selected_markers:
+        raise HTTPException(status_code=400, detail="请至少选择一个标识符")
+    
+    file_data = await resolve_file_data(request)
+    try:
+        # 提交时写入共享目录中的任务状态，在执行器线程中完成
+        job = await pipeline_executor.run(
+            export_job_manager.submit, request.format, request.selected_markers, file_data, cpu_bound=False
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    return {
+        "success": True,
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.job_id}",
+        "result_url": f"/api/jobs/{job.job_id}/result"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """查询导出任务状态（阶段、进度百分比、错误信息）"""
+    job = await pipeline_executor.run(export_job_manager.get, job_id, cpu_bound=False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_export_job_result(job_id: str):
+    """下载已完成导出任务的结果文件"""
+    job = await pipeline_executor.run(export_job_manager.get, job_id, cpu_bound=False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"导出任务失败: {job.error}")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"导出任务尚未完成，当前状态: {job.status}")
+    
+    # 任务可能在其他工作进程中完成，结果文件从共享目录读取
+    content = await pipeline_executor.run(job.read_content, cpu_bound=False)
+    if content is None:
+        raise HTTPException(status_code=404, detail="导出任务结果已过期")
+    
+    return build_download_response(content, job.filename, job.media_type, job.export_details, cache_hit=job.cache_hit)
+
+@app.get("/api/progress/{channel_id}/events")
+async def stream_progress_events(channel_id: str, request: Request):
+    """
+    以SSE推送导出进度（阶段切换、百分比、过滤/用例构建/写表的计数）
+    channel_id为异步导出任务的job_id，或同步导出请求的X-Progress-Id；通道结束时发送done事件后关闭
+    """
+    channel = await resolve_progress_channel(channel_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="进度通道不存在")
+    
+    async def event_stream():
+        async for snapshot in progress_updates(channel):
+            if await request.is_disconnected():
+                return
+            if snapshot is None:
+                yield ": keepalive\n\n"
+                continue
+            event = "done" if channel.done else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/progress/{channel_id}/ws")
+async def stream_progress_websocket(websocket: WebSocket, channel_id: str):
+    """以WebSocket推送导出进度，消息内容与SSE的data相同（另含event字段），通道结束后关闭连接"""
+    channel = await resolve_progress_channel(channel_id)
+    if channel is None:
+        await websocket.close(code=4404)
+        return
+    
+    await websocket.accept()
+    try:
+        async for snapshot in progress_updates(channel):
+            if snapshot is None:
+                await websocket.send_json({"event": "keepalive"})
+                continue
+            await websocket.send_json({"event": "done" if channel.done else "progress", **snapshot})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.post("/api/batch-export", dependencies=[Depends(export_cancellation), Depends(export_progress)])
+async def batch_export_files(
+    files: List[UploadFile] = File(...),
+    selected_markers: str = Form(""),
+    formats: str = Form("template")
+):
+    """
+    批量导出：上传多个.xmind文件（或包含.xmind文件的zip），返回一个zip
+    每个文件在工作进程中独立处理，zip中包含各文件的导出结果和manifest.json（耗时及失败信息）
+    
+    - selected_markers: 标识符列表（JSON数组或逗号分隔），为空时使用每个文件中识别到的全部标识符
+    - formats: 导出格式列表（JSON数组或逗号分隔），可选json/template/hierarchical/enhanced/xmind
+    - 文件数（zip展开后）上限为MAX_BATCH_FILES（默认50），超出时返回413
+    """
+    try:
+        if len(files) > batch_export.MAX_BATCH_FILES:
+            raise HTTPException(status_code=413, detail=str(batch_export.BatchTooLargeError(len(files))))
+        
+        try:
+            marker_list = batch_export.parse_list_field(selected_markers)
+            format_list = batch_export.parse_list_field(formats)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"参数格式错误: {str(e)}")
+        
+        if not format_list:
+            raise HTTPException(status_code=400, detail="请至少选择一种导出格式")
+        unknown_formats = [fmt for fmt in format_list if fmt not in export_pipeline.EXPORT_FORMATS]
+        if unknown_formats:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的导出格式: {', '.join(unknown_formats)}，可选: {', '.join(export_pipeline.EXPORT_FORMATS)}"
+            )
+        
+        # 流式接收并校验每个上传文件，未通过校验的文件记录到manifest而不是中断整个批次
+        uploads = []
+        rejected_reports = []
+        for file in files:
+            filename = file.filename or ""
+            # .zip上传为多个XMind文件的压缩包，不要求包含XMind内容文件
+            is_archive = filename.lower().endswith(".zip")
+            try:
+                ingested = await upload_ingestor.ingest(file, require_xmind=not is_archive)
+            except UploadRejectedError as e:
+                logger.warning(f"拒绝上传文件: {str(e)}")
+                rejected_reports.append(batch_export.failed_report(filename, file.size or 0, str(e)))
+                continue
+            with ingested:
+                uploads.append((filename, await pipeline_executor.run(ingested.read_bytes, cpu_bound=False)))
+        
+        try:
+            xmind_files, rejected_members = await pipeline_executor.run(batch_export.expand_uploads, uploads, cpu_bound=False)
+        except batch_export.BatchTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        rejected_reports.extend(rejected_members)
+        
+        if not xmind_files and not rejected_reports:
+            raise HTTPException(status_code=400, detail="没有找到可导出的.xmind文件")
+        
+        logger.info(f"📦 开始批量导出: {len(xmind_files)} 个文件，格式: {format_list}")
+        started = time.perf_counter()
+        
+        # 每个文件作为独立任务派发到工作进程并行处理
+        reports = await asyncio.gather(*[
+            pipeline_executor.run(
+                batch_export.export_file,
+                filename,
+                content,
+                marker_list,
+                format_list,
+                prefer_process=True
+            )
+            for filename, content in xmind_files
+        ])
+        reports = list(reports) + rejected_reports
+        
+        total_seconds = time.perf_counter() - started
+        zip_data = await pipeline_executor.run(
+            batch_export.build_batch_zip,
+            reports,
+            marker_list,
+            format_list,
+            total_seconds
+        )
+        
+        failed = sum(1 for report in reports if report["status"] == "failed")
+        logger.info(f"✅ 批量导出完成: {len(reports)} 个文件，失败 {failed} 个，耗时 {total_seconds:.2f}s")
+        
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        return build_download_response(
+            zip_data,
+            f"批量导出_{timestamp}.zip",
+            "application/zip",
+            {"total_files": len(reports), "failed": failed, "formats": format_list}
+        )
+        
+    except (HTTPException, ExportCancelledError):
+        raise
+    except Exception as e:
+        logger.error(f"❌ 批量导出失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量导出失败: {str(e)}")
+
 def create_xmind_metadata(build_path: Path):
     """
     创建XMind文件所需的元数据文件
@@ -704,6 +1313,14 @@ def start_server():
     host = os.getenv("HOST", "0.0.0.0")
     log_level = os.getenv("LOG_LEVEL", "info")
     
+    workers = serving.configured_workers()
+
+    if workers > 1:
+        serving.run_multiprocess(app, host, port, log_level, workers)
+        return
+
+    # 单进程模式同样执行启动自检，失败时拒绝启动
+    serving.startup_self_check()
     logger.info(f"Starting server on {host}:{port}")
     uvicorn.run(
         app, 
@@ -713,5 +1330,10 @@ def start_server():
     )
 
 if __name__ == "__main__":
+    if "--measure-startup" in sys.argv:
+        import startup_profile
+        print(startup_profile.render_report())
+        sys.exit(0)
+
     logger.info("🚀 正在启动XMind冒烟测试用例导出工具API服务器...")
     start_server() 
\ No newline at end of file
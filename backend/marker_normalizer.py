@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+标识符规范化引擎
+把XMind中各种形式的标识符（markerId、别名、中文名、数字、字典结构）映射为统一的标识符ID，
+供XMindAnalyzer、SmokeCaseBuilder和XMindMarkerFilter共用，保证分析结果与导出筛选使用同一套映射
+- 别名表和正则表达式在模块加载时构建/编译一次
+- 字符串标识符的映射结果按原始值LRU缓存，每个导图的规范化开销只与不同标识符的数量有关
+- 可通过配置追加别名（优先于内置别名）
+
+配置：
+- XMIND_MARKER_ALIASES: 追加别名，格式为"别名=标识符ID,别名=标识符ID"，如"p0=important,阻塞=important"
+- XMIND_MARKER_ALIASES_FILE: 追加别名的JSON文件路径，内容为{"别名": "标识符ID"}
+- XMIND_MARKER_CACHE_SIZE: 映射结果缓存的条目数（默认4096）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 内置别名（键为小写去空白后的原始值）
+MARKER_ALIASES: Dict[str, str] = {
+    # 官方标识符
+    'important': 'important',
+    'priority-1': 'priority-1',
+    'priority-2': 'priority-2',
+    'priority-3': 'priority-3',
+    'priority-4': 'priority-4',
+    'priority-5': 'priority-5',
+    'flag-red': 'flag-red',
+    'flag-yellow': 'flag-yellow',
+    'star-red': 'star-red',
+    'star-yellow': 'star-yellow',
+
+    # 变体形式
+    'priority_1': 'priority-1',
+    'priority_2': 'priority-2',
+    'priority_3': 'priority-3',
+    'priority_4': 'priority-4',
+    'priority_5': 'priority-5',
+    'priority1': 'priority-1',
+    'priority2': 'priority-2',
+    'priority3': 'priority-3',
+    'priority4': 'priority-4',
+    'priority5': 'priority-5',
+
+    # 数字形式
+    '1': 'priority-1',
+    '2': 'priority-2',
+    '3': 'priority-3',
+    '4': 'priority-4',
+    '5': 'priority-5',
+
+    # 旗帜变体
+    'flag_red': 'flag-red',
+    'flag_yellow': 'flag-yellow',
+    'red_flag': 'flag-red',
+    'yellow_flag': 'flag-yellow',
+    'red-flag': 'flag-red',
+    'yellow-flag': 'flag-yellow',
+    'flagred': 'flag-red',
+    'flagyellow': 'flag-yellow',
+
+    # 星星变体
+    'star_red': 'star-red',
+    'star_yellow': 'star-yellow',
+    'red_star': 'star-red',
+    'yellow_star': 'star-yellow',
+    'red-star': 'star-red',
+    'yellow-star': 'star-yellow',
+    'starred': 'star-red',
+    'staryellow': 'star-yellow',
+
+    # 重要性变体
+    'exclamation': 'important',
+    'warning': 'important',
+    'alert': 'important',
+    'critical': 'important',
+    '!': 'important',
+    '重要': 'important',
+    '警告': 'important',
+    '关键': 'important',
+
+    # 中文标识符
+    '红旗': 'flag-red',
+    '黄旗': 'flag-yellow',
+    '红星': 'star-red',
+    '黄星': 'star-yellow',
+    '优先级1': 'priority-1',
+    '优先级2': 'priority-2',
+    '优先级3': 'priority-3',
+    '优先级4': 'priority-4',
+    '优先级5': 'priority-5',
+}
+
+# 字典形式的标识符中依次尝试的ID字段
+MARKER_ID_FIELDS = ('markerId', 'markerID', 'id', 'type', 'name', 'symbol', 'key')
+
+PRIORITY_PATTERN = re.compile(r'(?:priority|优先级)[-_\s]*([1-5])')
+RED_WORDS = ('red', '红', 'rouge')
+YELLOW_WORDS = ('yellow', '黄', 'jaune')
+FLAG_WORDS = ('flag', '旗', 'drapeau')
+STAR_WORDS = ('star', '星', 'étoile')
+IMPORTANT_WORDS = ('important', '重要', 'critical', '关键', 'urgent', '紧急')
+
+
+def load_extra_aliases() -> Dict[str, str]:
+    """读取配置中追加的别名，格式错误的条目记录警告后忽略"""
+    aliases: Dict[str, str] = {}
+
+    path = os.getenv("XMIND_MARKER_ALIASES_FILE", "")
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                aliases.update({str(key): str(value) for key, value in json.load(f).items()})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"无法读取标识符别名文件 {path}: {str(e)}")
+
+    for item in filter(None, (part.strip() for part in os.getenv("XMIND_MARKER_ALIASES", "").split(","))):
+        alias, separator, marker_id = item.partition("=")
+        if not separator or not alias.strip() or not marker_id.strip():
+            logger.warning(f"忽略格式错误的标识符别名配置: {item}")
+            continue
+        aliases[alias] = marker_id.strip()
+
+    return aliases
+
+
+class MarkerNormalizer:
+    """标识符规范化（线程安全，映射结果按原始字符串缓存）"""
+
+    def __init__(self, extra_aliases: Optional[Dict[str, str]] = None, cache_size: int = 4096):
+        self.aliases = dict(MARKER_ALIASES)
+        for alias, marker_id in (extra_aliases or {}).items():
+            self.aliases[alias.lower().strip()] = marker_id
+        self._map_cached = lru_cache(maxsize=cache_size)(self._map_string)
+        # 生效别名表的指纹：配置的别名会改变导出筛选结果，参与导出结果缓存键
+        self.fingerprint = hashlib.sha256(
+            json.dumps(sorted(self.aliases.items()), ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+
+    def normalize(self, marker_ref: Any) -> Optional[str]:
+        """
+        将XMind标识符引用映射为标识符ID
+
+        Args:
+            marker_ref: 字符串、字典（markerId等字段）或数字形式的标识符
+
+        Returns:
+            标识符ID，无法映射时返回None
+        """
+        if marker_ref is None:
+            return None
+
+        if isinstance(marker_ref, str):
+            return self._map_cached(marker_ref)
+
+        if isinstance(marker_ref, dict):
+            return self._normalize_dict(marker_ref)
+
+        if isinstance(marker_ref, (int, float)) and not isinstance(marker_ref, bool):
+            marker_str = str(int(marker_ref))
+            if marker_str in ('1', '2', '3', '4', '5'):
+                return f'priority-{marker_str}'
+
+        logger.debug("未知的标识符格式: %s (类型: %s)", marker_ref, type(marker_ref))
+        return None
+
+    def _normalize_dict(self, marker_dict: Dict) -> Optional[str]:
+        """依次尝试字典中的ID字段，都没有时按整个字典的字符串表示映射"""
+        found_field = False
+        for field in MARKER_ID_FIELDS:
+            value = marker_dict.get(field)
+            if value:
+                found_field = True
+                marker_id = self._map_cached(str(value))
+                if marker_id:
+                    return marker_id
+        if found_field:
+            return None
+        return self._map_cached(str(marker_dict))
+
+    def _map_string(self, marker_str: str) -> Optional[str]:
+        """映射字符串类型的标识符：别名表 → 优先级模式 → 颜色/形状关键词 → 重要性关键词"""
+        marker_str = marker_str.lower().strip()
+
+        marker_id = self.aliases.get(marker_str)
+        if marker_id:
+            return marker_id
+
+        priority_match = PRIORITY_PATTERN.search(marker_str)
+        if priority_match:
+            return f'priority-{priority_match.group(1)}'
+
+        if any(word in marker_str for word in RED_WORDS):
+            if any(word in marker_str for word in FLAG_WORDS):
+                return 'flag-red'
+            if any(word in marker_str for word in STAR_WORDS):
+                return 'star-red'
+            return 'important'  # 红色默认为重要
+
+        if any(word in marker_str for word in YELLOW_WORDS):
+            if any(word in marker_str for word in FLAG_WORDS):
+                return 'flag-yellow'
+            if any(word in marker_str for word in STAR_WORDS):
+                return 'star-yellow'
+
+        if any(word in marker_str for word in IMPORTANT_WORDS):
+            return 'important'
+
+        return None
+
+    def cache_info(self) -> Dict[str, int]:
+        """映射结果缓存统计"""
+        info = self._map_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+# 创建全局实例
+marker_normalizer = MarkerNormalizer(load_extra_aliases(), int(os.getenv("XMIND_MARKER_CACHE_SIZE", 4096)))
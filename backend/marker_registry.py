@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+标识符注册表
+为单个导图（或单次过滤）中的标识符ID分配位序号，节点的标识符集合用一个int位掩码表示：
+- 按选中标识符筛选只需一次按位与，不再逐个比较标识符列表
+- 位序号按首次注册的顺序分配，可以预先注册固定的标识符使其位序号确定
+
+注册表在构建期间由单个线程写入，之后只读共享
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class MarkerRegistry:
+    """标识符ID -> 位序号"""
+
+    def __init__(self, marker_ids: Iterable[str] = ()):
+        self.marker_ids: List[str] = []
+        self._bits: Dict[str, int] = {}
+        # 位掩码 -> 位序号列表
+        self._mask_bits: Dict[int, Tuple[int, ...]] = {}
+        for marker_id in marker_ids:
+            self.register(marker_id)
+
+    def __len__(self) -> int:
+        return len(self.marker_ids)
+
+    def __contains__(self, marker_id: str) -> bool:
+        return marker_id in self._bits
+
+    def register(self, marker_id: str) -> int:
+        """注册标识符并返回位序号，已注册的直接返回"""
+        bit = self._bits.get(marker_id)
+        if bit is None:
+            bit = len(self.marker_ids)
+            self.marker_ids.append(marker_id)
+            self._bits[marker_id] = bit
+        return bit
+
+    def bit(self, marker_id: str) -> Optional[int]:
+        """标识符的位序号，未注册时返回None"""
+        return self._bits.get(marker_id)
+
+    def mask(self, markers: Iterable[str]) -> int:
+        """标识符列表的位掩码，未注册的标识符自动注册"""
+        mask = 0
+        for marker_id in markers:
+            mask |= 1 << self.register(marker_id)
+        return mask
+
+    def selection_mask(self, markers: Iterable[str]) -> int:
+        """选中标识符的位掩码，未注册的标识符忽略（导图中没有该标识符，不会命中任何节点）"""
+        mask = 0
+        for marker_id in markers:
+            bit = self._bits.get(marker_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def matches(self, markers: Iterable[str], selection_mask: int) -> bool:
+        """标识符列表中是否有选中的标识符（不注册新标识符，用于不保存掩码的一次性检查）"""
+        for marker_id in markers:
+            bit = self._bits.get(marker_id)
+            if bit is not None and selection_mask >> bit & 1:
+                return True
+        return False
+
+    def bits(self, mask: int) -> Tuple[int, ...]:
+        """位掩码包含的位序号（按位序号升序，结果按掩码缓存）"""
+        bits = self._mask_bits.get(mask)
+        if bits is None:
+            bits = tuple(bit for bit in range(mask.bit_length()) if mask >> bit & 1)
+            self._mask_bits[mask] = bits
+        return bits
+
+    def markers_of(self, mask: int) -> List[str]:
+        """位掩码对应的标识符ID列表"""
+        return [self.marker_ids[bit] for bit in self.bits(mask)]
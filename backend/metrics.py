@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+轻量级指标采集
+- stage_timer / timed_stage：记录解码、解压、解析、过滤、用例构建、写表、合并单元格、保存等阶段耗时
+- 指标以Prometheus文本格式在/metrics暴露（直方图、计数器和瞬时值，按endpoint和engine打标签）
+- 同一请求内的阶段耗时汇总后写入Server-Timing响应头
+
+进程池模式下工作进程内的阶段耗时不会回传到API主进程
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = []
+    for name, value in items:
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """带标签的瞬时值"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """带标签的直方图"""
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., 总和, 总数]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for index, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {state[index]}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, documentation)
+            return self._metrics[name]
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Gauge(name, documentation)
+            return self._metrics[name]
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """Prometheus文本格式输出"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestTiming:
+    """单个请求内的阶段耗时记录"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def add(self, stage: str, seconds: float):
+        self.stages.append((stage, seconds))
+
+    def server_timing(self) -> str:
+        """生成Server-Timing响应头（同名阶段累加，单位毫秒）"""
+        totals: "OrderedDict[str, float]" = OrderedDict()
+        for stage, seconds in list(self.stages):
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# 创建全局实例
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "xmind_stage_duration_seconds",
+    "Duration of export pipeline stages in seconds"
+)
+stage_errors = registry.counter(
+    "xmind_stage_errors_total",
+    "Number of export pipeline stages that raised an exception"
+)
+http_request_duration = registry.histogram(
+    "xmind_http_request_duration_seconds",
+    "HTTP request duration in seconds"
+)
+http_requests = registry.counter(
+    "xmind_http_requests_total",
+    "Number of HTTP requests"
+)
+
+_current_timing: contextvars.ContextVar = contextvars.ContextVar("xmind_request_timing", default=None)
+
+
+@contextmanager
+def request_timing_scope(endpoint: str) -> Iterator[RequestTiming]:
+    """在代码块内记录一个请求的阶段耗时"""
+    timing = RequestTiming(endpoint)
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+
+
+def current_endpoint() -> str:
+    timing = _current_timing.get()
+    return timing.endpoint if timing is not None else "background"
+
+
+@contextmanager
+def stage_timer(stage: str, engine: str = "") -> Iterator[None]:
+    """
+    记录一个阶段的耗时
+
+    Args:
+        stage: 阶段名（decode/unzip/parse/extract_markers/filter/build_cases/write_sheet/merge_cells/save/encode等）
+        engine: 处理引擎（如lxml、minidom、xmindparser、openpyxl）
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage, endpoint=current_endpoint(), engine=engine)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        timing = _current_timing.get()
+        stage_duration.observe(
+            seconds,
+            stage=stage,
+            endpoint=timing.endpoint if timing is not None else "background",
+            engine=engine
+        )
+        if timing is not None:
+            timing.add(stage, seconds)
+
+
+def timed_stage(stage: str, engine: str = "") -> Callable:
+    """stage_timer的装饰器形式"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage, engine):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
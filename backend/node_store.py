@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+紧凑节点表
+用并行数组按先序保存XMind节点，代替每个节点一个字典（完整路径字符串 + 原始节点引用 + 子节点列表）：
+- parent、level、title_id、first_child、next_sibling、marker_set为array('i')列，每个节点只占几个整数
+- 标题按内容驻留，相同标题只保存一份；标识符列表按组合驻留，marker_mask列为组合对应的位掩码（位序号由导图的MarkerRegistry分配）
+- 节点路径不在构建时拼接，只在输出行时沿父节点链生成
+- 构建时同步建立标识符倒排索引（标识符 -> 有序节点序号）和按标识符组合/工作表/层级的节点计数，
+  标识符统计、示例节点、导出筛选和选择预览都从索引查得，不再遍历全部节点
+
+节点表不引用解析结构，建成后工作表字典可以随解析缓存淘汰
+"""
+
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from cancellation import check_cancelled
+from marker_registry import MarkerRegistry
+from progress import report_count
+
+# 无父节点/子节点/兄弟节点
+NO_NODE = -1
+
+PATH_SEPARATOR = ' > '
+
+
+class NodeTable:
+    """先序排列的节点表（构建后只读，可在线程间共享）"""
+
+    def __init__(self):
+        self.parent = array('i')
+        self.level = array('i')
+        self.title_id = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.marker_set = array('i')
+        # 节点的标识符位掩码（同一组合的节点共享同一个int对象）
+        self.marker_mask: List[int] = []
+
+        self.titles: List[str] = []
+        self._title_ids: Dict[str, int] = {}
+
+        # 标识符组合（保持节点上的原始顺序）及其位掩码，0号为空组合
+        self.marker_sets: List[Tuple[str, ...]] = [()]
+        self._marker_set_ids: Dict[Tuple[str, ...], int] = {(): 0}
+        self._marker_set_masks: List[int] = [0]
+
+        # 标识符 -> 位序号（按首次出现的顺序分配）
+        self.registry = MarkerRegistry()
+
+        # 倒排索引：位序号 -> 带该标识符的节点序号（按先序追加，天然升序）
+        self.postings: List[array] = []
+        # (标识符组合, 工作表序号, 层级) -> 节点数，任意标识符组合的计数只需遍历这些键
+        self.set_counts: Dict[Tuple[int, int, int], int] = {}
+        # 每个工作表第一个节点的序号
+        self.sheet_start = array('i')
+        # 子树结束位置（不含），节点i的子树为[i, subtree_end[i])，seal时生成
+        self.subtree_end = array('i')
+
+        # 构建期间每个节点的最后一个子节点，用于追加兄弟链
+        self._last_child = array('i')
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @classmethod
+    def from_sheets(
+        cls,
+        sheets: List[Dict],
+        extract_markers: Callable[[Dict], List[str]],
+        counter: Optional[str] = None
+    ) -> "NodeTable":
+        """
+        从工作表结构构建节点表
+
+        Args:
+            sheets: 工作表字典列表（每个工作表的根节点在topic字段）
+            extract_markers: 从节点字典提取标识符ID列表的函数
+            counter: 进度计数名称，为None时不上报
+        """
+        table = cls()
+        for sheet in sheets:
+            table.add_topic(sheet.get('topic', {}), extract_markers, counter)
+        table.seal()
+        return table
+
+    def add_topic(self, root: Any, extract_markers: Callable[[Dict], List[str]], counter: Optional[str] = None):
+        """
+        按先序追加一棵节点树（显式栈，不受递归深度限制），每棵树计为一个工作表
+        没有标题的节点及其子树跳过，根节点层级为1
+        """
+        self.sheet_start.append(len(self.parent))
+        stack = [(root, NO_NODE, 1)]
+        while stack:
+            check_cancelled()
+            topic, parent, level = stack.pop()
+            if not isinstance(topic, dict):
+                continue
+            title = (topic.get('title') or '').strip()
+            if not title:
+                continue
+
+            index = self._append(title, level, parent, extract_markers(topic))
+            if counter:
+                report_count(counter, index + 1)
+
+            subtopics = topic.get('topics') or []
+            for subtopic in reversed(subtopics):
+                stack.append((subtopic, index, level + 1))
+
+    def _append(self, title: str, level: int, parent: int, markers: Sequence[str]) -> int:
+        index = len(self.parent)
+        title_id = self._title_ids.get(title)
+        if title_id is None:
+            title_id = len(self.titles)
+            self.titles.append(title)
+            self._title_ids[title] = title_id
+
+        set_id = self._intern_markers(markers)
+        self.parent.append(parent)
+        self.level.append(level)
+        self.title_id.append(title_id)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self._last_child.append(NO_NODE)
+        self.marker_set.append(set_id)
+        self.marker_mask.append(self._marker_set_masks[set_id])
+
+        if set_id:
+            for bit in self.registry.bits(self._marker_set_masks[set_id]):
+                self.postings[bit].append(index)
+        count_key = (set_id, len(self.sheet_start) - 1, level)
+        self.set_counts[count_key] = self.set_counts.get(count_key, 0) + 1
+
+        if parent != NO_NODE:
+            previous = self._last_child[parent]
+            if previous == NO_NODE:
+                self.first_child[parent] = index
+            else:
+                self.next_sibling[previous] = index
+            self._last_child[parent] = index
+        return index
+
+    def _intern_markers(self, markers: Sequence[str]) -> int:
+        key = tuple(markers)
+        set_id = self._marker_set_ids.get(key)
+        if set_id is None:
+            set_id = len(self.marker_sets)
+            self.marker_sets.append(key)
+            self._marker_set_ids[key] = set_id
+            self._marker_set_masks.append(self.registry.mask(key))
+            while len(self.postings) < len(self.registry):
+                self.postings.append(array('i'))
+        return set_id
+
+    def seal(self):
+        """构建完成：生成子树范围，释放只在构建期间使用的索引"""
+        # 逆先序遍历时子节点先于父节点，子树结束位置逐级向上传递
+        parent = self.parent
+        subtree_end = array('i', range(1, len(parent) + 1))
+        for index in range(len(parent) - 1, -1, -1):
+            parent_index = parent[index]
+            if parent_index != NO_NODE and subtree_end[index] > subtree_end[parent_index]:
+                subtree_end[parent_index] = subtree_end[index]
+        self.subtree_end = subtree_end
+
+        self._last_child = array('i')
+        self._title_ids = {}
+
+    def nbytes(self) -> int:
+        """估算占用的字节数（用于解析缓存的容量预算）"""
+        columns = (self.parent, self.level, self.title_id, self.first_child, self.next_sibling,
+                   self.marker_set, self.sheet_start, self.subtree_end, *self.postings)
+        return (sum(column.itemsize * len(column) for column in columns)
+                + 8 * len(self.marker_mask)
+                + sum(len(title.encode('utf-8')) for title in self.titles))
+
+    def mask_of(self, markers: Sequence[str]) -> int:
+        """标识符列表对应的位掩码（本表中不存在的标识符忽略）"""
+        return self.registry.selection_mask(markers)
+
+    def marker_summary(self, sample_limit: int = 3) -> List[Tuple[str, int, List[str]]]:
+        """
+        从倒排索引读取所有标识符的节点数和示例标题
+
+        Returns:
+            [(标识符ID, 节点数, 前sample_limit个节点标题)]，按标识符首次出现的顺序
+        """
+        return [
+            (marker_id, len(nodes), [self.title(index) for index in nodes[:sample_limit]])
+            for marker_id, nodes in zip(self.registry.marker_ids, self.postings)
+        ]
+
+    def marked_nodes(self, selection_mask: Optional[int] = None) -> List[int]:
+        """
+        带任一选中标识符的节点序号（升序），由倒排索引合并得到
+
+        Args:
+            selection_mask: 选中标识符的位掩码，为None时表示任一标识符
+        """
+        if selection_mask is None:
+            selection_mask = (1 << len(self.registry)) - 1
+        bits = self.registry.bits(selection_mask)
+        if len(bits) == 1:
+            return self.postings[bits[0]].tolist()
+        merged: Set[int] = set()
+        for bit in bits:
+            merged.update(self.postings[bit])
+        return sorted(merged)
+
+    def export_selection(self, selection_mask: int) -> Tuple[List[int], List[Tuple[int, int]], Set[int]]:
+        """
+        按导出的三重逻辑（节点本身有标识、祖先有标识、后代有标识）确定保留的节点，只访问带标识的节点及其祖先
+
+        Returns:
+            (带标识的节点序号, 保留的子树范围[(起, 止)]（互不重叠，按序排列）, 仅作为路径保留的祖先节点)
+        """
+        marked = self.marked_nodes(selection_mask)
+        subtrees: List[Tuple[int, int]] = []
+        path_nodes: Set[int] = set()
+        parent = self.parent
+        covered_end = 0
+        for index in marked:
+            if index < covered_end:
+                # 已在带标识祖先的子树中
+                continue
+            covered_end = self.subtree_end[index]
+            subtrees.append((index, covered_end))
+            # 新子树的祖先不会落在之前的子树中，沿父节点链向上直到遇到已记录的祖先
+            ancestor = parent[index]
+            while ancestor != NO_NODE and ancestor not in path_nodes:
+                path_nodes.add(ancestor)
+                ancestor = parent[ancestor]
+        return marked, subtrees, path_nodes
+
+    def export_nodes(self, selection_mask: int) -> Tuple[List[int], Set[int]]:
+        """
+        导出保留的节点序号（先序）
+
+        Returns:
+            (保留的节点序号, 仅作为路径保留的祖先节点)
+        """
+        _, subtrees, path_nodes = self.export_selection(selection_mask)
+        kept = list(path_nodes)
+        for start, end in subtrees:
+            kept.extend(range(start, end))
+        kept.sort()
+        return kept, path_nodes
+
+    def selection_counts(self, selected_markers: Sequence[str]) -> Dict[str, Any]:
+        """
+        标识符组合的节点计数，不遍历节点：
+        带标识节点数及按工作表/层级的分布从组合计数汇总，各标识符节点数取倒排索引长度，
+        导出节点数由保留子树的范围长度和路径祖先数相加
+
+        Returns:
+            {"marked_nodes", "export_nodes", "markers": {标识符ID: 节点数}, "by_sheet": [每个工作表的节点数], "by_level": {层级: 节点数}}
+        """
+        selection_mask = self.mask_of(selected_markers)
+        by_sheet = [0] * len(self.sheet_start)
+        by_level: Dict[int, int] = {}
+        marked_count = 0
+        export_count = 0
+        if selection_mask:
+            set_masks = self._marker_set_masks
+            for (set_id, sheet, level), count in self.set_counts.items():
+                if set_masks[set_id] & selection_mask:
+                    marked_count += count
+                    by_sheet[sheet] += count
+                    by_level[level] = by_level.get(level, 0) + count
+
+            _, subtrees, path_nodes = self.export_selection(selection_mask)
+            export_count = sum(end - start for start, end in subtrees) + len(path_nodes)
+
+        markers: Dict[str, int] = {}
+        for marker_id in selected_markers:
+            bit = self.registry.bit(marker_id)
+            markers[marker_id] = len(self.postings[bit]) if bit is not None else 0
+
+        return {
+            "marked_nodes": marked_count,
+            "export_nodes": export_count,
+            "markers": markers,
+            "by_sheet": by_sheet,
+            "by_level": dict(sorted(by_level.items()))
+        }
+
+    def title(self, index: int) -> str:
+        return self.titles[self.title_id[index]]
+
+    def markers(self, index: int) -> List[str]:
+        return list(self.marker_sets[self.marker_set[index]])
+
+    def has_children(self, index: int) -> bool:
+        return self.first_child[index] != NO_NODE
+
+    def children(self, index: int) -> Iterator[int]:
+        """按顺序遍历直接子节点"""
+        child = self.first_child[index]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def path_titles(self, index: int) -> List[str]:
+        """从根节点到该节点的标题列表"""
+        titles = []
+        while index != NO_NODE:
+            titles.append(self.titles[self.title_id[index]])
+            index = self.parent[index]
+        titles.reverse()
+        return titles
+
+    def path(self, index: int) -> str:
+        return PATH_SEPARATOR.join(self.path_titles(index))
+
+    def node(self, index: int) -> Dict[str, Any]:
+        """生成单个节点的字典（路径和子节点标题在此时才生成）"""
+        level = self.level[index]
+        return {
+            'title': self.title(index),
+            'path': self.path(index),
+            'level': level,
+            'markers': self.markers(index),
+            'has_children': self.has_children(index),
+            'children': [{'title': self.title(child), 'level': level + 1} for child in self.children(index)]
+        }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+XMind解析结果缓存
+按文件内容的SHA-256缓存XMind工作表结构和解压后的压缩包成员，
+同一文件在分析、用例构建、过滤等阶段只需解析/解压一次
+- 工作表结构由xmind_reader只读取content.json/content.xml生成，不解压其他成员
+- 压缩包全部成员只在过滤（需要重新打包）时才解压
+- 节点表（含标识符倒排索引）在首次分析/构建时生成，之后的分析、导出筛选和选择预览直接查索引
+
+XMIND_READER=xmindparser可切换回xmindparser.xmind_to_dict解析
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 工作表解析器：native（xmind_reader）或xmindparser
+XMIND_READER = os.getenv("XMIND_READER", "native").lower()
+
+# xmindparser内部使用模块级全局缓存保存解压内容，并发解析时需要串行化
+_xmindparser_lock = threading.Lock()
+
+
+class ParsedMap:
+    """单个XMind文件的解析结果（只读共享，调用方不得修改）"""
+
+    def __init__(self, file_hash: str):
+        self.file_hash = file_hash
+        # 压缩包成员：路径 -> 解压后的字节，首次使用时填充
+        self.members: Optional[Dict[str, bytes]] = None
+        # 工作表结构，首次使用时填充
+        self.sheets: Optional[List[Dict]] = None
+        # 节点表（node_store.NodeTable），首次使用时由工作表结构构建
+        self.node_table: Optional[Any] = None
+        # 以解压后内容大小估算内存占用，工作表结构按内容成员的大小计入，节点表按nbytes()计入
+        self.size = 0
+        self._lock = threading.Lock()
+
+
+class ParsedMapCache:
+    """解析结果LRU缓存（条目数 + 总字节数双重上限）"""
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("PARSE_CACHE_MAX_ENTRIES", 32))
+        # 默认128MB
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("PARSE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+        self._entries: "OrderedDict[str, ParsedMap]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def compute_hash(file_content: bytes) -> str:
+        """计算文件内容的SHA-256（与上传存储的file_id一致）"""
+        return hashlib.sha256(file_content).hexdigest()
+
+    def _lookup(self, file_hash: str) -> Optional[ParsedMap]:
+        """查找缓存条目并更新LRU顺序"""
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            if entry is not None:
+                self._entries.move_to_end(file_hash)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _store(self, entry: ParsedMap):
+        """写入缓存条目并按预算淘汰"""
+        with self._lock:
+            old = self._entries.pop(entry.file_hash, None)
+            if old is not None:
+                self._total_bytes -= old.size
+
+            if entry.size > self.max_bytes or self.max_entries <= 0:
+                # 单个文件超出缓存容量时不缓存
+                return
+
+            self._entries[entry.file_hash] = entry
+            self._total_bytes += entry.size
+
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+                self.evictions += 1
+
+    def _resize(self, entry: ParsedMap, extra_bytes: int):
+        """条目内容增加后更新占用并按预算淘汰"""
+        with self._lock:
+            entry.size += extra_bytes
+            if self._entries.get(entry.file_hash) is not entry:
+                return
+            self._total_bytes += extra_bytes
+
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+                self.evictions += 1
+
+    def get(self, file_content: bytes) -> ParsedMap:
+        """
+        获取文件的解析条目，未命中时创建空条目并缓存（成员和工作表结构按需填充）
+
+        Args:
+            file_content: XMind文件的字节内容
+
+        Returns:
+            ParsedMap条目
+        """
+        file_hash = self.compute_hash(file_content)
+        entry = self._lookup(file_hash)
+        if entry is not None:
+            return entry
+
+        entry = ParsedMap(file_hash)
+        self._store(entry)
+        return entry
+
+    def get_members(self, file_content: bytes) -> Dict[str, bytes]:
+        """获取XMind压缩包解压后的全部成员（路径 -> 字节）"""
+        entry = self.get(file_content)
+        if entry.members is None:
+            with entry._lock:
+                if entry.members is None:
+                    with stage_timer('unzip', 'zipfile'), zipfile.ZipFile(io.BytesIO(file_content), 'r') as zip_ref:
+                        members = {
+                            info.filename: zip_ref.read(info.filename)
+                            for info in zip_ref.infolist()
+                            if not info.is_dir()
+                        }
+                    entry.members = members
+                    self._resize(entry, sum(len(data) for data in members.values()))
+                    logger.debug(f"解析缓存已解压: {entry.file_hash[:12]}..., {entry.size} bytes")
+        return entry.members
+
+    def get_sheets(self, file_content: bytes) -> List[Dict]:
+        """获取XMind工作表结构"""
+        return self._load_sheets(self.get(file_content), file_content)
+
+    def _load_sheets(self, entry: ParsedMap, file_content: bytes) -> List[Dict]:
+        if entry.sheets is None:
+            with entry._lock:
+                if entry.sheets is None:
+                    if XMIND_READER == "xmindparser":
+                        sheets, size = self._parse_with_xmindparser(file_content)
+                    else:
+                        # xmind_reader在首次解析时才导入，缩短服务冷启动时间
+                        from xmind_reader import read_sheets
+                        with stage_timer('parse', 'xmind_reader'):
+                            sheets, size = read_sheets(file_content)
+                    entry.sheets = sheets
+                    self._resize(entry, size)
+        return entry.sheets
+
+    def get_node_table(self, file_content: bytes, build: Callable[[List[Dict]], Any]) -> Any:
+        """
+        获取节点表，首次使用时解析工作表结构并由build构建
+
+        Args:
+            file_content: XMind文件的字节内容
+            build: 由工作表结构构建节点表的函数（需提供nbytes()用于容量预算）
+        """
+        entry = self.get(file_content)
+        if entry.node_table is None:
+            sheets = self._load_sheets(entry, file_content)
+            with entry._lock:
+                if entry.node_table is None:
+                    node_table = build(sheets)
+                    entry.node_table = node_table
+                    self._resize(entry, node_table.nbytes())
+        return entry.node_table
+
+    def peek_node_table(self, file_hash: str) -> Optional[Any]:
+        """按文件哈希（即file_id）获取已构建的节点表，无需文件内容；未缓存时返回None"""
+        entry = self._lookup(file_hash)
+        return entry.node_table if entry is not None else None
+
+    @staticmethod
+    def _parse_with_xmindparser(file_content: bytes):
+        """使用xmindparser解析（需解压全部内容，以文件大小估算占用）"""
+        from xmindparser import xmind_to_dict
+        with _xmindparser_lock, stage_timer('parse', 'xmindparser'):
+            return xmind_to_dict(io.BytesIO(file_content)), len(file_content)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# 创建全局实例
+parsed_map_cache = ParsedMapCache()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+导出流水线进度上报
+各处理阶段调用report_stage声明阶段切换、report_count更新行/节点计数，由当前上下文中注册的进度接收者（如导出任务）记录
+未注册接收者时调用开销可忽略
+
+同步导出请求可通过X-Progress-Id请求头指定进度通道ID，客户端从/api/progress/{id}/events（SSE）
+或/api/progress/{id}/ws（WebSocket）订阅同一通道的实时进度
+
+通道状态同时写入共享目录，多进程服务下订阅请求落到其他工作进程时读取该文件
+"""
+
+import contextvars
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from shared_files import read_json, remove_quietly, scan_files, write_json
+
+logger = logging.getLogger(__name__)
+
+# 流水线阶段及其开始时对应的进度百分比
+PIPELINE_STAGES = {
+    'parse': 5,
+    'filter': 25,
+    'build_cases': 45,
+    'render': 65,
+    'save': 90
+}
+
+_current_reporter: contextvars.ContextVar = contextvars.ContextVar("xmind_progress_reporter", default=None)
+
+
+class ProgressReporter:
+    """进度接收者基类，子类覆盖on_stage处理阶段切换、on_count处理计数更新"""
+
+    def on_stage(self, stage: str):
+        pass
+
+    def on_count(self, counter: str, value: int, total: Optional[int] = None):
+        pass
+
+
+class ProgressChannel(ProgressReporter):
+    """
+    可订阅的进度状态
+    每次更新递增version，订阅者比较version判断是否需要推送；
+    计数在工作线程中更新，读取方只做快照，不需要加锁
+    """
+
+    FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+    def __init__(self):
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.progress = 0
+        self.error: Optional[str] = None
+        self.counters: Dict[str, Tuple[int, Optional[int]]] = {}
+        self.version = 0
+        self.updated_at = time.time()
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    def on_stage(self, stage: str):
+        """记录流水线阶段切换，进度只增不减"""
+        self.stage = stage
+        self.progress = max(self.progress, PIPELINE_STAGES.get(stage, self.progress))
+        self._touch()
+
+    def on_count(self, counter: str, value: int, total: Optional[int] = None):
+        self.counters[counter] = (value, total)
+        self._touch()
+
+    def start(self):
+        """开始（或重新开始）一次导出，清空上一次的进度"""
+        self.status = "running"
+        self.stage = None
+        self.progress = 0
+        self.error = None
+        self.counters = {}
+        self._touch()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        """结束通道（succeeded/failed/cancelled）"""
+        self.status = status
+        self.error = error
+        if status == "succeeded":
+            self.progress = 100
+        self._touch()
+
+    @property
+    def done(self) -> bool:
+        return self.status in self.FINAL_STATUSES
+
+    def refresh(self):
+        """读取最新状态；进程内通道直接由导出线程更新，无需读取"""
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进度（阶段、百分比、各计数的当前值和总数）"""
+        return {
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "counters": {
+                name: {"value": value, "total": total}
+                for name, (value, total) in list(self.counters.items())
+            },
+            "version": self.version
+        }
+
+
+class SharedProgressChannel(ProgressChannel):
+    """
+    状态同步写入共享目录的进度通道
+    导出所在的工作进程写入，其他工作进程通过view()得到只读副本，refresh()时读取文件中的最新状态；
+    计数更新频繁，写文件按PERSIST_INTERVAL秒节流，开始、阶段切换和结束立即写入
+    """
+
+    PERSIST_INTERVAL = 0.25
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self._readonly = False
+        self._persisted_at = 0.0
+        # 只读副本上次读取时文件的修改时间，未变化时不重新读取
+        self._loaded_mtime: Optional[int] = None
+
+    @classmethod
+    def view(cls, path: str) -> "SharedProgressChannel":
+        """其他进程写入的通道的只读副本（文件尚未写入时为排队状态）"""
+        channel = cls(path)
+        channel._readonly = True
+        channel.refresh()
+        return channel
+
+    def state(self) -> Dict[str, Any]:
+        """写入共享目录的状态"""
+        return {**self.snapshot(), "updated_at": self.updated_at}
+
+    def apply_state(self, state: Dict[str, Any]):
+        """用共享目录中读取的状态覆盖当前状态"""
+        self.status = state.get("status", self.status)
+        self.stage = state.get("stage")
+        self.progress = state.get("progress", 0)
+        self.error = state.get("error")
+        self.counters = {
+            name: (counter.get("value", 0), counter.get("total"))
+            for name, counter in (state.get("counters") or {}).items()
+        }
+        self.version = state.get("version", self.version)
+        self.updated_at = state.get("updated_at", self.updated_at)
+
+    def persist(self, force: bool = True):
+        """写入共享目录，写入失败只记录日志，不影响导出"""
+        if self.path is None or self._readonly:
+            return
+        now = time.monotonic()
+        if not force and now - self._persisted_at < self.PERSIST_INTERVAL:
+            return
+        self._persisted_at = now
+        try:
+            write_json(self.path, self.state())
+        except OSError as e:
+            logger.warning(f"写入进度状态失败: {str(e)}")
+
+    def refresh(self):
+        if not self._readonly:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        state = read_json(self.path)
+        if state is not None:
+            self._loaded_mtime = mtime
+            self.apply_state(state)
+
+    def on_stage(self, stage: str):
+        super().on_stage(stage)
+        self.persist()
+
+    def on_count(self, counter: str, value: int, total: Optional[int] = None):
+        super().on_count(counter, value, total)
+        self.persist(force=False)
+
+    def start(self):
+        super().start()
+        self.persist()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        super().finish(status, error)
+        self.persist()
+
+
+class ProgressHub:
+    """
+    同步导出请求的进度通道注册表
+    导出请求在本进程创建可写通道并写入共享目录，订阅方优先使用本进程的通道，否则读取共享目录；
+    通道结束或闲置超过ttl秒后清理
+    """
+
+    def __init__(self, max_channels: Optional[int] = None, ttl: Optional[int] = None, channel_dir: Optional[str] = None):
+        self.max_channels = max_channels if max_channels is not None else int(os.getenv("XMIND_PROGRESS_MAX_CHANNELS", 256))
+        self.ttl = ttl if ttl is not None else int(os.getenv("XMIND_PROGRESS_TTL", 600))
+        self.channel_dir = channel_dir or os.getenv(
+            "XMIND_PROGRESS_DIR",
+            os.path.join(tempfile.gettempdir(), "xmind-progress")
+        )
+        self._channels: Dict[str, SharedProgressChannel] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, channel_id: str) -> str:
+        # channel_id由调用方按PROGRESS_ID_PATTERN校验，只含字母、数字、-和_
+        return os.path.join(self.channel_dir, f"{channel_id}.json")
+
+    def _cleanup(self):
+        now = time.time()
+        expired = [
+            channel_id for channel_id, channel in self._channels.items()
+            if now - channel.updated_at > self.ttl
+        ]
+        for channel_id in expired:
+            del self._channels[channel_id]
+        # 超出上限时优先淘汰已结束的通道，其次是最久未更新的通道
+        if len(self._channels) >= self.max_channels:
+            ordered = sorted(self._channels.items(), key=lambda item: (not item[1].done, item[1].updated_at))
+            for channel_id, _ in ordered[:len(self._channels) - self.max_channels + 1]:
+                del self._channels[channel_id]
+        # 共享目录中闲置超时的通道文件（包括其他进程写入的）
+        for channel_id, mtime, _ in scan_files(self.channel_dir, ".json"):
+            if now - mtime > self.ttl:
+                remove_quietly(self._path(channel_id))
+
+    def channel(self, channel_id: str) -> SharedProgressChannel:
+        """获取（必要时创建）本进程中可写的进度通道，供导出请求写入"""
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                self._cleanup()
+                try:
+                    os.makedirs(self.channel_dir, exist_ok=True)
+                except OSError as e:
+                    logger.warning(f"无法创建进度目录 {self.channel_dir}: {str(e)}")
+                channel = SharedProgressChannel(self._path(channel_id))
+                self._channels[channel_id] = channel
+            return channel
+
+    def subscribe(self, channel_id: str) -> ProgressChannel:
+        """订阅进度通道：导出在本进程中时直接使用该通道，否则读取共享目录（可在导出开始前订阅）"""
+        with self._lock:
+            channel = self._channels.get(channel_id)
+        return channel if channel is not None else SharedProgressChannel.view(self._path(channel_id))
+
+
+def report_stage(stage: str):
+    """声明进入某个流水线阶段"""
+    reporter = _current_reporter.get()
+    if reporter is not None:
+        reporter.on_stage(stage)
+
+
+def report_count(counter: str, value: int, total: Optional[int] = None):
+    """
+    更新一个计数（如已处理的节点数、已生成的用例数、已写入的行数）
+
+    Args:
+        counter: 计数名（filter_nodes/extract_nodes/build_cases/write_rows）
+        value: 当前值
+        total: 总数，未知时为None
+    """
+    reporter = _current_reporter.get()
+    if reporter is not None:
+        reporter.on_count(counter, value, total)
+
+
+@contextmanager
+def progress_scope(reporter: Optional[ProgressReporter]) -> Iterator[None]:
+    """在代码块内注册进度接收者"""
+    token = _current_reporter.set(reporter)
+    try:
+        yield
+    finally:
+        _current_reporter.reset(token)
+
+
+# 创建全局实例
+progress_hub = ProgressHub()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+按请求采集性能剖析数据（需显式开启）
+- 环境变量XMIND_PROFILING=1时，请求头X-Profile: 1或查询参数profile=true的请求会在cProfile下运行
+- 流水线执行器中的阶段在各自工作线程中剖析，结果汇总为一份pstats文件
+- 剖析文件保存在有上限的目录中，通过/api/debug/profiles/{profile_id}查看
+
+开启剖析的请求在线程池中执行所有阶段（不派发到进程池），以便采集到解析、XPath和openpyxl的耗时
+"""
+
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("xmind_profile_session", default=None)
+
+
+class ProfileSession:
+    """单个请求的剖析会话，汇总各工作线程的剖析结果"""
+
+    def __init__(self, endpoint: str):
+        self.profile_id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.started = time.time()
+        self.skipped_calls = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        """合并一个阶段的剖析结果"""
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    @property
+    def stats(self) -> Optional[pstats.Stats]:
+        return self._stats
+
+
+class ProfileStore:
+    """剖析文件存储（按文件数上限淘汰最旧的文件）"""
+
+    def __init__(self, profile_dir: Optional[str] = None, max_files: Optional[int] = None):
+        self.enabled = os.getenv("XMIND_PROFILING", "0").lower() in ("1", "true", "yes")
+        self.profile_dir = profile_dir or os.getenv(
+            "XMIND_PROFILE_DIR",
+            os.path.join(tempfile.gettempdir(), "xmind-profiles")
+        )
+        self.max_files = max_files if max_files is not None else int(os.getenv("XMIND_PROFILE_MAX_FILES", 50))
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.profile_dir, f"{profile_id}.pstats")
+
+    def save(self, session: ProfileSession) -> Optional[str]:
+        """
+        保存会话的剖析结果
+
+        Returns:
+            剖析文件路径，会话中没有任何剖析数据时返回None
+        """
+        if session.stats is None:
+            return None
+
+        with self._lock:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = self._path(session.profile_id)
+            session.stats.dump_stats(path)
+            self._evict()
+
+        logger.info(f"已保存请求剖析数据: {session.profile_id} ({session.endpoint})")
+        return path
+
+    def _evict(self):
+        """超出文件数上限时删除最旧的剖析文件"""
+        profiles = self._list_files()
+        for name, _ in profiles[:max(0, len(profiles) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.profile_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def _list_files(self) -> List[tuple]:
+        """按修改时间升序列出剖析文件"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+        files = []
+        for name in os.listdir(self.profile_dir):
+            if name.endswith(".pstats") and PROFILE_ID_PATTERN.match(name[:-7]):
+                try:
+                    files.append((name, os.path.getmtime(os.path.join(self.profile_dir, name))))
+                except FileNotFoundError:
+                    continue
+        return sorted(files, key=lambda item: item[1])
+
+    def get_path(self, profile_id: str) -> Optional[str]:
+        """获取剖析文件路径，ID非法或文件不存在时返回None"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self._path(profile_id)
+        return path if os.path.exists(path) else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """列出已保存的剖析文件（最新的在前）"""
+        return [
+            {"profile_id": name[:-7], "created_at": mtime}
+            for name, mtime in reversed(self._list_files())
+        ]
+
+    def render_report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        """生成文本格式的剖析报告（按sort排序的前limit个函数）"""
+        path = self.get_path(profile_id)
+        if path is None:
+            return None
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def profiling_requested(headers: Any, query_params: Any) -> bool:
+    """请求是否声明需要剖析（请求头X-Profile或查询参数profile）"""
+    flag = headers.get("x-profile") or query_params.get("profile") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+
+def current_session() -> Optional[ProfileSession]:
+    return _current_session.get()
+
+
+@contextmanager
+def profile_scope(session: ProfileSession) -> Iterator[ProfileSession]:
+    """在代码块内注册剖析会话，期间派发到执行器的阶段都会被剖析"""
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+
+
+def run_profiled(call: Callable[[], Any]) -> Any:
+    """
+    在当前剖析会话下运行一个阶段，没有会话时直接运行
+    同一线程已有其他剖析器运行（或解释器不支持多个剖析器）时不剖析该阶段
+    """
+    session = _current_session.get()
+    if session is None:
+        return call()
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        session.skipped_calls += 1
+        return call()
+
+    try:
+        return call()
+    finally:
+        profiler.disable()
+        session.add(profiler)
+
+
+# 创建全局实例
+profile_store = ProfileStore()
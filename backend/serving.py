@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+生产环境多进程服务模式
+- XMIND_WORKERS（未设置时读取WEB_CONCURRENCY）大于1时，由gunicorn主进程预加载应用（解析器、过滤器、openpyxl等模块）
+  后fork出多个UvicornWorker工作进程，各进程共享预加载模块的内存页
+- 上传存储（file_id）、导出任务状态及结果、进度通道和导出结果缓存都保存在共享目录中，
+  后续请求落到任一工作进程都能读到；解析缓存（含标识符预览使用的节点表）按进程保存，未命中时从上传存储重新解析
+- 每个工作进程有独立的解析缓存预算（默认将整机预算按进程数平分），执行器线程数和进程池大小也按进程数平分
+- 工作进程处理XMIND_MAX_REQUESTS个请求后平滑重启，限制openpyxl等带来的内存增长
+- 启动前执行自检（Excel渲染、XML过滤、共享目录可写），失败时拒绝启动；单进程模式同样执行
+
+gunicorn不可用时（如Windows）回退为uvicorn多进程模式（不预加载）
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def configured_workers() -> int:
+    """服务工作进程数"""
+    return max(1, int(os.getenv("XMIND_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+
+
+def preload_modules():
+    """在fork之前加载重量级模块和所有导出器，工作进程通过写时复制共享这些内存页"""
+    import export_pipeline
+    timings = export_pipeline.warm_up()
+    logger.info(f"预加载完成: {', '.join(f'{name}={seconds * 1000:.0f}ms' for name, seconds in timings.items())}")
+
+
+def startup_self_check():
+    """
+    启动自检：渲染一个最小的Excel、用lxml过滤一个最小的content.xml、检查共享目录可写
+    （导出结果缓存、上传存储、导出任务、进度通道），任何一步失败都抛出RuntimeError
+    """
+    import export_pipeline
+    from export_cache import export_result_cache
+    from export_jobs import export_job_manager
+    from progress import progress_hub
+    from upload_store import upload_store
+    from xmind_marker_filter import xmind_filter
+
+    smoke_cases = {
+        "smoke_test_suite": {
+            "metadata": {"source_file": "self-check.xmind", "export_time": "", "selected_markers": ["priority-1"], "total_cases": 0},
+            "test_cases": []
+        }
+    }
+    try:
+        excel_data = export_pipeline.render_template_excel(smoke_cases)
+        if not excel_data.startswith(b"PK"):
+            raise ValueError("Excel输出不是有效的xlsx文件")
+
+        content_xml = (
+            b'<?xml version="1.0" encoding="UTF-8"?>'
+            b'<xmap-content><sheet><topic><title>root</title></topic></sheet></xmap-content>'
+        )
+        stats: Dict[str, Any] = {}
+        xmind_filter.filter_content_xml_lxml(content_xml, ["priority-1"], stats)
+
+        shared_dirs = [upload_store.store_dir, export_job_manager.job_dir, progress_hub.channel_dir]
+        if export_result_cache.enabled:
+            shared_dirs.append(export_result_cache.cache_dir)
+        for directory in shared_dirs:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.TemporaryFile(dir=directory):
+                pass
+    except Exception as e:
+        raise RuntimeError(f"启动自检失败: {str(e)}") from e
+
+    logger.info("✅ 启动自检通过")
+
+
+def apply_worker_budgets(workers: int):
+    """
+    设置当前工作进程的解析缓存预算和执行器线程数
+    WORKER_PARSE_CACHE_MAX_BYTES显式设置单进程预算，未设置时将整机预算（PARSE_CACHE_MAX_BYTES）按进程数平分；
+    上传存储位于共享目录，UPLOAD_STORE_MAX_BYTES即所有进程共用的上限，不再平分
+    """
+    from parse_cache import parsed_map_cache
+    from task_executor import pipeline_executor
+
+    parsed_map_cache.max_bytes = int(os.getenv("WORKER_PARSE_CACHE_MAX_BYTES", parsed_map_cache.max_bytes // workers))
+    parsed_map_cache.max_entries = max(1, parsed_map_cache.max_entries // workers)
+    if "XMIND_EXECUTOR_WORKERS" not in os.environ:
+        pipeline_executor.max_workers = max(1, (os.cpu_count() or 2) // workers)
+    if "XMIND_PROCESS_WORKERS" not in os.environ:
+        pipeline_executor.process_workers = max(1, (os.cpu_count() or 1) // workers)
+
+    logger.info(
+        f"工作进程 {os.getpid()} 预算: 解析缓存 {parsed_map_cache.max_bytes:,} bytes/{parsed_map_cache.max_entries} 条, "
+        f"执行器线程 {pipeline_executor.max_workers}, 进程池 {pipeline_executor.process_workers}"
+    )
+
+
+def run_multiprocess(app: Any, host: str, port: int, log_level: str, workers: int):
+    """以多进程模式启动服务（阻塞直到主进程退出）"""
+    preload_modules()
+    startup_self_check()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.warning("未安装gunicorn，回退为uvicorn多进程模式（不预加载模块、不按请求数重启工作进程）")
+        import uvicorn
+        uvicorn.run("main:app", host=host, port=port, log_level=log_level, workers=workers)
+        return
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "max_requests": int(os.getenv("XMIND_MAX_REQUESTS", 1000)),
+        "max_requests_jitter": int(os.getenv("XMIND_MAX_REQUESTS_JITTER", 100)),
+        "graceful_timeout": int(os.getenv("XMIND_GRACEFUL_TIMEOUT", 30)),
+        "timeout": int(os.getenv("XMIND_WORKER_TIMEOUT", 300)),
+        "loglevel": log_level,
+        "post_fork": lambda server, worker: apply_worker_budgets(workers),
+    }
+
+    class XMindApplication(BaseApplication):
+        """以已加载的应用对象运行gunicorn"""
+
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    logger.info(f"🚀 多进程模式启动: {workers} 个工作进程, 每个进程处理约 {options['max_requests']} 个请求后重启")
+    XMindApplication().run()
+    sys.exit(0)
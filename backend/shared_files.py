@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+多进程共享目录的文件读写
+导出结果缓存、上传存储、导出任务和进度通道把状态保存在共享目录中，多个工作进程读写同一份数据：
+- 写入先写同目录下的临时文件再替换，其他进程不会读到半写入的文件
+- 读取和删除容忍文件已被其他进程删除
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+def atomic_write(path: str, data: bytes):
+    """原子写入文件（目录需已存在），失败时抛出OSError"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        remove_quietly(tmp_path)
+        raise
+
+
+def write_json(path: str, data: Dict[str, Any]):
+    """原子写入JSON文件"""
+    atomic_write(path, json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    """读取JSON文件，不存在或内容损坏时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_quietly(*paths: str):
+    """删除文件，已不存在时忽略"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def scan_files(directory: str, suffix: str) -> Iterator[Tuple[str, float, int]]:
+    """列出目录中指定后缀的文件，产出（去掉后缀的文件名, 修改时间, 大小）"""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if not entry.name.endswith(suffix):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        yield entry.name[:-len(suffix)], stat.st_mtime, stat.st_size
@@ -1,16 +1,24 @@
 import logging
 import base64
-import io
 import json
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from xmindparser import xmind_to_dict
+from typing import Dict, List, Any, Optional, Union
+from xmind_parser import xmind_bytes_to_node_table, extract_node_markers
+from node_store import NodeTable
+from progress import report_stage, report_count
+from metrics import stage_timer
+from hot_path_log import stage_log, node_event
+from tracing import traced, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
 
 logger = logging.getLogger(__name__)
 
 class SmokeCaseBuilder:
     """冒烟测试用例构建器"""
     
+    # 输出格式版本，修改输出内容时需递增，并同步export_pipeline中的identity（用于导出结果缓存失效）
+    VERSION = "1.2.0"
+    
     def __init__(self):
         # 优先级映射规则
         self.priority_mapping = {
@@ -32,13 +40,14 @@ class SmokeCaseBuilder:
         # 配置类关键词（需要排除）
         self.config_keywords = ['配置', '环境', '数据准备', '初始化', '设置', '安装', '部署']
     
-    def build_smoke_cases(self, selected_markers: List[str], file_data: str) -> Dict[str, Any]:
+    @traced()
+    def build_smoke_cases(self, selected_markers: List[str], file_data: Union[str, bytes]) -> Dict[str, Any]:
         """
         构建冒烟测试用例
         
         Args:
             selected_markers: 用户选中的标识符列表
-            file_data: base64编码的XMind文件数据或测试数据
+            file_data: base64编码的XMind文件数据或测试数据，也可以直接传入文件字节内容
             
         Returns:
             符合规范的冒烟测试用例JSON
@@ -47,26 +56,25 @@ class SmokeCaseBuilder:
             logger.info(f"开始构建冒烟用例，选中标识符: {selected_markers}")
             
             # 尝试解析文件数据
-            all_nodes = []
+            report_stage('parse')
+            node_table = None
             try:
                 # 首先尝试作为XMind文件解析
-                file_content = base64.b64decode(file_data)
-                file_obj = io.BytesIO(file_content)
-                xmind_data = xmind_to_dict(file_obj)
+                file_content = self._decode_file_data(file_data)
                 
-                # 提取所有节点
-                for sheet in xmind_data:
-                    root_topic = sheet.get('topic', {})
-                    self._extract_nodes_recursive(root_topic, [], all_nodes)
+                # 提取所有节点（与分析阶段共用解析缓存中的节点表）
+                node_table = xmind_bytes_to_node_table(file_content, 'extract_nodes')
                 
-                logger.info(f"从XMind文件解析得到 {len(all_nodes)} 个节点")
+                logger.info(f"从XMind文件解析得到 {len(node_table)} 个节点")
                 
+            except ExportCancelledError:
+                raise
             except Exception as e:
                 # 如果XMind解析失败，尝试作为测试数据处理
                 logger.info(f"XMind解析失败: {str(e)}, 尝试解析为测试数据")
                 try:
                     # 解码测试数据
-                    decoded_data = base64.b64decode(file_data).decode('utf-8')
+                    decoded_data = self._decode_file_data(file_data).decode('utf-8')
                     # 去掉Python字符串表示的外层包装
                     if decoded_data.startswith("{'topic'"):
                         # 这是Python字典字符串，需要安全解析
@@ -75,23 +83,32 @@ class SmokeCaseBuilder:
                         test_data = json.loads(decoded_data)
                     
                     # 从测试数据构建节点
-                    if 'topic' in test_data:
-                        self._extract_nodes_recursive(test_data['topic'], [], all_nodes)
+                    node_table = NodeTable.from_sheets([test_data], extract_node_markers, 'extract_nodes')
                     
-                    logger.info(f"从测试数据解析得到 {len(all_nodes)} 个节点")
+                    logger.info(f"从测试数据解析得到 {len(node_table)} 个节点")
                     
+                except ExportCancelledError:
+                    raise
                 except Exception as e2:
                     logger.error(f"测试数据解析也失败: {str(e2)}")
                     # 如果都失败了，生成默认测试用例
-                    all_nodes = self._generate_default_test_nodes(selected_markers)
-                    logger.info(f"使用默认测试节点，生成 {len(all_nodes)} 个节点")
+                    node_table = None
             
             # 筛选符合条件的节点
-            filtered_nodes = self._filter_nodes_by_markers(all_nodes, selected_markers)
-            logger.info(f"标识符筛选后得到 {len(filtered_nodes)} 个节点")
-            
-            # 进一步筛选适合冒烟测试的节点
-            smoke_nodes = self._filter_suitable_smoke_nodes(filtered_nodes)
+            report_stage('filter')
+            with stage_timer('filter'), stage_log('filter', logger):
+                if node_table is not None:
+                    total_nodes = len(node_table)
+                    filtered_nodes = self._filter_nodes_by_markers(node_table, selected_markers)
+                else:
+                    # 默认测试节点都带有选中的标识符，无需筛选
+                    filtered_nodes = self._generate_default_test_nodes(selected_markers)
+                    total_nodes = len(filtered_nodes)
+                    logger.info(f"使用默认测试节点，生成 {total_nodes} 个节点")
+                logger.info(f"标识符筛选后得到 {len(filtered_nodes)} 个节点")
+                
+                # 进一步筛选适合冒烟测试的节点
+                smoke_nodes = self._filter_suitable_smoke_nodes(filtered_nodes)
             logger.info(f"冒烟测试筛选后得到 {len(smoke_nodes)} 个节点")
             
             # 如果没有符合条件的节点，生成基础测试用例
@@ -104,11 +121,22 @@ class SmokeCaseBuilder:
             logger.info(f"去重后得到 {len(unique_nodes)} 个节点")
             
             # 构建测试用例
+            report_stage('build_cases')
             test_cases = []
-            for i, node in enumerate(unique_nodes):
-                test_case = self._build_test_case(node, i + 1)
-                if test_case:
-                    test_cases.append(test_case)
+            with stage_timer('build_cases'), stage_log('build_cases', logger):
+                for i, node in enumerate(unique_nodes):
+                    check_cancelled()
+                    report_count('build_cases', i + 1, len(unique_nodes))
+                    test_case = self._build_test_case(node, i + 1)
+                    if test_case:
+                        test_cases.append(test_case)
+            
+            set_attributes(
+                selected_markers=len(selected_markers),
+                nodes=total_nodes,
+                smoke_nodes=len(unique_nodes),
+                test_cases=len(test_cases)
+            )
             
             # 构建最终结果
             result = {
@@ -126,10 +154,19 @@ class SmokeCaseBuilder:
             logger.info(f"冒烟用例构建完成，生成 {len(test_cases)} 个测试用例")
             return result
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"构建冒烟用例失败: {str(e)}")
             raise Exception(f"构建冒烟用例失败: {str(e)}")
     
+    def _decode_file_data(self, file_data: Union[str, bytes]) -> bytes:
+        """将base64字符串解码为字节，已是字节内容时直接返回"""
+        if isinstance(file_data, (bytes, bytearray)):
+            return bytes(file_data)
+        with stage_timer('decode', 'base64'):
+            return base64.b64decode(file_data)
+    
     def _generate_default_test_nodes(self, selected_markers: List[str]) -> List[Dict]:
         """生成默认测试节点"""
         default_nodes = []
@@ -182,276 +219,38 @@ class SmokeCaseBuilder:
         
         return basic_nodes
     
-    def _extract_nodes_recursive(self, topic: Dict, path: List[str], all_nodes: List[Dict], level: int = 1):
-        """递归提取节点信息"""
-        if not isinstance(topic, dict):
-            return
-            
-        title = topic.get('title', '').strip()
-        if not title:
-            return
-            
-        current_path = path + [title]
-        
-        # 提取节点的标识符
-        markers = self._extract_node_markers(topic)
-        
-        # 构建节点信息
-        node_info = {
-            'title': title,
-            'path': ' > '.join(current_path),
-            'level': level,
-            'markers': markers,
-            'has_children': 'topics' in topic and len(topic.get('topics', [])) > 0,
-            'raw_topic': topic,
-            'children': []
-        }
-        
-        # 提取子节点作为测试步骤
-        subtopics = topic.get('topics', [])
-        for subtopic in subtopics:
-            if isinstance(subtopic, dict) and subtopic.get('title'):
-                node_info['children'].append({
-                    'title': subtopic.get('title', '').strip(),
-                    'level': level + 1
-                })
-        
-        all_nodes.append(node_info)
-        
-        # 递归处理子节点
-        for subtopic in subtopics:
-            self._extract_nodes_recursive(subtopic, current_path, all_nodes, level + 1)
-    
-    def _extract_node_markers(self, topic: Dict) -> List[str]:
-        """提取节点的标识符（与XMindAnalyzer保持一致）"""
-        markers = []
-        
-        # 检查所有可能包含标识符的字段 - 添加makers字段支持
-        marker_fields = ['markers', 'marker', 'makers', 'icons', 'labels', 'flags', 'priorities']
-        
-        for field in marker_fields:
-            if field in topic and topic[field]:
-                logger.debug(f"在字段'{field}'中发现数据: {topic[field]}")
-                
-                # XMind文件中的markers字段包含标识符信息
-                marker_refs = topic[field] if isinstance(topic[field], list) else [topic[field]]
-                
-                for marker_ref in marker_refs:
-                    logger.debug(f"处理标识符引用: {marker_ref}, 类型: {type(marker_ref)}")
-                    
-                    # 根据XMind的marker结构提取markerId
-                    marker_id = self._map_xmind_marker_to_id(marker_ref)
-                    if marker_id:
-                        if marker_id not in markers:  # 避免重复
-                            markers.append(marker_id)
-                            logger.info(f"成功映射标识符: {marker_ref} -> {marker_id}")
-                        else:
-                            logger.debug(f"标识符已存在，跳过: {marker_id}")
-                    else:
-                        # 记录无法映射的标识符，用于调试
-                        logger.warning(f"无法映射的标识符: {marker_ref} (字段: {field})")
-        
-        if markers:
-            logger.info(f"节点 '{topic.get('title', 'unknown')}' 最终提取到的标识符: {markers}")
-        
-        return markers
-    
-    def _map_xmind_marker_to_id(self, marker_ref) -> str:
-        """将XMind内部标识符映射到自定义ID（与XMindAnalyzer保持一致）"""
-        if marker_ref is None:
-            return None
-        
-        # 处理字符串类型的标识符
-        if isinstance(marker_ref, str):
-            return self._map_string_marker(marker_ref)
-        
-        # 处理字典类型的标识符
-        if isinstance(marker_ref, dict):
-            return self._map_dict_marker(marker_ref)
-        
-        # 处理数字类型的标识符
-        if isinstance(marker_ref, (int, float)):
-            marker_str = str(int(marker_ref))
-            if marker_str in ['1', '2', '3', '4', '5']:
-                return f'priority-{marker_str}'
-        
-        logger.debug(f"未知的标识符格式: {marker_ref} (类型: {type(marker_ref)})")
-        return None
-    
-    def _map_string_marker(self, marker_str: str) -> str:
-        """映射字符串类型的标识符"""
-        marker_str = marker_str.lower().strip()
-        
-        # 直接字符串映射
-        string_mapping = {
-            # 官方标识符
-            'important': 'important',
-            'priority-1': 'priority-1',
-            'priority-2': 'priority-2', 
-            'priority-3': 'priority-3',
-            'priority-4': 'priority-4',
-            'priority-5': 'priority-5',
-            'flag-red': 'flag-red',
-            'flag-yellow': 'flag-yellow',
-            'star-red': 'star-red',
-            'star-yellow': 'star-yellow',
-            
-            # 变体形式
-            'priority_1': 'priority-1',
-            'priority_2': 'priority-2',
-            'priority_3': 'priority-3',
-            'priority_4': 'priority-4',
-            'priority_5': 'priority-5',
-            'priority1': 'priority-1',
-            'priority2': 'priority-2',
-            'priority3': 'priority-3',
-            'priority4': 'priority-4',
-            'priority5': 'priority-5',
-            
-            # 数字形式
-            '1': 'priority-1',
-            '2': 'priority-2',
-            '3': 'priority-3',
-            '4': 'priority-4',
-            '5': 'priority-5',
-            
-            # 旗帜变体
-            'flag_red': 'flag-red',
-            'flag_yellow': 'flag-yellow',
-            'red_flag': 'flag-red',
-            'yellow_flag': 'flag-yellow',
-            'red-flag': 'flag-red',
-            'yellow-flag': 'flag-yellow',
-            'flagred': 'flag-red',
-            'flagyellow': 'flag-yellow',
-            
-            # 星星变体
-            'star_red': 'star-red',
-            'star_yellow': 'star-yellow',
-            'red_star': 'star-red',
-            'yellow_star': 'star-yellow',
-            'red-star': 'star-red',
-            'yellow-star': 'star-yellow',
-            'starred': 'star-red',
-            'staryellow': 'star-yellow',
-        }
-        
-        # 首先尝试直接映射
-        if marker_str in string_mapping:
-            return string_mapping[marker_str]
-        
-        # 模糊匹配和正则表达式匹配
-        import re
-        
-        # 匹配优先级数字
-        priority_match = re.search(r'(?:priority|优先级)[-_\s]*([1-5])', marker_str)
-        if priority_match:
-            return f'priority-{priority_match.group(1)}'
-        
-        # 匹配单独的数字1-5
-        if re.match(r'^[1-5]$', marker_str):
-            return f'priority-{marker_str}'
-        
-        return None
-    
-    def _map_dict_marker(self, marker_dict: dict) -> str:
-        """映射字典类型的标识符"""
-        # 首先尝试获取markerId字段
-        marker_id = marker_dict.get('markerId', '')
-        if marker_id:
-            # 递归处理markerId
-            return self._map_string_marker(marker_id)
-        
-        # 如果没有markerId，尝试其他可能的字段
-        possible_fields = ['id', 'type', 'name', 'symbol', 'key']
-        for field in possible_fields:
-            if field in marker_dict and marker_dict[field]:
-                result = self._map_string_marker(str(marker_dict[field]))
-                if result:
-                    return result
-        
-        return None
-    
-    def _filter_nodes_by_markers(self, all_nodes: List[Dict], selected_markers: List[str]) -> List[Dict]:
+    @traced()
+    def _filter_nodes_by_markers(self, node_table: NodeTable, selected_markers: List[str]) -> List[Dict]:
         """
         根据选中的标识符筛选节点
         同步XMind导出的三重逻辑：
         1. 节点本身有标识 → 保留
         2. 父节点有标识 → 所有子节点保留（完整子树导出）
         3. 子节点有标识 → 父节点路径保留（保持完整路径）
-        """
-        filtered_nodes = []
-        
-        for node in all_nodes:
-            if self._should_keep_node(node, all_nodes, selected_markers):
-                filtered_nodes.append(node)
         
-        logger.info(f"标识符筛选：从 {len(all_nodes)} 个节点筛选出 {len(filtered_nodes)} 个节点")
-        return filtered_nodes
-    
-    def _should_keep_node(self, node: Dict, all_nodes: List[Dict], selected_markers: List[str]) -> bool:
+        带标识的节点从倒排索引取得，保留范围为这些节点的子树（先序连续区间）加上它们的祖先，
+        不遍历未保留的节点，只为保留的节点生成节点字典
         """
-        判断节点是否应该保留（同步XMind导出逻辑）
-        实现与xmind_marker_filter.should_keep_xml_node相同的逻辑
-        """
-        node_path = node.get('path', '')
-        node_markers = node.get('markers', [])
-        
-        # 1. 检查当前节点是否包含目标标记
-        if any(marker in selected_markers for marker in node_markers):
-            logger.debug(f"保留包含目标标记的节点: {node.get('title', '')} (标记: {[m for m in node_markers if m in selected_markers]})")
-            return True
-        
-        # 2. 检查祖先节点是否包含目标标记（作为被标记节点的子节点保留）
-        if self._has_ancestor_with_marker(node, all_nodes, selected_markers):
-            logger.debug(f"保留被标记祖先节点的子节点: {node.get('title', '')}")
-            return True
+        selected_mask = node_table.mask_of(selected_markers)
+        total = len(node_table)
+        kept, path_nodes = node_table.export_nodes(selected_mask)
         
-        # 3. 检查是否有后代包含目标标记（作为路径节点保留）
-        if self._has_descendant_with_marker(node, all_nodes, selected_markers):
-            logger.debug(f"保留包含有效子节点的父节点: {node.get('title', '')}")
-            return True
-        
-        return False
-    
-    def _has_ancestor_with_marker(self, node: Dict, all_nodes: List[Dict], selected_markers: List[str]) -> bool:
-        """检查祖先节点是否包含目标标记"""
-        node_path = node.get('path', '')
-        
-        # 获取当前节点的路径层级
-        path_parts = node_path.split(' > ')
-        
-        # 检查每个祖先路径是否有包含目标标记的节点
-        for i in range(1, len(path_parts)):
-            ancestor_path = ' > '.join(path_parts[:i])
-            
-            # 查找对应的祖先节点
-            for ancestor_node in all_nodes:
-                if ancestor_node.get('path') == ancestor_path:
-                    ancestor_markers = ancestor_node.get('markers', [])
-                    if any(marker in selected_markers for marker in ancestor_markers):
-                        return True
-        
-        return False
-    
-    def _has_descendant_with_marker(self, node: Dict, all_nodes: List[Dict], selected_markers: List[str]) -> bool:
-        """检查后代节点是否包含目标标记"""
-        node_path = node.get('path', '')
-        
-        # 查找所有以当前节点路径开头的子节点
-        for descendant_node in all_nodes:
-            descendant_path = descendant_node.get('path', '')
-            
-            # 检查是否是子节点（路径以当前节点路径开头，且更长）
-            if (descendant_path.startswith(node_path + ' > ') and 
-                descendant_path != node_path):
-                
-                descendant_markers = descendant_node.get('markers', [])
-                if any(marker in selected_markers for marker in descendant_markers):
-                    return True
+        filtered_nodes = []
+        for index in kept:
+            check_cancelled()
+            if node_table.marker_mask[index] & selected_mask:
+                node_event('kept_marked', "保留包含目标标记的节点: %s (标记: %s)", node_table.title(index), node_table.markers(index))
+            elif index in path_nodes:
+                node_event('kept_as_path', "保留包含有效子节点的父节点: %s", node_table.title(index))
+            else:
+                node_event('kept_under_marked', "保留被标记祖先节点的子节点: %s", node_table.title(index))
+            filtered_nodes.append(node_table.node(index))
         
-        return False
+        logger.info("标识符筛选：从 %s 个节点筛选出 %s 个节点", total, len(filtered_nodes))
+        set_attributes(input_nodes=total, kept_nodes=len(filtered_nodes), selected_markers=len(selected_markers))
+        return filtered_nodes
     
+    @traced()
     def _filter_suitable_smoke_nodes(self, nodes: List[Dict]) -> List[Dict]:
         """筛选适合冒烟测试的节点 - 增强版数据质量控制"""
         suitable_nodes = []
@@ -460,7 +259,8 @@ class SmokeCaseBuilder:
             if self._is_suitable_for_smoke_test_enhanced(node):
                 suitable_nodes.append(node)
         
-        logger.info(f"数据质量筛选：{len(nodes)} -> {len(suitable_nodes)} 个高质量节点")
+        logger.info("数据质量筛选：%s -> %s 个高质量节点", len(nodes), len(suitable_nodes))
+        set_attributes(input_nodes=len(nodes), suitable_nodes=len(suitable_nodes))
         return suitable_nodes
     
     def _is_suitable_for_smoke_test_enhanced(self, node: Dict) -> bool:
@@ -473,43 +273,43 @@ class SmokeCaseBuilder:
         
         # 1. 基础数据完整性检查
         if not title or not path:
-            logger.debug(f"跳过空数据节点: title='{title}', path='{path}'")
+            node_event('skipped_empty', "跳过空数据节点: title='%s', path='%s'", title, path)
             return False
         
         # 2. 标题有效性检查（更严格）
         if len(title) < 3:
-            logger.debug(f"跳过标题过短的节点: '{title}'")
+            node_event('skipped_short_title', "跳过标题过短的节点: '%s'", title)
             return False
         
         # 3. 路径完整性检查
         path_parts = [part.strip() for part in path.split(' > ')]
         if len(path_parts) < 2:  # 至少需要2级路径
-            logger.debug(f"跳过路径不完整的节点: '{path}'")
+            node_event('skipped_short_path', "跳过路径不完整的节点: '%s'", path)
             return False
         
         # 4. 检查路径中是否有空元素
         if any(not part or len(part.strip()) < 2 for part in path_parts):
-            logger.debug(f"跳过包含空路径元素的节点: '{path}'")
+            node_event('skipped_empty_path_part', "跳过包含空路径元素的节点: '%s'", path)
             return False
         
         # 5. 层级合理性检查
         if level < 2 or level > 6:
-            logger.debug(f"跳过层级不合理的节点: level={level}, title='{title}'")
+            node_event('skipped_level', "跳过层级不合理的节点: level=%s, title='%s'", level, title)
             return False
         
         # 6. 排除明显的配置类节点
         if any(keyword in title.lower() for keyword in self.config_keywords):
-            logger.debug(f"跳过配置类节点: '{title}'")
+            node_event('skipped_config', "跳过配置类节点: '%s'", title)
             return False
         
         # 7. 内容有意义性检查
         if self._is_meaningless_content(title, path):
-            logger.debug(f"跳过无意义内容节点: '{title}'")
+            node_event('skipped_meaningless', "跳过无意义内容节点: '%s'", title)
             return False
         
         # 8. 检查是否为纯路径节点（没有实际测试内容）
         if self._is_path_only_node(node):
-            logger.debug(f"跳过纯路径节点: '{title}'")
+            node_event('skipped_path_only', "跳过纯路径节点: '%s'", title)
             return False
         
         return True
@@ -562,6 +362,7 @@ class SmokeCaseBuilder:
         
         return unique_nodes
     
+    @traced()
     def _build_test_case(self, node: Dict, case_number: int) -> Optional[Dict[str, Any]]:
         """构建单个测试用例 - 增强版质量控制"""
         try:
@@ -571,19 +372,19 @@ class SmokeCaseBuilder:
             
             # 1. 基础数据验证
             if not title or not path:
-                logger.warning(f"节点数据不完整，跳过构建: title='{title}', path='{path}'")
+                node_event('skipped_incomplete', "节点数据不完整，跳过构建: title='%s', path='%s'", title, path)
                 return None
             
             # 2. 路径有效性检查
             path_parts = [part.strip() for part in path.split(' > ') if part.strip()]
             if len(path_parts) < 2:
-                logger.warning(f"路径不完整，跳过构建: '{path}'")
+                node_event('skipped_short_path', "路径不完整，跳过构建: '%s'", path)
                 return None
                 
             # 3. 清理和验证路径
             cleaned_path = ' > '.join(path_parts)
             if cleaned_path != path:
-                logger.info(f"路径已清理: '{path}' -> '{cleaned_path}'")
+                node_event('paths_cleaned', "路径已清理: '%s' -> '%s'", path, cleaned_path)
                 path = cleaned_path
             
             # 构建用例ID
@@ -600,13 +401,13 @@ class SmokeCaseBuilder:
             
             # 4. 严格检查步骤完整性
             if not steps or len(steps) == 0:
-                logger.warning(f"节点 '{title}' 没有有效的测试步骤，跳过构建")
+                node_event('skipped_no_steps', "节点 '%s' 没有有效的测试步骤，跳过构建", title)
                 return None
             
             # 5. 验证步骤质量
             valid_steps = [step for step in steps if self._is_valid_step(step)]
             if not valid_steps:
-                logger.warning(f"节点 '{title}' 的步骤都无效，跳过构建")
+                node_event('skipped_invalid_steps', "节点 '%s' 的步骤都无效，跳过构建", title)
                 return None
             
             # 构建测试用例
@@ -625,7 +426,8 @@ class SmokeCaseBuilder:
                 }
             }
             
-            logger.debug(f"成功构建测试用例: {case_id} - {title}")
+            node_event('cases_built', "成功构建测试用例: %s - %s", case_id, title)
+            set_attributes(case_id=case_id, markers=len(markers), steps=len(valid_steps))
             return test_case
             
         except Exception as e:
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+服务启动耗时测量（python main.py --measure-startup）
+- 在全新子进程中以-X importtime导入main，按模块统计导入耗时（main的直接依赖按累计耗时排序，全部模块按自身耗时排序）
+- 在另一个子进程中测量解析器、过滤器和各导出器首次加载（export_pipeline.warm_up）的耗时
+
+两项测量都在子进程中进行，不受当前进程已加载模块的影响
+"""
+
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    解析-X importtime的输出
+
+    Returns:
+        按输出顺序排列的记录：module、depth（0为顶层导入）、self_us、cumulative_us
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name = parts[2][1:]
+        records.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1])
+        })
+    return records
+
+
+def measure_imports(module: str = "main") -> Dict[str, Any]:
+    """在子进程中导入模块并统计各模块导入耗时"""
+    started = _run([sys.executable, "-X", "importtime", "-c", f"import {module}"])
+    records = parse_importtime(started.stderr)
+    top = next((record for record in records if record["module"] == module and record["depth"] == 0), None)
+    direct = sorted(
+        (record for record in records if record["depth"] == 1),
+        key=lambda record: record["cumulative_us"],
+        reverse=True
+    )
+    return {
+        "module": module,
+        "returncode": started.returncode,
+        "error": started.stderr.strip().splitlines()[-1] if started.returncode else None,
+        "total_ms": round(top["cumulative_us"] / 1000, 1) if top else None,
+        "modules_imported": len(records),
+        "direct_imports": [_as_ms(record) for record in direct],
+        "slowest_modules": [_as_ms(record) for record in sorted(records, key=lambda record: record["self_us"], reverse=True)]
+    }
+
+
+def measure_warm_up() -> Dict[str, Any]:
+    """在子进程中测量各分析器/导出器首次加载的耗时（秒）"""
+    code = "import json, export_pipeline; print(json.dumps(export_pipeline.warm_up()))"
+    finished = _run([sys.executable, "-c", code])
+    if finished.returncode:
+        return {"error": finished.stderr.strip().splitlines()[-1] if finished.stderr.strip() else "warm_up失败"}
+    return json.loads(finished.stdout.strip().splitlines()[-1])
+
+
+def render_report(limit: int = 20) -> str:
+    """生成文本格式的启动耗时报告"""
+    imports = measure_imports()
+    lines = [f"== 导入 {imports['module']} =="]
+    if imports["error"]:
+        lines.append(f"导入失败: {imports['error']}")
+    lines.append(f"总耗时: {imports['total_ms']} ms，共导入 {imports['modules_imported']} 个模块")
+
+    lines.append("")
+    lines.append(f"-- {imports['module']} 的直接依赖（累计耗时） --")
+    for record in imports["direct_imports"][:limit]:
+        lines.append(f"{record['cumulative_ms']:>10.1f} ms  {record['module']}")
+
+    lines.append("")
+    lines.append("-- 自身耗时最长的模块 --")
+    for record in imports["slowest_modules"][:limit]:
+        lines.append(f"{record['self_ms']:>10.1f} ms  {record['module']}")
+
+    lines.append("")
+    lines.append("== 首次加载（warm_up） ==")
+    warm_up = measure_warm_up()
+    if "error" in warm_up:
+        lines.append(f"加载失败: {warm_up['error']}")
+    else:
+        for name, seconds in warm_up.items():
+            lines.append(f"{seconds * 1000:>10.1f} ms  {name}")
+        lines.append(f"{sum(warm_up.values()) * 1000:>10.1f} ms  合计")
+    return "\n".join(lines)
+
+
+def _run(command: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+
+
+def _as_ms(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "module": record["module"],
+        "self_ms": round(record["self_us"] / 1000, 1),
+        "cumulative_ms": round(record["cumulative_us"] / 1000, 1)
+    }
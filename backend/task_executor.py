@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+流水线任务执行器
+将解析、过滤、用例构建、Excel渲染等CPU密集阶段从asyncio事件循环中移出，
+避免单个大文件导出阻塞/health及其他请求
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import multiprocessing.context
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+import request_profiler
+from cancellation import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineExecutor:
+    """
+    流水线阶段执行器
+
+    - process模式：CPU密集阶段派发到进程池，绕开GIL，适合多核机器
+    - thread模式：所有阶段派发到线程池（默认），进程池不可用时也会回退到该模式
+
+    派发到进程池的函数及参数必须可被pickle（模块级函数、bytes/dict/list等）
+    进程池在服务已有多个线程（持有解析缓存、指标、日志等锁）之后才按需创建，直接fork可能让子进程继承被占用的锁而死锁，
+    因此使用forkserver（不支持时用spawn）启动工作进程；进程数由XMIND_PROCESS_WORKERS配置，
+    默认不超过执行器线程数和CPU核数（多进程服务模式下按服务进程数平分，见serving.apply_worker_budgets）
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_workers: Optional[int] = None):
+        self.mode = (mode or os.getenv("XMIND_EXECUTOR", "thread")).lower()
+        if self.mode not in ("process", "thread"):
+            logger.warning(f"未知的执行器模式 '{self.mode}'，使用thread模式")
+            self.mode = "thread"
+        self.max_workers = max_workers or int(os.getenv("XMIND_EXECUTOR_WORKERS", os.cpu_count() or 2))
+        self.process_workers = int(os.getenv("XMIND_PROCESS_WORKERS", min(self.max_workers, os.cpu_count() or 1)))
+
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """获取（必要时创建）线程池"""
+        with self._lock:
+            if self._thread_pool is None:
+                # 线程池需要同时承载CPU阶段和I/O阶段，预留更多线程
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers * 2,
+                    thread_name_prefix="xmind-pipeline"
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self, force: bool = False) -> Optional[ProcessPoolExecutor]:
+        """
+        获取（必要时创建）进程池，创建失败时回退到线程模式
+        force=True时即使处于thread模式也创建进程池（用于批量导出等大任务）
+        """
+        with self._lock:
+            if self._process_pool is None and (self.mode == "process" or force):
+                try:
+                    self._process_pool = ProcessPoolExecutor(
+                        max_workers=max(1, self.process_workers),
+                        mp_context=self._process_context()
+                    )
+                    logger.info(f"流水线进程池已启动，工作进程数: {self.process_workers}")
+                except (OSError, NotImplementedError, ImportError, ValueError) as e:
+                    logger.warning(f"无法创建进程池，回退到线程池执行: {str(e)}")
+                    self.mode = "thread"
+            return self._process_pool
+
+    @staticmethod
+    def _process_context() -> multiprocessing.context.BaseContext:
+        """进程池的启动方式：forkserver，平台不支持时用spawn（均不从多线程的服务进程直接fork）"""
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            # forkserver进程预先导入流水线模块，之后fork出的工作进程无需重复导入
+            context.set_forkserver_preload(["export_pipeline", "batch_export"])
+            return context
+        return multiprocessing.get_context("spawn")
+
+    def _discard_process_pool(self):
+        """进程池损坏（如工作进程被OOM杀死）时丢弃，下次使用时重建"""
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        cpu_bound: bool = True,
+        prefer_process: bool = False,
+        **kwargs: Any
+    ) -> Any:
+        """
+        在执行器中运行一个流水线阶段并等待结果
+
+        Args:
+            func: 阶段函数（process模式下需为模块级函数）
+            *args: 位置参数
+            cpu_bound: 是否为CPU密集阶段，只有CPU密集阶段会派发到进程池
+            prefer_process: thread模式下也尽量使用进程池（进程池不可用时回退到线程池）
+            **kwargs: 关键字参数
+
+        Returns:
+            阶段函数的返回值
+        """
+        # 请求已取消（客户端断开或超过截止时间）时不再派发后续阶段
+        check_cancelled()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+
+        # 开启剖析的请求只在线程池中执行，剖析数据才能汇总到当前会话
+        if request_profiler.current_session() is not None:
+            call = functools.partial(request_profiler.run_profiled, call)
+        elif cpu_bound and (self.mode == "process" or prefer_process):
+            pool = self._get_process_pool(force=prefer_process)
+            if pool is not None:
+                try:
+                    return await loop.run_in_executor(pool, call)
+                except BrokenProcessPool as e:
+                    logger.warning(f"进程池异常，本次改用线程池执行: {str(e)}")
+                    self._discard_process_pool()
+
+        # 复制当前上下文，保证contextvars在工作线程中可见
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_thread_pool(), functools.partial(context.run, call))
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有执行器"""
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=wait, cancel_futures=True)
+                self._process_pool = None
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown(wait=wait, cancel_futures=True)
+                self._thread_pool = None
+
+
+# 创建全局实例
+pipeline_executor = PipelineExecutor()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+准入控制通道（AdmissionLane）的名额计数测试
+覆盖名额移交、队列已满、排队超时、排队中取消、移交后取消等情况，每个用例结束时名额必须全部归还
+
+运行：python -m pytest test_admission.py -q
+"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionLane, AdmissionRejectedError
+
+
+def make_lane(max_in_flight: int = 1, max_queue: int = 2, queue_timeout: float = 0) -> AdmissionLane:
+    return AdmissionLane("/api/export", max_in_flight, max_queue, queue_timeout, retry_after=5)
+
+
+async def settle():
+    """让已就绪的任务运行到下一个等待点"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_slot_to_first_waiter():
+    async def scenario():
+        lane = make_lane()
+        await lane.acquire()
+
+        order = []
+
+        async def waiter(name):
+            await lane.acquire()
+            order.append(name)
+
+        first = asyncio.create_task(waiter("first"))
+        second = asyncio.create_task(waiter("second"))
+        await settle()
+        assert lane.in_flight == 1
+        assert lane.stats()["queue_depth"] == 2
+
+        # 名额直接移交，执行数不变
+        lane.release()
+        await first
+        assert order == ["first"]
+        assert lane.in_flight == 1
+        assert lane.stats()["queue_depth"] == 1
+
+        lane.release()
+        await second
+        assert order == ["first", "second"]
+
+        lane.release()
+        assert lane.in_flight == 0
+        assert lane.stats()["queue_depth"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_new_request_does_not_overtake_queue():
+    async def scenario():
+        lane = make_lane(max_in_flight=1, max_queue=1)
+        await lane.acquire()
+        queued = asyncio.create_task(lane.acquire())
+        await settle()
+
+        # 队列已满时直接拒绝
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            await lane.acquire()
+        assert excinfo.value.reason == "queue_full"
+        assert excinfo.value.retry_after == 5
+
+        lane.release()
+        await queued
+        lane.release()
+        assert lane.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_and_leaves_counts_intact():
+    async def scenario():
+        lane = make_lane(queue_timeout=0.05)
+        await lane.acquire()
+
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            await lane.acquire()
+        assert excinfo.value.reason == "timeout"
+        assert lane.in_flight == 1
+        assert lane.stats()["queue_depth"] == 0
+
+        lane.release()
+        assert lane.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_while_queued_removes_waiter():
+    async def scenario():
+        lane = make_lane()
+        await lane.acquire()
+        queued = asyncio.create_task(lane.acquire())
+        await settle()
+        assert lane.stats()["queue_depth"] == 1
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert lane.stats()["queue_depth"] == 0
+        assert lane.in_flight == 1
+
+        lane.release()
+        assert lane.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_after_handoff_returns_slot():
+    async def scenario():
+        lane = make_lane()
+        await lane.acquire()
+        queued = asyncio.create_task(lane.acquire())
+        await settle()
+
+        # 名额已移交给等待者，但等待者恢复运行前被取消：名额必须归还而不是丢失
+        lane.release()
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert lane.in_flight == 0
+        assert lane.stats()["queue_depth"] == 0
+
+        # 名额可以被再次获取
+        await lane.acquire()
+        assert lane.in_flight == 1
+        lane.release()
+        assert lane.in_flight == 0
+
+    asyncio.run(scenario())
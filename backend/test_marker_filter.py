@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+XMindMarkerFilter的content.xml过滤测试
+在带默认命名空间的XMind 8 content.xml上检查lxml/minidom两个引擎：
+原始markerId为别名时按规范化结果命中、三重保留规则（本身/祖先/后代带标识）与content.json一致
+
+运行：python -m pytest test_marker_filter.py -q
+"""
+
+import io
+import json
+import zipfile
+
+import pytest
+from lxml import etree
+
+from xmind_marker_filter import xmind_filter
+
+# b1的原始markerId是别名red_flag，分析结果中报告为flag-red
+CONTENT_XML = b'''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<xmap-content xmlns="urn:xmind:xmap:xmlns:content:2.0" version="2.0">
+<sheet id="s1"><topic id="r"><title>root</title><children><topics type="attached">
+ <topic id="a"><title>a</title><marker-refs><marker-ref marker-id="priority-1"/></marker-refs>
+  <children><topics type="attached"><topic id="a1"><title>a1</title></topic></topics></children></topic>
+ <topic id="b"><title>b</title><children><topics type="attached">
+  <topic id="b1"><title>b1</title><marker-refs><marker-ref marker-id="red_flag"/></marker-refs>
+   <children><topics type="attached"><topic id="b1x"><title>b1x</title></topic></topics></children></topic>
+  <topic id="b2"><title>b2</title></topic>
+ </topics></children></topic>
+ <topic id="c"><title>c</title></topic>
+</topics></children></topic><title>Sheet 1</title></sheet>
+</xmap-content>'''
+
+
+def json_topic(title, children=(), marker=None):
+    topic = {'id': title, 'title': title}
+    if marker:
+        topic['markers'] = [{'markerId': marker}]
+    if children:
+        topic['children'] = {'attached': list(children)}
+    return topic
+
+
+CONTENT_JSON = [{'id': 's1', 'title': 'Sheet 1', 'rootTopic': json_topic('root', [
+    json_topic('a', [json_topic('a1')], marker='priority-1'),
+    json_topic('b', [json_topic('b1', [json_topic('b1x')], marker='red_flag'), json_topic('b2')]),
+    json_topic('c'),
+])}]
+
+
+def xml_titles(content: bytes):
+    root = etree.fromstring(content)
+    return sorted(title.text for title in root.iter('{*}title') if title.getparent().tag.endswith('topic'))
+
+
+def json_titles(content: bytes):
+    titles = []
+
+    def walk(topic):
+        titles.append(topic['title'])
+        for child in topic.get('children', {}).get('attached', []):
+            walk(child)
+
+    for sheet in json.loads(content):
+        walk(sheet['rootTopic'])
+    return sorted(titles)
+
+
+def filter_xml(engine, selected):
+    stats = {}
+    method = xmind_filter.filter_content_xml_lxml if engine == 'lxml' else xmind_filter.filter_content_xml_minidom
+    return xml_titles(method(CONTENT_XML, selected, stats)), stats
+
+
+ENGINES = ['lxml', 'minidom']
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_alias_marker_id_matches_normalized_selection(engine):
+    titles, stats = filter_xml(engine, ['flag-red'])
+    # b1本身带标识，b1x在其子树内，b为路径节点；a、a1、b2、c被删除
+    assert titles == ['b', 'b1', 'b1x', 'root']
+    assert stats['sheets_processed'] == 1
+    assert stats['nodes_removed'] == 4
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("selected", [['priority-1'], ['flag-red'], ['priority-1', 'flag-red'], ['unknown']])
+def test_xml_matches_json_filter(engine, selected):
+    xml_result, _ = filter_xml(engine, selected)
+    json_result = json_titles(xmind_filter.filter_content_json(json.dumps(CONTENT_JSON).encode('utf-8'), selected, {}))
+    assert xml_result == json_result
+
+
+def test_filter_xmind_file_keeps_alias_marked_nodes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_ref:
+        zip_ref.writestr('content.xml', CONTENT_XML)
+        zip_ref.writestr('meta.xml', b'<meta/>')
+
+    result = xmind_filter.filter_xmind_by_markers(buffer.getvalue(), ['flag-red'], return_bytes=True)
+    with zipfile.ZipFile(io.BytesIO(result['file_bytes'])) as zip_ref:
+        assert xml_titles(zip_ref.read('content.xml')) == ['b', 'b1', 'b1x', 'root']
+        assert zip_ref.read('meta.xml') == b'<meta/>'
+    assert result['processing_details']['nodes_removed'] == 4
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+节点表（NodeTable）及标识符倒排索引测试
+在随机生成的多工作表导图上，将export_selection/export_nodes/selection_counts/marker_summary
+与逐节点遍历的参考实现（原三重筛选逻辑：节点本身有标识、祖先有标识、后代有标识）对比
+
+运行：python -m pytest test_node_store.py -q
+"""
+
+import random
+from typing import Dict, List
+
+import pytest
+
+from node_store import NO_NODE, NodeTable
+
+MARKERS = ['priority-1', 'priority-2', 'flag-red', 'star-yellow', 'important']
+
+
+def random_sheets(seed: int, max_nodes: int = 300) -> List[Dict]:
+    rnd = random.Random(seed)
+    counter = [0]
+
+    def make_topic(level: int) -> Dict:
+        counter[0] += 1
+        topic = {'title': f'node-{counter[0]}', 'markers': rnd.sample(MARKERS, rnd.choice([0, 0, 0, 0, 1, 1, 2]))}
+        if level < 7 and counter[0] < max_nodes:
+            topic['topics'] = [make_topic(level + 1) for _ in range(rnd.randint(0, 4))]
+        return topic
+
+    return [{'topic': make_topic(1)} for _ in range(rnd.randint(1, 3))]
+
+
+def build_table(sheets: List[Dict]) -> NodeTable:
+    return NodeTable.from_sheets(sheets, lambda topic: list(topic.get('markers') or []))
+
+
+def reference_export(table: NodeTable, selected: List[str]) -> List[int]:
+    """原三重筛选逻辑：逐节点判断本身、祖先、后代是否带有选中的标识符"""
+    selected_set = set(selected)
+    marked = [bool(selected_set.intersection(table.markers(index))) for index in range(len(table))]
+
+    def ancestors(index):
+        parent = table.parent[index]
+        while parent != NO_NODE:
+            yield parent
+            parent = table.parent[parent]
+
+    kept = []
+    for index in range(len(table)):
+        under_marked = any(marked[ancestor] for ancestor in ancestors(index))
+        above_marked = any(marked[other] for other in range(len(table)) if index in ancestors(other))
+        if marked[index] or under_marked or above_marked:
+            kept.append(index)
+    return kept
+
+
+SELECTIONS = [['priority-1'], ['flag-red', 'important'], MARKERS, ['unknown'], []]
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_export_nodes_match_three_rule_filter(seed):
+    table = build_table(random_sheets(seed))
+    for selected in SELECTIONS:
+        kept, path_nodes = table.export_nodes(table.mask_of(selected))
+        assert kept == reference_export(table, selected)
+        # 路径节点本身没有选中的标识符，且有带标识的后代
+        selected_mask = table.mask_of(selected)
+        assert all(not table.marker_mask[index] & selected_mask for index in path_nodes)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_selection_counts_match_node_scan(seed):
+    table = build_table(random_sheets(seed))
+    for selected in SELECTIONS:
+        counts = table.selection_counts(selected)
+        selected_set = set(selected)
+        marked = [index for index in range(len(table)) if selected_set.intersection(table.markers(index))]
+
+        by_sheet = [0] * len(table.sheet_start)
+        by_level: Dict[int, int] = {}
+        for index in marked:
+            sheet = max(position for position, start in enumerate(table.sheet_start) if start <= index)
+            by_sheet[sheet] += 1
+            by_level[table.level[index]] = by_level.get(table.level[index], 0) + 1
+
+        assert counts['marked_nodes'] == len(marked)
+        assert counts['export_nodes'] == len(reference_export(table, selected))
+        assert counts['by_sheet'] == by_sheet
+        assert counts['by_level'] == dict(sorted(by_level.items()))
+        assert counts['markers'] == {
+            marker_id: sum(1 for index in range(len(table)) if marker_id in table.markers(index))
+            for marker_id in selected
+        }
+
+
+def test_marker_summary_uses_preorder_samples():
+    table = build_table(random_sheets(3))
+    for marker_id, count, samples in table.marker_summary(sample_limit=3):
+        nodes = [index for index in range(len(table)) if marker_id in table.markers(index)]
+        assert count == len(nodes)
+        assert samples == [table.title(index) for index in nodes[:3]]
+
+
+def test_subtree_end_and_paths():
+    sheets = [{'topic': {'title': 'root', 'topics': [
+        {'title': 'a', 'topics': [{'title': 'a1'}, {'title': '', 'topics': [{'title': 'skipped'}]}]},
+        {'title': 'b', 'markers': ['flag-red']},
+    ]}}]
+    table = build_table(sheets)
+    # 无标题的节点及其子树跳过
+    assert [table.title(index) for index in range(len(table))] == ['root', 'a', 'a1', 'b']
+    assert list(table.subtree_end) == [4, 3, 3, 4]
+    assert table.path(2) == 'root > a > a1'
+    assert list(table.children(0)) == [1, 3]
+    assert table.export_nodes(table.mask_of(['flag-red'])) == ([0, 3], {0})
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+多进程共享状态测试
+上传存储、导出任务和进度通道各创建两个指向同一共享目录的实例，模拟请求落到不同的工作进程：
+一个实例写入的file_id、任务状态/结果和进度，另一个实例必须能读到
+
+运行：python -m pytest test_shared_state.py -q
+"""
+
+import os
+import time
+
+import pytest
+
+import export_pipeline
+from export_jobs import ExportJobManager
+from progress import ProgressHub
+from upload_store import UploadStore
+
+
+def test_upload_visible_across_instances(tmp_path):
+    writer = UploadStore(str(tmp_path))
+    reader = UploadStore(str(tmp_path))
+
+    file_id = writer.put(b"PK\x03\x04content", "a.xmind")
+    assert file_id == UploadStore.compute_file_id(b"PK\x03\x04content")
+    assert reader.get(file_id) == b"PK\x03\x04content"
+    assert reader.get_filename(file_id) == "a.xmind"
+    assert reader.stats()["entries"] == 1
+
+
+def test_upload_rejects_invalid_file_id(tmp_path):
+    store = UploadStore(str(tmp_path))
+    (tmp_path.parent / "outside.bin").write_bytes(b"secret")
+    assert store.get("../outside") is None
+    assert store.get("A" * 64) is None
+
+
+def test_upload_ttl_and_budget(tmp_path):
+    store = UploadStore(str(tmp_path), ttl_seconds=60, max_bytes=10)
+    assert store.put(b"x" * 11) is None
+
+    first = store.put(b"a" * 6)
+    # 让first成为最久未访问的文件
+    old = time.time() - 30
+    os.utime(os.path.join(str(tmp_path), f"{first}.bin"), (old, old))
+    second = store.put(b"b" * 6)
+    assert store.get(first) is None
+    assert store.get(second) == b"b" * 6
+
+    # 超过TTL未访问的文件在读取时失效
+    expired = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), f"{second}.bin"), (expired, expired))
+    assert store.get(second) is None
+    assert store.stats()["entries"] == 0
+
+
+@pytest.fixture
+def fake_export(monkeypatch):
+    def run_export(export_format, selected_markers, file_data):
+        if file_data == b"fail":
+            raise ValueError("boom")
+        return {
+            "content": b"result-" + file_data,
+            "filename": "out.xlsx",
+            "media_type": "application/octet-stream",
+            "export_details": {"markers": selected_markers},
+            "cache_hit": False
+        }
+
+    monkeypatch.setattr(export_pipeline, "run_export", run_export)
+
+
+def wait_done(manager, job_id):
+    for _ in range(200):
+        job = manager.get(job_id)
+        if job is not None and job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("导出任务未完成")
+
+
+def test_job_status_and_result_across_instances(tmp_path, fake_export):
+    owner = ExportJobManager(max_workers=1, job_dir=str(tmp_path))
+    other = ExportJobManager(max_workers=1, job_dir=str(tmp_path))
+    try:
+        job = owner.submit("template", ["priority-1"], b"data")
+        wait_done(owner, job.job_id)
+
+        loaded = wait_done(other, job.job_id)
+        assert loaded is not job
+        assert loaded.status == "succeeded"
+        assert loaded.progress == 100
+        assert loaded.read_content() == b"result-data"
+        assert loaded.to_dict()["size"] == len(b"result-data")
+        assert loaded.filename == "out.xlsx"
+        assert loaded.export_details == {"markers": ["priority-1"]}
+
+        failed = owner.submit("template", ["priority-1"], b"fail")
+        loaded_failed = wait_done(other, failed.job_id)
+        assert loaded_failed.status == "failed"
+        assert loaded_failed.error == "boom"
+
+        assert other.get("../" + job.job_id) is None
+        assert other.get("0" * 32) is None
+    finally:
+        owner.shutdown(wait=True)
+        other.shutdown(wait=True)
+
+
+def test_progress_subscriber_in_other_instance(tmp_path):
+    writer_hub = ProgressHub(channel_dir=str(tmp_path))
+    reader_hub = ProgressHub(channel_dir=str(tmp_path))
+
+    # 订阅可以在导出开始之前
+    view = reader_hub.subscribe("progress-1234")
+    assert view.status == "queued"
+
+    channel = writer_hub.channel("progress-1234")
+    channel.start()
+    channel.on_stage("render")
+    channel.on_count("write_rows", 5, 10)
+    view.refresh()
+    assert view.status == "running"
+    assert view.stage == "render"
+    assert view.progress == 65
+
+    channel.finish("succeeded")
+    view.refresh()
+    assert view.done
+    assert view.version == channel.version
+    assert view.snapshot()["counters"] == {"write_rows": {"value": 5, "total": 10}}
+
+    # 导出所在进程中直接使用本进程的通道
+    assert writer_hub.subscribe("progress-1234") is channel
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+进程内链路追踪
+- span / traced：记录嵌套的调用区间及属性（节点数、标识符数、行数、合并数等）
+- 每个请求一条trace，结束后放入最近trace的环形缓冲区
+- 以Chrome trace JSON格式导出（chrome://tracing或Perfetto可直接打开），不依赖外部采集器
+
+追踪上下文通过contextvars传递，流水线执行器的工作线程中产生的span会挂到请求的trace下；
+进程池中执行的阶段不会产生span。没有活动trace时span的开销只有一次上下文变量读取
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("xmind_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("xmind_span", default=None)
+
+
+class Span:
+    """一个调用区间"""
+
+    __slots__ = ("name", "span_id", "parent_id", "thread_id", "start", "end", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[int], span_id: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+
+    def set(self, **attributes: Any):
+        """设置span属性"""
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """单个请求的trace（span数量有上限，超出部分只计数）"""
+
+    def __init__(self, name: str, max_spans: int):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.created_at = time.time()
+        self.origin = time.perf_counter()
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        """创建并登记一个span，超出上限时返回None"""
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped_spans += 1
+                return None
+            self._next_id += 1
+            span = Span(name, parent.span_id if parent is not None else None, self._next_id, attributes)
+            self.spans.append(span)
+            return span
+
+    def summary(self) -> Dict[str, Any]:
+        duration = max((span.end or span.start for span in self.spans), default=self.origin) - self.origin
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "created_at": self.created_at,
+            "duration_ms": round(duration * 1000, 3),
+            "spans": len(self.spans),
+            "dropped_spans": self.dropped_spans
+        }
+
+    def to_chrome_events(self, pid: int) -> List[Dict[str, Any]]:
+        """转换为Chrome trace的完整事件（ph=X），时间单位为微秒"""
+        events = []
+        for span in list(self.spans):
+            end = span.end if span.end is not None else time.perf_counter()
+            args = dict(span.attributes)
+            args.update(trace_id=self.trace_id, span_id=span.span_id, parent_id=span.parent_id)
+            events.append({
+                "name": span.name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6, 3),
+                "dur": round((end - span.start) * 1e6, 3),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": args
+            })
+        return events
+
+
+class TraceBuffer:
+    """最近trace的环形缓冲区"""
+
+    def __init__(self, capacity: Optional[int] = None, max_spans: Optional[int] = None):
+        self.capacity = capacity if capacity is not None else int(os.getenv("XMIND_TRACE_BUFFER", 50))
+        self.max_spans = max_spans if max_spans is not None else int(os.getenv("XMIND_TRACE_MAX_SPANS", 5000))
+        self._traces: Deque[Trace] = deque(maxlen=max(1, self.capacity))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, trace_id: Optional[str] = None, limit: Optional[int] = None) -> List[Trace]:
+        """最近的trace（最新的在后），可按trace_id筛选"""
+        with self._lock:
+            traces = list(self._traces)
+        if trace_id:
+            traces = [trace for trace in traces if trace.trace_id == trace_id]
+        if limit is not None:
+            traces = traces[-limit:] if limit > 0 else []
+        return traces
+
+    def export_chrome_trace(self, trace_id: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """以Chrome trace JSON格式导出（每条trace对应一个pid，便于在查看器中分组）"""
+        events: List[Dict[str, Any]] = []
+        traces = self.recent(trace_id, limit)
+        for pid, trace in enumerate(traces, 1):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{trace.name} {trace.trace_id[:8]}"}})
+            events.extend(trace.to_chrome_events(pid))
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"traces": [trace.summary() for trace in traces]}
+        }
+
+
+@contextmanager
+def trace_scope(name: str) -> Iterator[Optional[Trace]]:
+    """
+    在代码块内记录一条trace，结束后放入环形缓冲区
+    只有根span的trace（如健康检查、指标查询）不进入缓冲区，避免挤掉有价值的trace
+    """
+    if not trace_buffer.enabled:
+        yield None
+        return
+    trace = Trace(name, trace_buffer.max_spans)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if len(trace.spans) > 1:
+            trace_buffer.add(trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    记录一个span，没有活动trace时不做任何记录
+
+    Args:
+        name: span名称
+        **attributes: 初始属性
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, _current_span.get(), attributes)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def set_attributes(**attributes: Any):
+    """设置当前span的属性，没有活动span时忽略"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """span的装饰器形式，默认使用函数的限定名作为span名称"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# 创建全局实例
+trace_buffer = TraceBuffer()
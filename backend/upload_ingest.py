@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+上传文件流式接收
+Starlette已将上传内容暂存到SpooledTemporaryFile，这里直接在该文件上分块计算SHA-256，
+并在解析之前通过文件头和zip中央目录校验文件，尽早拒绝非XMind文件、超大文件和zip炸弹；
+文件内容不再复制一份，只在需要字节的阶段读取
+"""
+
+import hashlib
+import logging
+import os
+import zipfile
+from typing import IO, TYPE_CHECKING, Any, Dict, Optional
+
+from task_executor import pipeline_executor
+
+if TYPE_CHECKING:
+    # 只用于类型标注；批量导出的工作进程也会导入本模块，无需加载fastapi
+    from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b"PK\x03\x04"
+XMIND_CONTENT_MEMBERS = ("content.json", "content.xml")
+
+
+class UploadRejectedError(ValueError):
+    """上传文件未通过校验，status_code为建议返回的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class IngestedUpload:
+    """已接收的上传文件（内容仍在Starlette暂存的上传文件中，由Starlette在请求结束时关闭）"""
+
+    def __init__(self, filename: str, fileobj: IO[bytes], size: int, sha256: str):
+        self.filename = filename
+        self.fileobj = fileobj
+        self.size = size
+        self.sha256 = sha256
+        self.archive_stats: Dict[str, Any] = {}
+
+    def read_bytes(self) -> bytes:
+        """读取完整文件内容（会阻塞，应在执行器中调用）"""
+        self.fileobj.seek(0)
+        return self.fileobj.read()
+
+    def close(self):
+        """释放引用；底层文件属于UploadFile，不在这里关闭"""
+        self.fileobj = None
+
+    def __enter__(self) -> "IngestedUpload":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class UploadIngestor:
+    """上传文件接收器"""
+
+    def __init__(
+        self,
+        max_upload_bytes: Optional[int] = None,
+        chunk_size: int = 1024 * 1024,
+        max_members: Optional[int] = None,
+        max_uncompressed_bytes: Optional[int] = None,
+        max_compression_ratio: Optional[int] = None
+    ):
+        # 上传文件大小上限（默认100MB）
+        self.max_upload_bytes = max_upload_bytes or int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+        self.chunk_size = chunk_size
+        # zip炸弹防护：成员数量、解压后总大小、单个成员压缩比
+        self.max_members = max_members or int(os.getenv("MAX_ARCHIVE_MEMBERS", 10000))
+        self.max_uncompressed_bytes = max_uncompressed_bytes or int(os.getenv("MAX_UNCOMPRESSED_BYTES", 512 * 1024 * 1024))
+        self.max_compression_ratio = max_compression_ratio or int(os.getenv("MAX_COMPRESSION_RATIO", 100))
+
+    async def ingest(self, upload: "UploadFile", require_xmind: bool = True) -> IngestedUpload:
+        """
+        在Starlette暂存的上传文件上分块计算SHA-256并校验，不复制文件内容
+
+        Args:
+            upload: FastAPI上传文件对象
+            require_xmind: 是否要求压缩包中包含XMind内容文件（content.json/content.xml）
+
+        Returns:
+            IngestedUpload
+
+        Raises:
+            UploadRejectedError: 文件未通过校验
+        """
+        filename = upload.filename or ""
+        too_large = UploadRejectedError(f"文件 {filename} 超过大小上限 {self.max_upload_bytes:,} bytes", status_code=413)
+        # Starlette已知上传大小时直接拒绝，无需读取内容
+        if upload.size is not None and upload.size > self.max_upload_bytes:
+            raise too_large
+
+        digest = hashlib.sha256()
+        size = 0
+
+        await upload.seek(0)
+        while True:
+            # UploadFile.read在文件已落盘时会切换到线程池，不阻塞事件循环
+            chunk = await upload.read(self.chunk_size)
+            if not chunk:
+                break
+            # 首个分块即校验文件头，非zip文件无需读完
+            if size == 0 and not chunk.startswith(ZIP_MAGIC):
+                raise UploadRejectedError(f"文件 {filename} 不是有效的XMind文件（非zip格式）")
+            size += len(chunk)
+            if size > self.max_upload_bytes:
+                raise too_large
+            digest.update(chunk)
+
+        if size == 0:
+            raise UploadRejectedError(f"文件 {filename} 为空")
+
+        ingested = IngestedUpload(filename, upload.file, size, digest.hexdigest())
+        # 读取zip中央目录是同步的文件读写（超过1MB的上传已落盘），放到执行器线程中避免阻塞事件循环
+        ingested.archive_stats = await pipeline_executor.run(
+            self.validate_archive, upload.file, filename, require_xmind, cpu_bound=False
+        )
+        logger.info(f"上传文件接收完成: {filename}, 大小: {size:,} bytes, sha256={ingested.sha256[:12]}...")
+        return ingested
+
+    def validate_archive(self, fileobj, filename: str = "", require_xmind: bool = True) -> Dict[str, Any]:
+        """
+        只读取zip中央目录校验压缩包，不解压任何成员
+
+        Returns:
+            压缩包统计信息（成员数、压缩/解压后大小）
+        """
+        fileobj.seek(0)
+        try:
+            with zipfile.ZipFile(fileobj, 'r') as zip_ref:
+                infos = zip_ref.infolist()
+        except zipfile.BadZipFile as e:
+            raise UploadRejectedError(f"文件 {filename} 不是有效的zip压缩包: {str(e)}")
+
+        if len(infos) > self.max_members:
+            raise UploadRejectedError(f"文件 {filename} 包含的成员过多（{len(infos)} > {self.max_members}）")
+
+        names = {info.filename for info in infos}
+        if require_xmind and not any(member in names for member in XMIND_CONTENT_MEMBERS):
+            raise UploadRejectedError(f"文件 {filename} 不是有效的XMind文件（缺少content.json/content.xml）")
+
+        total_uncompressed = 0
+        total_compressed = 0
+        for info in infos:
+            total_uncompressed += info.file_size
+            total_compressed += info.compress_size
+            # 小文件压缩比可能很高，只检查解压后超过1MB的成员
+            if info.file_size > 1024 * 1024 and info.file_size > info.compress_size * self.max_compression_ratio:
+                raise UploadRejectedError(f"文件 {filename} 的成员 {info.filename} 压缩比异常，疑似zip炸弹")
+
+        if total_uncompressed > self.max_uncompressed_bytes:
+            raise UploadRejectedError(
+                f"文件 {filename} 解压后大小超过上限（{total_uncompressed:,} > {self.max_uncompressed_bytes:,} bytes）",
+                status_code=413
+            )
+
+        fileobj.seek(0)
+        return {
+            "members": len(infos),
+            "compressed_bytes": total_compressed,
+            "uncompressed_bytes": total_uncompressed
+        }
+
+
+# 创建全局实例
+upload_ingestor = UploadIngestor()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+上传文件存储模块
+按SHA-256内容寻址保存已上传的XMind文件，供导出接口通过file_id引用
+避免前端在每次导出时回传完整的base64文件数据
+
+文件保存在共享目录中（与导出结果缓存相同的方式），多进程服务下任一工作进程保存的file_id
+都可以在其他工作进程中读取
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared_files import atomic_write, read_json, remove_quietly, scan_files, write_json
+
+logger = logging.getLogger(__name__)
+
+# file_id来自请求参数，只接受SHA-256十六进制串，避免拼接出存储目录以外的路径
+FILE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadStore:
+    """
+    基于内容哈希的上传文件存储（TTL过期 + 总容量LRU淘汰）
+
+    每个文件保存为<file_id>.bin（文件字节）和<file_id>.json（原始文件名），
+    .bin的修改时间即最后访问时间，读取时更新；多个进程共享同一存储目录，淘汰时容忍文件已被其他进程删除
+    """
+
+    def __init__(self, store_dir: Optional[str] = None, ttl_seconds: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.store_dir = store_dir or os.getenv(
+            "UPLOAD_STORE_DIR",
+            os.path.join(tempfile.gettempdir(), "xmind-uploads")
+        )
+        # 文件在最后一次访问后的保留时长（秒）
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("UPLOAD_STORE_TTL", 3600))
+        # 存储的总字节上限（所有工作进程共享），超出后按最近最少使用顺序淘汰（默认256MB）
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("UPLOAD_STORE_MAX_BYTES", 256 * 1024 * 1024))
+
+        # 进程内串行化写入和淘汰，跨进程依赖原子替换
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def compute_file_id(content: bytes) -> str:
+        """计算文件内容的SHA-256作为file_id"""
+        return hashlib.sha256(content).hexdigest()
+
+    def _paths(self, file_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.store_dir, file_id)
+        return base + ".bin", base + ".json"
+
+    def put(self, content: bytes, filename: str = "", file_id: Optional[str] = None) -> Optional[str]:
+        """
+        保存文件内容，相同内容只保存一份（写入磁盘，应在执行器中调用）
+
+        Args:
+            content: 文件的字节内容
+            filename: 原始文件名
+            file_id: 已计算好的SHA-256（可选，避免重复计算）
+
+        Returns:
+            文件的file_id，文件超过存储上限或写入失败未被保存时返回None
+        """
+        file_id = file_id or self.compute_file_id(content)
+        size = len(content)
+
+        if size > self.max_bytes:
+            logger.warning(f"文件大小 {size:,} bytes 超过存储上限 {self.max_bytes:,} bytes，不进行缓存")
+            return None
+
+        bin_path, meta_path = self._paths(file_id)
+        with self._lock:
+            try:
+                os.makedirs(self.store_dir, exist_ok=True)
+                if os.path.exists(bin_path):
+                    os.utime(bin_path)
+                    if filename:
+                        write_json(meta_path, {'filename': filename})
+                    logger.debug(f"上传文件已存在，复用file_id={file_id[:12]}...")
+                    return file_id
+
+                # 先写文件名再写内容：读取方以.bin是否存在判断文件是否可用
+                write_json(meta_path, {'filename': filename})
+                atomic_write(bin_path, content)
+            except OSError as e:
+                logger.warning(f"写入上传文件存储失败: {str(e)}")
+                return None
+
+            self._purge(time.time())
+
+        logger.info(f"上传文件已存储: file_id={file_id[:12]}..., 大小={size:,} bytes")
+        return file_id
+
+    def get(self, file_id: str) -> Optional[bytes]:
+        """
+        根据file_id获取文件内容（读取磁盘，应在执行器中调用）
+
+        Args:
+            file_id: 文件的SHA-256
+
+        Returns:
+            文件字节内容，不存在或已过期时返回None
+        """
+        if not FILE_ID_PATTERN.match(file_id or ""):
+            return None
+
+        bin_path, meta_path = self._paths(file_id)
+        try:
+            if time.time() - os.stat(bin_path).st_mtime > self.ttl_seconds:
+                remove_quietly(bin_path, meta_path)
+                return None
+            with open(bin_path, 'rb') as f:
+                content = f.read()
+            os.utime(bin_path)
+        except OSError:
+            return None
+        return content
+
+    def get_filename(self, file_id: str) -> str:
+        """获取file_id对应的原始文件名"""
+        if not FILE_ID_PATTERN.match(file_id or ""):
+            return ""
+        meta = read_json(self._paths(file_id)[1])
+        return meta.get('filename', "") if meta else ""
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        """存储目录中的文件，按最后访问时间升序（修改时间, file_id, 大小）"""
+        return sorted((mtime, file_id, size) for file_id, mtime, size in scan_files(self.store_dir, ".bin"))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回存储统计信息（扫描存储目录，包含所有工作进程保存的文件）"""
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'total_bytes': sum(size for _, _, size in entries),
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'store_dir': self.store_dir
+        }
+
+    def _purge(self, now: float):
+        """删除超过TTL未被访问的文件，再按LRU顺序淘汰直到总大小不超过上限（调用方需持有锁）"""
+        expired = 0
+        evicted = 0
+        remaining = []
+        for mtime, file_id, size in self._entries():
+            if now - mtime > self.ttl_seconds:
+                remove_quietly(*self._paths(file_id))
+                expired += 1
+            else:
+                remaining.append((file_id, size))
+
+        total_bytes = sum(size for _, size in remaining)
+        for file_id, size in remaining:
+            if total_bytes <= self.max_bytes:
+                break
+            remove_quietly(*self._paths(file_id))
+            total_bytes -= size
+            evicted += 1
+
+        if expired or evicted:
+            logger.info(f"清理上传文件: 过期 {expired} 个, 容量超限淘汰 {evicted} 个")
+
+
+# 创建全局实例
+upload_store = UploadStore()
@@ -5,23 +5,33 @@ XMind文件markerId精确过滤模块
 完全保持原始文件样式和结构
 """
 
+import io
 import shutil
 from lxml import etree
 import zipfile
-import os
 import json
-import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Union
 import logging
 import base64
 import traceback
+from progress import report_stage, report_count
+from metrics import stage_timer
+from hot_path_log import stage_log, node_event
+from tracing import traced, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
+from parse_cache import parsed_map_cache
+from marker_registry import MarkerRegistry
+from marker_normalizer import marker_normalizer
 
 logger = logging.getLogger(__name__)
 
 class XMindMarkerFilter:
     """XMind文件markerId过滤器"""
     
+    # 输出格式版本，修改输出内容时需递增，并同步export_pipeline中的identity（用于导出结果缓存失效）
+    VERSION = "1.2.0"
+    
     def __init__(self):
         # XMind XML命名空间定义
         self.namespaces = {
@@ -29,105 +39,140 @@ class XMindMarkerFilter:
             'm': 'urn:xmind:xmap:xmlns:marker:2.0'
         }
     
-    def has_target_marker(self, topic_node, target_marker_id: str) -> bool:
+    def marker_ids_match(self, marker_ids: List[str], selection: MarkerRegistry) -> bool:
+        """
+        节点的原始markerId中是否有选中的标识符
+        原始markerId及其规范化结果（与分析结果使用同一套映射）各查一次表，JSON和XML过滤共用
+        """
+        for marker_id in marker_ids:
+            if not isinstance(marker_id, str):
+                continue
+            if marker_id in selection or marker_normalizer.normalize(marker_id) in selection:
+                return True
+        return False
+    
+    @staticmethod
+    def lxml_child_topics(topic) -> List:
+        """lxml topic节点的直接子topic（兼容带默认命名空间的content.xml）"""
+        return topic.findall('{*}children/{*}topics/{*}topic')
+    
+    @staticmethod
+    def lxml_marker_ids(topic) -> List[str]:
+        """lxml topic节点自身的markerId（不含后代节点的标识）"""
+        return [marker_ref.get('marker-id', '') for marker_ref in topic.findall('{*}marker-refs/{*}marker-ref')]
+    
+    @staticmethod
+    def minidom_child_elements(node, local_name: str) -> List:
+        """minidom节点中本地名为local_name的直接子元素"""
+        return [
+            child for child in node.childNodes
+            if child.nodeType == child.ELEMENT_NODE and child.tagName.split(':')[-1] == local_name
+        ]
+    
+    def minidom_child_topics(self, topic) -> List:
+        """minidom topic节点的直接子topic"""
+        return [
+            child_topic
+            for children in self.minidom_child_elements(topic, 'children')
+            for topics in self.minidom_child_elements(children, 'topics')
+            for child_topic in self.minidom_child_elements(topics, 'topic')
+        ]
+    
+    def minidom_marker_ids(self, topic) -> List[str]:
+        """minidom topic节点自身的markerId（不含后代节点的标识）"""
+        return [
+            marker_ref.getAttribute('marker-id')
+            for marker_refs in self.minidom_child_elements(topic, 'marker-refs')
+            for marker_ref in self.minidom_child_elements(marker_refs, 'marker-ref')
+        ]
+    
+    def filter_xml_topic(
+        self,
+        topic,
+        selection: MarkerRegistry,
+        dom_ops: Dict[str, Callable],
+        stats: Dict,
+        progress: Dict[str, int],
+        is_root: bool = False,
+        ancestor_has_marker: bool = False
+    ) -> bool:
         """
-        检查topic节点是否包含目标markerId
+        递归过滤XML格式的topic节点（lxml与minidom共用），原地删除不保留的子节点
+        保留规则与filter_json_topic相同：
+        1. 节点本身包含目标标记
+        2. 祖先节点包含目标标记（作为被标记节点的子节点）
+        3. 后代节点包含目标标记（作为路径节点）
         
         Args:
-            topic_node: XML topic节点
-            target_marker_id: 目标标记ID
-            
+            dom_ops: 引擎相关的操作：child_topics(topic)、marker_ids(topic)、remove(topic)
+            progress: 当前工作表的已访问/总节点数，用于进度上报
+        
         Returns:
-            bool: 是否包含目标标记
+            bool: 该节点是否保留
         """
-        # 获取topic下的所有marker-ref元素
-        marker_refs = topic_node.getElementsByTagName('marker-ref')
-        for marker_ref in marker_refs:
-            marker_id = marker_ref.getAttribute('marker-id')
-            if marker_id == target_marker_id:
-                return True
-        return False
+        check_cancelled()
+        progress['visited'] += 1
+        report_count('filter_nodes', progress['visited'], progress['total'])
+        
+        has_target_marker = self.marker_ids_match(dom_ops['marker_ids'](topic), selection)
+        
+        has_valid_children = False
+        for child_topic in dom_ops['child_topics'](topic):
+            child_ancestor_has_marker = ancestor_has_marker or has_target_marker
+            if self.filter_xml_topic(child_topic, selection, dom_ops, stats, progress, ancestor_has_marker=child_ancestor_has_marker):
+                has_valid_children = True
+            else:
+                dom_ops['remove'](child_topic)
+        
+        should_keep = is_root or has_target_marker or ancestor_has_marker or has_valid_children
+        
+        if not should_keep:
+            stats['nodes_removed'] += 1
+            node_event('removed', "删除不包含目标标记的XML节点")
+        elif not is_root:
+            if has_target_marker:
+                node_event('kept_marked', "保留包含目标标记的XML节点")
+            elif ancestor_has_marker:
+                node_event('kept_under_marked', "保留被标记祖先节点的子节点")
+            else:
+                node_event('kept_as_path', "保留包含有效子节点的XML父节点")
+        
+        return should_keep
     
     def process_dom_with_minidom(self, dom, target_marker_ids: List[str]) -> Dict[str, int]:
         """
-        使用xml.dom.minidom处理DOM，删除包含指定markerId的节点
+        使用xml.dom.minidom处理DOM，保留包含指定markerId的节点，删除其他节点
         
         Args:
-            dom: minidom DOM对象
-            target_marker_ids: 要删除的markerId列表
+            dom: minidom DOM对象（原地修改）
+            target_marker_ids: 要保留的markerId列表
             
         Returns:
             Dict: 处理统计信息
         """
-        import xml.dom.minidom as minidom
-        
         stats = {
             'sheets_processed': 0,
             'sheets_removed': 0,
             'nodes_removed': 0,
             'target_marker_ids': target_marker_ids
         }
+        selection = MarkerRegistry(target_marker_ids)
+        dom_ops = {
+            'child_topics': self.minidom_child_topics,
+            'marker_ids': self.minidom_marker_ids,
+            'remove': lambda topic: topic.parentNode.removeChild(topic)
+        }
         
-        # 获取所有sheet
-        sheets = dom.getElementsByTagName('sheet')
-        sheet_nodes = []
-        for i in range(sheets.length):
-            sheet_nodes.append(sheets[i])
-        
-        sheets_to_remove = []
-        
-        for sheet in sheet_nodes:
+        for sheet in list(dom.getElementsByTagName('sheet')):
             stats['sheets_processed'] += 1
             
-            # 获取根topic
-            rootTopics = sheet.getElementsByTagName('topic')
-            if rootTopics.length == 0:
+            # 每个sheet的根topic始终保留
+            root_topics = self.minidom_child_elements(sheet, 'topic')
+            if not root_topics:
                 continue
-                
-            rootTopic = rootTopics[0]
-            
-            # 检查根topic是否包含任何目标标记
-            root_has_target = any(
-                self.has_target_marker(rootTopic, marker_id) 
-                for marker_id in target_marker_ids
-            )
             
-            if root_has_target:
-                # 记录该sheet需要被删除
-                sheets_to_remove.append(sheet)
-                stats['sheets_removed'] += 1
-                logger.info(f"根topic包含目标标记，将删除整个sheet")
-            else:
-                # 获取该根topic下的所有topic（包括自己），然后排除根topic
-                allTopics = rootTopic.getElementsByTagName('topic')
-                topics_to_remove = []
-                
-                for i in range(allTopics.length):
-                    topic = allTopics[i]
-                    # 跳过根topic
-                    if topic == rootTopic:
-                        continue
-                    
-                    # 检查是否包含任何目标标记
-                    topic_has_target = any(
-                        self.has_target_marker(topic, marker_id) 
-                        for marker_id in target_marker_ids
-                    )
-                    
-                    if topic_has_target:
-                        topics_to_remove.append(topic)
-                
-                # 删除这些topic节点
-                for topic in topics_to_remove:
-                    parent = topic.parentNode
-                    parent.removeChild(topic)
-                    stats['nodes_removed'] += 1
-                    logger.info(f"删除包含目标标记的节点")
-        
-        # 删除整个sheet
-        for sheet in sheets_to_remove:
-            parent = sheet.parentNode
-            parent.removeChild(sheet)
+            progress = {'visited': 0, 'total': root_topics[0].getElementsByTagName('topic').length + 1}
+            self.filter_xml_topic(root_topics[0], selection, dom_ops, stats, progress, is_root=True)
         
         return stats
     
@@ -136,7 +181,7 @@ class XMindMarkerFilter:
         使用lxml处理DOM，保留包含指定markerId的节点，删除其他节点
         
         Args:
-            tree: lxml ElementTree对象
+            tree: lxml ElementTree对象（原地修改）
             target_marker_ids: 要保留的markerId列表
             
         Returns:
@@ -148,96 +193,44 @@ class XMindMarkerFilter:
             'nodes_removed': 0,
             'target_marker_ids': target_marker_ids
         }
+        selection = MarkerRegistry(target_marker_ids)
+        dom_ops = {
+            'child_topics': self.lxml_child_topics,
+            'marker_ids': self.lxml_marker_ids,
+            'remove': lambda topic: topic.getparent().remove(topic)
+        }
         
-        root = tree.getroot()
-        
-        # 获取所有sheet
-        sheets = root.xpath('.//sheet')
-        
-        for sheet in sheets:
+        # {*}匹配任意命名空间：XMind 8的content.xml带有默认命名空间
+        for sheet in tree.getroot().iter('{*}sheet'):
             stats['sheets_processed'] += 1
             
-            # 获取该sheet的根topic
-            root_topics = sheet.xpath('.//topic')
-            if not root_topics:
+            # 每个sheet的根topic始终保留
+            root_topic = sheet.find('{*}topic')
+            if root_topic is None:
                 continue
             
-            root_topic = root_topics[0]  # 第一个topic是根topic
-            
-            # 递归处理整个sheet，保留包含目标标记的节点
-            nodes_to_remove = []
-            
-            # 获取所有topic节点（除了根节点）
-            all_topics = sheet.xpath('.//topic')
-            for node in all_topics:
-                if node == root_topic:
-                    continue  # 跳过根节点，根节点始终保留
-                
-                # 检查是否应该保留这个节点
-                should_keep = self.should_keep_xml_node(node, target_marker_ids)
-                
-                if not should_keep:
-                    nodes_to_remove.append(node)
-            
-            # 删除不需要的节点
-            for node in nodes_to_remove:
-                parent = node.getparent()
-                if parent is not None:
-                    parent.remove(node)
-                    stats['nodes_removed'] += 1
-                    logger.info(f"删除不包含目标标记的XML节点")
+            progress = {'visited': 0, 'total': sum(1 for _ in root_topic.iter('{*}topic'))}
+            self.filter_xml_topic(root_topic, selection, dom_ops, stats, progress, is_root=True)
         
         return stats
     
-    def should_keep_xml_node(self, node, target_marker_ids: List[str]) -> bool:
-        """
-        判断XML节点是否应该保留
-        新逻辑：
-        1. 如果节点本身包含目标标记，保留
-        2. 如果节点的祖先包含目标标记，保留（作为被标记节点的子节点）
-        3. 如果节点的后代包含目标标记，保留（作为路径节点）
-        """
-        # 检查当前节点是否包含目标标记
-        for marker_id in target_marker_ids:
-            xpath = f".//marker-ref[@marker-id='{marker_id}']"
-            markers = node.xpath(xpath)
-            if markers:
-                logger.info(f"保留包含目标标记的XML节点: markerId={marker_id}")
-                return True
-        
-        # 检查祖先节点是否包含目标标记
-        for marker_id in target_marker_ids:
-            # 向上查找祖先节点是否有目标标记
-            xpath = f"ancestor::topic[.//marker-ref[@marker-id='{marker_id}']]"
-            ancestor_with_marker = node.xpath(xpath)
-            if ancestor_with_marker:
-                logger.info(f"保留被标记祖先节点的子节点")
-                return True
-        
-        # 检查是否有子节点包含目标标记（作为路径节点保留）
-        for marker_id in target_marker_ids:
-            xpath = f".//topic[.//marker-ref[@marker-id='{marker_id}']]"
-            child_nodes_with_marker = node.xpath(xpath)
-            if child_nodes_with_marker:
-                logger.info(f"保留包含有效子节点的XML父节点")
-                return True
-        
-        return False
-    
+    @traced()
     def filter_xmind_by_markers(
         self, 
-        file_data: str, 
+        file_data: Union[str, bytes], 
         selected_markers: List[str],
-        engine: str = 'lxml'  # 'lxml' 或 'minidom'
+        engine: str = 'lxml',  # 'lxml' 或 'minidom'
+        return_bytes: bool = False
     ) -> Dict:
         """
         根据标识符过滤XMind文件
         保留包含选中标识符的节点，删除其他节点
         
         Args:
-            file_data: XMind文件的base64编码数据
+            file_data: XMind文件的base64编码数据，也可以直接传入文件字节内容
             selected_markers: 要保留的标识符列表
             engine: XML处理引擎
+            return_bytes: 为True时在file_bytes中返回过滤后的文件字节，不再编码为base64
             
         Returns:
             Dict: 包含处理结果的字典
@@ -250,122 +243,145 @@ class XMindMarkerFilter:
             if not selected_markers:
                 raise ValueError("至少需要选择一个标识符")
             
-            logger.info(f"开始过滤XMind文件，保留标识符: {selected_markers}")
+            logger.info("开始过滤XMind文件，保留标识符: %s", selected_markers)
             
-            # 解码base64数据
-            decoded_data = base64.b64decode(file_data)
+            # 解码base64数据（已是字节内容时无需解码）
+            if isinstance(file_data, (bytes, bytearray)):
+                decoded_data = bytes(file_data)
+            else:
+                with stage_timer('decode', 'base64'):
+                    decoded_data = base64.b64decode(file_data)
             original_size = len(decoded_data)
-            logger.info(f"原始文件大小: {original_size} bytes")
-            
-            # 创建临时文件来处理
-            with tempfile.NamedTemporaryFile(suffix='.xmind', delete=False) as temp_file:
-                temp_file.write(decoded_data)
-                temp_file_path = temp_file.name
-            
-            try:
-                # 解压XMind文件
-                with zipfile.ZipFile(temp_file_path, 'r') as zip_ref:
-                    with tempfile.TemporaryDirectory() as extract_dir:
-                        zip_ref.extractall(extract_dir)
-                        
-                        # 初始化统计信息
-                        stats = {
-                            'original_size': original_size,
-                            'sheets_processed': 0,
-                            'sheets_removed': 0,
-                            'nodes_removed': 0,
-                            'target_markers': selected_markers,
-                            'processing_engine': engine
-                        }
-                        
-                        # 处理content.json（如果存在）
-                        content_json_path = os.path.join(extract_dir, 'content.json')
-                        if os.path.exists(content_json_path):
-                            logger.info("处理content.json格式")
-                            self.process_content_json(content_json_path, selected_markers, stats)
-                        
-                        # 处理content.xml（如果存在）
-                        content_xml_path = os.path.join(extract_dir, 'content.xml')
-                        if os.path.exists(content_xml_path):
-                            logger.info(f"处理content.xml格式，使用{engine}引擎")
-                            if engine == 'lxml':
-                                self.process_content_xml_lxml(content_xml_path, selected_markers, stats)
-                            else:
-                                self.process_content_xml_minidom(content_xml_path, selected_markers, stats)
-                        
-                        # 重新打包XMind文件
-                        with tempfile.NamedTemporaryFile(suffix='.xmind', delete=False) as new_temp_file:
-                            new_temp_path = new_temp_file.name
-                        
-                        with zipfile.ZipFile(new_temp_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
-                            for root, dirs, files in os.walk(extract_dir):
-                                for file in files:
-                                    file_path = os.path.join(root, file)
-                                    arc_path = os.path.relpath(file_path, extract_dir)
-                                    new_zip.write(file_path, arc_path)
-                        
-                        # 读取处理后的文件
-                        with open(new_temp_path, 'rb') as processed_file:
-                            processed_data = processed_file.read()
-                        
-                        # 计算压缩统计
-                        filtered_size = len(processed_data)
-                        compression_ratio = f"{((original_size - filtered_size) / original_size * 100):.1f}%"
-                        
-                        stats.update({
-                            'filtered_size': filtered_size,
-                            'compression_ratio': compression_ratio
-                        })
-                        
-                        # 编码为base64
-                        processed_base64 = base64.b64encode(processed_data).decode('utf-8')
-                        
-                        logger.info(f"过滤完成，保留标识符 {selected_markers}")
-                        logger.info(f"删除节点数: {stats['nodes_removed']}")
-                        logger.info(f"删除工作表数: {stats['sheets_removed']}")
-                        logger.info(f"文件大小变化: {original_size} -> {filtered_size} bytes")
-                        logger.info(f"压缩率: {compression_ratio}")
-                        
-                        return {
-                            'success': True,
-                            'file_data': processed_base64,
-                            'processing_details': stats
-                        }
-                        
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                if 'new_temp_path' in locals() and os.path.exists(new_temp_path):
-                    os.unlink(new_temp_path)
+            logger.info("原始文件大小: %s bytes", original_size)
+            
+            # 从解析缓存获取解压后的成员（同一文件只解压一次）
+            report_stage('parse')
+            members = parsed_map_cache.get_members(decoded_data)
+            
+            # 初始化统计信息
+            stats = {
+                'original_size': original_size,
+                'sheets_processed': 0,
+                'sheets_removed': 0,
+                'nodes_removed': 0,
+                'target_markers': selected_markers,
+                'processing_engine': engine
+            }
+            
+            # 过滤后的成员（未处理的成员原样保留）
+            filtered_members = dict(members)
+            
+            # 处理content.json（如果存在）
+            report_stage('filter')
+            if 'content.json' in members:
+                logger.info("处理content.json格式")
+                with stage_timer('filter', 'json'), stage_log('filter', logger):
+                    filtered_members['content.json'] = self.filter_content_json(members['content.json'], selected_markers, stats)
+            
+            # 处理content.xml（如果存在）
+            if 'content.xml' in members:
+                logger.info("处理content.xml格式，使用%s引擎", engine)
+                with stage_timer('filter', engine), stage_log('filter', logger):
+                    if engine == 'lxml':
+                        filtered_members['content.xml'] = self.filter_content_xml_lxml(members['content.xml'], selected_markers, stats)
+                    else:
+                        filtered_members['content.xml'] = self.filter_content_xml_minidom(members['content.xml'], selected_markers, stats)
+            
+            # 在内存中重新打包XMind文件
+            check_cancelled()
+            report_stage('save')
+            with stage_timer('save', 'zipfile'):
+                processed_data = self.pack_members(filtered_members)
+            
+            # 计算压缩统计
+            filtered_size = len(processed_data)
+            compression_ratio = f"{((original_size - filtered_size) / original_size * 100):.1f}%"
+            
+            stats.update({
+                'filtered_size': filtered_size,
+                'compression_ratio': compression_ratio
+            })
+            set_attributes(
+                engine=engine,
+                selected_markers=len(selected_markers),
+                sheets=stats['sheets_processed'],
+                nodes_removed=stats['nodes_removed'],
+                bytes_in=original_size,
+                bytes_out=filtered_size
+            )
+            
+            logger.info(
+                "过滤完成，保留标识符 %s，删除节点数: %s，删除工作表数: %s，文件大小变化: %s -> %s bytes，压缩率: %s",
+                selected_markers,
+                stats['nodes_removed'],
+                stats['sheets_removed'],
+                original_size,
+                filtered_size,
+                compression_ratio
+            )
+            
+            if return_bytes:
+                return {
+                    'success': True,
+                    'file_bytes': processed_data,
+                    'processing_details': stats
+                }
+            
+            # 编码为base64
+            with stage_timer('encode', 'base64'):
+                encoded_data = base64.b64encode(processed_data).decode('utf-8')
+            return {
+                'success': True,
+                'file_data': encoded_data,
+                'processing_details': stats
+            }
                     
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"过滤XMind文件时出错: {str(e)}")
             logger.error(traceback.format_exc())
             raise
 
-    def process_content_json(self, content_json_path: str, target_marker_ids: List[str], stats: Dict) -> Dict[str, int]:
+    def pack_members(self, members: Dict[str, bytes]) -> bytes:
+        """
+        将成员重新打包为XMind文件字节（全程在内存中完成）
+        忽略绝对路径或包含..的成员名
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as new_zip:
+            for member_name, member_data in members.items():
+                normalized = member_name.replace('\\', '/')
+                if normalized.startswith('/') or '..' in normalized.split('/'):
+                    logger.warning(f"忽略非法的压缩包成员路径: {member_name}")
+                    continue
+                new_zip.writestr(normalized, member_data)
+        return buffer.getvalue()
+
+    def filter_content_json(self, content: bytes, target_marker_ids: List[str], stats: Dict) -> bytes:
         """
-        处理content.json文件，删除包含指定markerId的节点
+        处理content.json内容，删除包含指定markerId的节点
         
         Args:
-            content_json_path: content.json文件路径
+            content: content.json的字节内容
             target_marker_ids: 要删除的markerId列表
-            stats: 处理统计信息
+            stats: 处理统计信息（原地更新）
             
         Returns:
-            Dict: 处理统计信息
+            bytes: 过滤后的content.json字节内容
         """
         stats['sheets_processed'] = 0
         stats['sheets_removed'] = 0
         stats['nodes_removed'] = 0
         
         try:
-            # 读取JSON文件
-            with open(content_json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 解析JSON内容
+            data = json.loads(content.decode('utf-8'))
+            
+            logger.info("原始content.json大小: %s bytes", len(content))
             
-            logger.info(f"原始content.json大小: {os.path.getsize(content_json_path)} bytes")
+            # 目标标识符注册表，逐节点检查只需查表
+            selection = MarkerRegistry(target_marker_ids)
             
             # 处理每个工作表
             filtered_sheets = []
@@ -373,25 +389,24 @@ class XMindMarkerFilter:
                 stats['sheets_processed'] += 1
                 
                 # 处理工作表
-                filtered_sheet = self.filter_json_sheet(sheet, target_marker_ids, stats)
+                filtered_sheet = self.filter_json_sheet(sheet, selection, stats)
                 if filtered_sheet:
                     filtered_sheets.append(filtered_sheet)
                 else:
                     stats['sheets_removed'] += 1
-                    logger.info(f"删除整个工作表，因为根topic包含目标标记")
+                    node_event('sheets_removed', "删除整个工作表，因为根topic包含目标标记")
             
-            # 保存修改后的JSON
-            with open(content_json_path, 'w', encoding='utf-8') as f:
-                json.dump(filtered_sheets, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"content.json处理完成，处理统计: {stats}")
-            return stats
+            # 序列化修改后的JSON
+            logger.info("content.json处理完成，处理统计: %s", stats)
+            return json.dumps(filtered_sheets, ensure_ascii=False, indent=2).encode('utf-8')
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"处理content.json失败: {str(e)}")
             raise
     
-    def filter_json_sheet(self, sheet: Dict, target_marker_ids: List[str], stats: Dict) -> Dict:
+    def filter_json_sheet(self, sheet: Dict, selection: MarkerRegistry, stats: Dict) -> Dict:
         """
         过滤JSON格式的工作表
         保留包含目标标记的工作表和节点
@@ -402,12 +417,12 @@ class XMindMarkerFilter:
         root_topic = sheet['rootTopic']
         
         # 过滤根主题
-        filtered_root = self.filter_json_topic(root_topic, target_marker_ids, stats, is_root=True)
+        filtered_root = self.filter_json_topic(root_topic, selection, stats, is_root=True)
         
         if not filtered_root:
             # 如果根主题被完全过滤掉（即没有任何包含目标标记的节点），删除整个工作表
             stats['sheets_removed'] += 1
-            logger.info("删除不包含目标标记的工作表")
+            node_event('sheets_without_marker', "删除不包含目标标记的工作表")
             return None
         
         # 创建新的工作表
@@ -416,7 +431,7 @@ class XMindMarkerFilter:
         
         return filtered_sheet
     
-    def filter_json_topic(self, topic: Dict, target_marker_ids: List[str], stats: Dict, is_root: bool = False, ancestor_has_marker: bool = False) -> Dict:
+    def filter_json_topic(self, topic: Dict, selection: MarkerRegistry, stats: Dict, is_root: bool = False, ancestor_has_marker: bool = False) -> Dict:
         """
         递归过滤JSON格式的主题节点
         新逻辑：
@@ -426,9 +441,10 @@ class XMindMarkerFilter:
         """
         if not topic:
             return None
+        check_cancelled()
         
         # 检查当前节点是否包含目标标记
-        has_target_marker = self.json_topic_has_target_marker(topic, target_marker_ids)
+        has_target_marker = self.json_topic_has_target_marker(topic, selection)
         
         # 处理子主题
         filtered_topic = topic.copy()
@@ -439,7 +455,7 @@ class XMindMarkerFilter:
             for child_topic in topic['children']['attached']:
                 # 如果当前节点有标记或祖先有标记，传递给子节点
                 child_ancestor_has_marker = ancestor_has_marker or has_target_marker
-                filtered_child = self.filter_json_topic(child_topic, target_marker_ids, stats, is_root=False, ancestor_has_marker=child_ancestor_has_marker)
+                filtered_child = self.filter_json_topic(child_topic, selection, stats, is_root=False, ancestor_has_marker=child_ancestor_has_marker)
                 if filtered_child:
                     filtered_children.append(filtered_child)
                     has_valid_children = True
@@ -459,212 +475,99 @@ class XMindMarkerFilter:
                 # 如果没有有效子节点，移除children字段
                 del filtered_topic['children']
             
-            if has_target_marker and not is_root:
-                logger.info(f"保留包含目标标记的节点: {topic.get('title', 'untitled')}")
-            elif ancestor_has_marker and not is_root:
-                logger.info(f"保留被标记祖先节点的子节点: {topic.get('title', 'untitled')}")
+            if not is_root:
+                if has_target_marker:
+                    node_event('kept_marked', "保留包含目标标记的节点: %s", topic.get('title', 'untitled'))
+                elif ancestor_has_marker:
+                    node_event('kept_under_marked', "保留被标记祖先节点的子节点: %s", topic.get('title', 'untitled'))
+                else:
+                    node_event('kept_as_path')
             
             return filtered_topic
         else:
             # 删除不符合保留条件的节点
             stats['nodes_removed'] += 1
-            logger.info(f"删除不包含目标标记的节点: {topic.get('title', 'untitled')}")
+            node_event('removed', "删除不包含目标标记的节点: %s", topic.get('title', 'untitled'))
             return None
     
-    def json_topic_has_target_marker(self, topic: Dict, target_marker_ids: List[str]) -> bool:
+    def json_topic_has_target_marker(self, topic: Dict, selection: MarkerRegistry) -> bool:
         """
         检查JSON格式的主题节点是否包含目标标记
+        selection为目标标识符的注册表，原始markerId及其规范化结果（与分析结果使用同一套映射）各查一次表
         """
         # 检查markers字段
         markers = topic.get('markers', [])
-        for marker in markers:
-            if isinstance(marker, dict):
-                marker_id = marker.get('markerId', '')
-                if marker_id in target_marker_ids:
-                    return True
-            elif isinstance(marker, str):
-                if marker in target_marker_ids:
-                    return True
-        
-        return False
+        return self.marker_ids_match(
+            [marker.get('markerId', '') if isinstance(marker, dict) else marker for marker in markers],
+            selection
+        )
 
-    def process_content_xml_lxml(self, content_xml_path: str, target_marker_ids: List[str], stats: Dict) -> Dict[str, int]:
+    def filter_content_xml_lxml(self, content: bytes, target_marker_ids: List[str], stats: Dict) -> bytes:
         """
         使用lxml处理content.xml，保留包含指定markerId的节点，删除其他节点
         
         Args:
-            content_xml_path: content.xml文件路径
+            content: content.xml的字节内容
             target_marker_ids: 要保留的markerId列表
-            stats: 处理统计信息
+            stats: 处理统计信息（原地更新）
             
         Returns:
-            Dict: 处理统计信息
+            bytes: 过滤后的content.xml字节内容
         """
-        stats['sheets_processed'] = 0
-        stats['sheets_removed'] = 0
-        stats['nodes_removed'] = 0
-        
         try:
-            # 使用lxml解析XML
+            # 使用lxml解析XML，节点筛选与基于DOM的处理共用process_dom_with_lxml
             parser = etree.XMLParser(remove_blank_text=True)
-            tree = etree.parse(content_xml_path, parser)
+            tree = etree.ElementTree(etree.fromstring(content, parser))
+            self.update_dom_stats(stats, self.process_dom_with_lxml(tree, target_marker_ids))
             
-            # 获取所有sheet
-            sheets = tree.getroot().xpath('.//sheet')
-            
-            for sheet in sheets:
-                stats['sheets_processed'] += 1
-                
-                # 获取该sheet的根topic
-                root_topics = sheet.xpath('.//topic')
-                if not root_topics:
-                    continue
-                
-                root_topic = root_topics[0]  # 第一个topic是根topic
-                
-                # 递归处理整个sheet，保留包含目标标记的节点
-                nodes_to_remove = []
-                
-                # 获取所有topic节点（除了根节点）
-                all_topics = sheet.xpath('.//topic')
-                for node in all_topics:
-                    if node == root_topic:
-                        continue  # 跳过根节点，根节点始终保留
-                    
-                    # 检查是否应该保留这个节点
-                    should_keep = self.should_keep_xml_node(node, target_marker_ids)
-                    
-                    if not should_keep:
-                        nodes_to_remove.append(node)
-                
-                # 删除不需要的节点
-                for node in nodes_to_remove:
-                    parent = node.getparent()
-                    if parent is not None:
-                        parent.remove(node)
-                        stats['nodes_removed'] += 1
-                        logger.info(f"删除不包含目标标记的XML节点")
-            
-            # 保存修改后的XML
-            tree.write(
-                content_xml_path, 
+            # 序列化修改后的XML
+            return etree.tostring(
+                tree, 
                 encoding='UTF-8', 
                 xml_declaration=True, 
                 pretty_print=True
             )
             
-            return stats
-            
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"处理content.xml失败: {str(e)}")
             raise
 
-    def process_content_xml_minidom(self, content_xml_path: str, target_marker_ids: List[str], stats: Dict) -> Dict[str, int]:
+    def filter_content_xml_minidom(self, content: bytes, target_marker_ids: List[str], stats: Dict) -> bytes:
         """
         使用minidom处理content.xml，保留包含指定markerId的节点，删除其他节点
         
         Args:
-            content_xml_path: content.xml文件路径
+            content: content.xml的字节内容
             target_marker_ids: 要保留的markerId列表
-            stats: 处理统计信息
+            stats: 处理统计信息（原地更新）
             
         Returns:
-            Dict: 处理统计信息
+            bytes: 过滤后的content.xml字节内容
         """
-        stats['sheets_processed'] = 0
-        stats['sheets_removed'] = 0
-        stats['nodes_removed'] = 0
-        
         try:
-            # 使用minidom解析XML
+            # 使用minidom解析XML，节点筛选与基于DOM的处理共用process_dom_with_minidom
             import xml.dom.minidom as minidom
-            dom = minidom.parse(content_xml_path)
-            
-            # 获取所有sheet
-            sheets = dom.getElementsByTagName('sheet')
-            sheet_nodes = []
-            for i in range(sheets.length):
-                sheet_nodes.append(sheets[i])
-            
-            for sheet in sheet_nodes:
-                stats['sheets_processed'] += 1
-                
-                # 获取根topic
-                rootTopics = sheet.getElementsByTagName('topic')
-                if rootTopics.length == 0:
-                    continue
-                    
-                rootTopic = rootTopics[0]
-                
-                # 获取该根topic下的所有topic（除了根topic）
-                allTopics = rootTopic.getElementsByTagName('topic')
-                topics_to_remove = []
-                
-                for i in range(allTopics.length):
-                    topic = allTopics[i]
-                    # 跳过根topic
-                    if topic == rootTopic:
-                        continue
-                    
-                    # 检查是否应该保留这个节点
-                    should_keep = self.should_keep_minidom_node(topic, target_marker_ids)
-                    
-                    if not should_keep:
-                        topics_to_remove.append(topic)
-                
-                # 删除不需要的topic节点
-                for topic in topics_to_remove:
-                    parent = topic.parentNode
-                    parent.removeChild(topic)
-                    stats['nodes_removed'] += 1
-                    logger.info(f"删除不包含目标标记的XML节点（minidom）")
+            dom = minidom.parseString(content)
+            self.update_dom_stats(stats, self.process_dom_with_minidom(dom, target_marker_ids))
             
-            # 保存修改后的XML
-            with open(content_xml_path, 'w', encoding='utf-8') as f:
-                dom.writexml(f, encoding='utf-8')
-            
-            return stats
+            # 序列化修改后的XML
+            output = io.StringIO()
+            dom.writexml(output, encoding='utf-8')
+            return output.getvalue().encode('utf-8')
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"处理content.xml失败: {str(e)}")
             raise
 
-    def should_keep_minidom_node(self, node, target_marker_ids: List[str]) -> bool:
-        """
-        判断minidom节点是否应该保留
-        新逻辑：
-        1. 如果节点本身包含目标标记，保留
-        2. 如果节点的祖先包含目标标记，保留（作为被标记节点的子节点）
-        3. 如果节点的后代包含目标标记，保留（作为路径节点）
-        """
-        # 检查当前节点是否包含目标标记
-        for marker_id in target_marker_ids:
-            if self.has_target_marker(node, marker_id):
-                logger.info(f"保留包含目标标记的XML节点（minidom）: markerId={marker_id}")
-                return True
-        
-        # 检查祖先节点是否包含目标标记
-        current = node.parentNode
-        while current and current.nodeType == current.ELEMENT_NODE and current.tagName == 'topic':
-            for marker_id in target_marker_ids:
-                if self.has_target_marker(current, marker_id):
-                    logger.info(f"保留被标记祖先节点的子节点（minidom）")
-                    return True
-            current = current.parentNode
-        
-        # 检查是否有子节点包含目标标记（作为路径节点保留）
-        child_topics = node.getElementsByTagName('topic')
-        for i in range(child_topics.length):
-            child_topic = child_topics[i]
-            if child_topic == node:
-                continue  # 跳过自己
-            
-            for marker_id in target_marker_ids:
-                if self.has_target_marker(child_topic, marker_id):
-                    logger.info(f"保留包含有效子节点的XML父节点（minidom）")
-                    return True
-        
-        return False
+    @staticmethod
+    def update_dom_stats(stats: Dict, dom_stats: Dict[str, int]):
+        """将process_dom_*的节点统计写入过滤统计信息"""
+        for key in ('sheets_processed', 'sheets_removed', 'nodes_removed'):
+            stats[key] = dom_stats[key]
 
 # 创建全局实例
 xmind_filter = XMindMarkerFilter() 
\ No newline at end of file
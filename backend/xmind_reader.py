@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+XMind文件读取器（替代xmindparser.xmind_to_dict）
+- 只从压缩包中读取content.json（XMind Zen）或content.xml（XMind 8），资源、缩略图、修订历史等成员不解压
+- content.xml用lxml.etree.iterparse从压缩包成员流中增量解析，每个元素处理完即清除，不构建完整DOM
+- 输出紧凑的工作表结构，字段与xmindparser基本一致（title/topic/structure，节点title/markers/labels/note/link/topics），
+  另外保留节点id，标识符字段名为markers（xmindparser为makers）；空值字段省略，只输出attached子节点
+
+输出结构只读共享（由解析缓存持有），调用方不得修改
+"""
+
+import io
+import json
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+CONTENT_JSON = "content.json"
+CONTENT_XML = "content.xml"
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+class XMindFormatError(ValueError):
+    """压缩包中没有可识别的XMind内容"""
+
+
+def read_sheets(file_content: bytes) -> Tuple[List[Dict], int]:
+    """
+    读取XMind文件的工作表结构
+
+    Args:
+        file_content: XMind文件的字节内容
+
+    Returns:
+        (工作表列表, 内容成员解压后的字节数)
+
+    Raises:
+        XMindFormatError: 缺少content.json和content.xml
+    """
+    with zipfile.ZipFile(io.BytesIO(file_content), 'r') as zip_ref:
+        names = set(zip_ref.namelist())
+        if CONTENT_JSON in names:
+            with zip_ref.open(CONTENT_JSON) as stream:
+                sheets = read_content_json(stream)
+            return sheets, zip_ref.getinfo(CONTENT_JSON).file_size
+        if CONTENT_XML in names:
+            with zip_ref.open(CONTENT_XML) as stream:
+                sheets = read_content_xml(stream)
+            return sheets, zip_ref.getinfo(CONTENT_XML).file_size
+    raise XMindFormatError("不是有效的XMind文件：缺少content.json或content.xml")
+
+
+def read_content_json(stream: Any) -> List[Dict]:
+    """读取XMind Zen的content.json（显式栈遍历，不受递归深度限制）"""
+    sheets = []
+    for raw_sheet in json.load(stream):
+        raw_root = raw_sheet.get('rootTopic') or {}
+        root = _zen_topic(raw_root)
+        stack = [(raw_root, root)]
+        while stack:
+            raw, topic = stack.pop()
+            attached = (raw.get('children') or {}).get('attached') or []
+            if attached:
+                topic['topics'] = []
+                for raw_child in attached:
+                    child = _zen_topic(raw_child)
+                    topic['topics'].append(child)
+                    stack.append((raw_child, child))
+
+        sheets.append(_compact({
+            'title': raw_sheet.get('title', ''),
+            'topic': root,
+            'structure': raw_root.get('structureClass'),
+            'id': raw_sheet.get('id')
+        }))
+    return sheets
+
+
+def _zen_topic(raw: Dict) -> Dict:
+    """转换单个Zen节点的自身字段（不含子节点）"""
+    notes = (raw.get('notes') or {}).get('plain') or {}
+    image = raw.get('image')
+    callout = (raw.get('children') or {}).get('callout') or []
+    return _finish_topic({
+        'title': raw.get('title') or '',
+        'id': raw.get('id'),
+        'markers': [marker.get('markerId') for marker in raw.get('markers') or [] if isinstance(marker, dict)],
+        'labels': raw.get('labels'),
+        'note': notes.get('content', '').strip() if isinstance(notes, dict) else None,
+        'link': raw.get('href'),
+        'image': image.get('src') if isinstance(image, dict) else image,
+        'callout': [item.get('title') for item in callout if isinstance(item, dict)]
+    })
+
+
+def read_content_xml(stream: Any) -> List[Dict]:
+    """
+    增量读取XMind 8的content.xml
+    按元素路径识别sheet/topic/title/marker-ref/label/notes，detached等非attached子树整体跳过
+    """
+    # lxml在首次读取XMind 8文件时才导入
+    from lxml import etree
+
+    sheets: List[Dict] = []
+    path: List[str] = []            # 当前元素路径（本地名）
+    topics: List[Optional[Dict]] = []  # 当前topic栈，None表示不输出的子树
+    topic_groups: List[str] = []    # 当前topics元素的type栈
+    sheet: Optional[Dict] = None
+
+    for event, element in etree.iterparse(stream, events=('start', 'end'), resolve_entities=False, no_network=True, huge_tree=True):
+        tag = element.tag
+        name = tag.rpartition('}')[2] if isinstance(tag, str) else ''
+
+        if event == 'start':
+            parent = path[-1] if path else ''
+            path.append(name)
+            if name == 'sheet':
+                sheet = {'title': '', 'topic': None, 'id': element.get('id')}
+            elif name == 'topics':
+                topic_groups.append(element.get('type', ''))
+            elif name == 'topic':
+                topic = None
+                if parent == 'sheet' and sheet is not None and sheet['topic'] is None:
+                    topic = {'title': '', 'id': element.get('id'), 'link': element.get(XLINK_HREF)}
+                    sheet['topic'] = topic
+                    sheet['structure'] = element.get('structure-class')
+                elif parent == 'topics' and topic_groups and topic_groups[-1] == 'attached' and topics and topics[-1] is not None:
+                    topic = {'title': '', 'id': element.get('id'), 'link': element.get(XLINK_HREF)}
+                    topics[-1].setdefault('topics', []).append(topic)
+                topics.append(topic)
+            continue
+
+        # end事件：元素及其子元素已完整解析
+        parent = path[-2] if len(path) > 1 else ''
+        owner = topics[-1] if topics and parent == 'topic' else None
+        grand_owner = topics[-1] if topics and len(path) > 2 and path[-3] == 'topic' else None
+
+        if name == 'title':
+            if owner is not None:
+                owner['title'] = element.text or ''
+            elif parent == 'sheet' and sheet is not None:
+                sheet['title'] = element.text or ''
+        elif name == 'marker-ref' and parent == 'marker-refs' and grand_owner is not None:
+            grand_owner.setdefault('markers', []).append(element.get('marker-id'))
+        elif name == 'label' and parent == 'labels' and grand_owner is not None:
+            grand_owner.setdefault('labels', []).append(element.text)
+        elif name == 'plain' and parent == 'notes' and grand_owner is not None:
+            grand_owner['note'] = (element.text or '').strip()
+        elif name == 'img' and owner is not None:
+            owner['image'] = element.get('{http://www.w3.org/1999/xhtml}src') or '[Image]'
+        elif name == 'topics':
+            topic_groups.pop()
+        elif name == 'topic':
+            topic = topics.pop()
+            if topic is not None:
+                if topic.get('image'):
+                    # 与xmindparser一致：图片节点的标题为[Image]
+                    topic['title'] = '[Image]'
+                _finish_topic(topic)
+        elif name == 'sheet' and sheet is not None:
+            if sheet['topic'] is not None:
+                sheets.append(_compact(sheet))
+            sheet = None
+
+        path.pop()
+        # 释放已处理的元素及其之前的兄弟元素
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    return sheets
+
+
+def _finish_topic(topic: Dict) -> Dict:
+    """按xmindparser的约定处理链接，并原地删除空值字段（title始终保留）"""
+    link = topic.get('link')
+    if link:
+        if link.startswith('xmind'):
+            topic['link'] = '[To another xmind topic!]'
+        elif link.startswith('xap:attachments'):
+            topic['link'] = None
+            topic['title'] = f"[Attachment]{topic['title']}"
+    for key in [key for key, value in topic.items() if not value and key != 'title']:
+        del topic[key]
+    return topic
+
+
+def _compact(values: Dict) -> Dict:
+    return {key: value for key, value in values.items() if value}
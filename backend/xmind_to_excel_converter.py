@@ -10,17 +10,29 @@ import base64
 import io
 import os
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, BinaryIO, Union
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 from collections import OrderedDict
+from progress import report_stage, report_count
+from metrics import stage_timer, timed_stage
+from tracing import traced, span, set_attributes
+from cancellation import check_cancelled, ExportCancelledError
+from marker_registry import MarkerRegistry
 
 logger = logging.getLogger(__name__)
 
+# 核心功能的标识符；每次转换的注册表都先注册这些标识符，它们的位序号固定，掩码可预先计算
+CORE_MARKERS = ('important', 'priority-1', 'flag-red', 'star-red')
+CORE_MARKER_MASK = MarkerRegistry(CORE_MARKERS).mask(CORE_MARKERS)
+
 class XMindToExcelConverter:
     """将XMind数据直接转换为Excel，保持数据结构完整性"""
     
+    # 输出格式版本，修改输出内容时需递增，并同步export_pipeline中的identity（用于导出结果缓存失效）
+    VERSION = "1.0.0"
+    
     def __init__(self):
         # 配置样式
         self.level_colors = {
@@ -36,19 +48,21 @@ class XMindToExcelConverter:
         # 最大支持的节点层级
         self.max_levels = 5
         
-    def convert_to_excel(self, xmind_data: Dict, output_path: str = None) -> str:
+    @traced()
+    def convert_to_excel(self, xmind_data: Dict, output_path: Union[str, BinaryIO, None] = None) -> Union[str, BinaryIO]:
         """
         将过滤后的XMind数据转换为Excel文件
         
         Args:
             xmind_data: 过滤后的XMind数据，包含JSON或XML格式的内容
-            output_path: 输出文件路径，如果为None则自动生成
+            output_path: 输出文件路径，如果为None则自动生成，也可以是可写的二进制文件对象
             
         Returns:
-            生成的Excel文件路径
+            生成的Excel文件路径（输出到文件对象时返回该对象）
         """
         try:
             logger.info("🚀 开始将过滤后的XMind数据转换为Excel...")
+            report_stage('render')
             
             # 提取XMind结构
             if isinstance(xmind_data, dict) and 'content' in xmind_data:
@@ -87,6 +101,7 @@ class XMindToExcelConverter:
             hierarchy_data = self._extract_hierarchy(sheets)
             current_row = 2  # 从第2行开始（第1行是表头）
             total_rows = self._write_data(ws_main, hierarchy_data, current_row)
+            set_attributes(sheets=len(sheets), nodes=len(hierarchy_data), rows=total_rows - current_row)
             
             # 设置列宽
             self._set_column_widths(ws_main, total_rows)
@@ -100,15 +115,27 @@ class XMindToExcelConverter:
                 timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
                 output_path = f"XMind导出_冒烟测试用例_{timestamp}.xlsx"
             
-            wb.save(output_path)
-            logger.info(f"✅ Excel转换完成: {output_path}")
+            check_cancelled()
+            report_stage('save')
+            with stage_timer('save', 'openpyxl'), span('Workbook.save'):
+                wb.save(output_path)
+            output_name = output_path if isinstance(output_path, str) else "内存缓冲区"
+            logger.info(f"✅ Excel转换完成: {output_name}")
             
             return output_path
             
+        except ExportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"❌ XMind转Excel失败: {str(e)}")
             raise Exception(f"转换失败: {str(e)}")
     
+    def convert_to_bytes(self, xmind_data: Dict) -> bytes:
+        """将过滤后的XMind数据转换为Excel并直接返回文件字节（不落盘）"""
+        buffer = io.BytesIO()
+        self.convert_to_excel(xmind_data, buffer)
+        return buffer.getvalue()
+    
     def _extract_hierarchy(self, sheets: List[Dict]) -> List[Dict]:
         """
         从XMind sheets中提取层级结构
@@ -117,6 +144,7 @@ class XMindToExcelConverter:
             包含层级结构的数据列表
         """
         hierarchy = []
+        registry = MarkerRegistry(CORE_MARKERS)
         
         for sheet in sheets:
             if not sheet:
@@ -134,12 +162,12 @@ class XMindToExcelConverter:
                 continue
                 
             # 提取层级结构
-            self._process_topic(root_topic, [], hierarchy, 0)
+            self._process_topic(root_topic, [], hierarchy, 0, registry)
             
         logger.info(f"从XMind数据中提取了 {len(hierarchy)} 个节点")
         return hierarchy
         
-    def _process_topic(self, topic: Dict, path: List[str], result: List[Dict], level: int):
+    def _process_topic(self, topic: Dict, path: List[str], result: List[Dict], level: int, registry: MarkerRegistry):
         """递归处理主题，构建层级结构"""
         if not topic or not isinstance(topic, dict):
             return
@@ -161,8 +189,8 @@ class XMindToExcelConverter:
                 elif isinstance(marker, str):
                     markers.append(marker)
         
-        # 提取备注
-        notes = ""
+        # 提取备注（xmind_reader输出的note为纯文本，原始content.json为notes结构）
+        notes = topic.get('note') or ""
         if 'notes' in topic:
             notes_data = topic['notes']
             if isinstance(notes_data, dict) and 'plain' in notes_data:
@@ -178,6 +206,7 @@ class XMindToExcelConverter:
             'level': level + 1,  # 从1开始计数
             'path': current_path,
             'markers': markers,
+            'marker_mask': registry.mask(markers),
             'notes': notes,
             'children': []
         }
@@ -196,7 +225,7 @@ class XMindToExcelConverter:
             children = topic['topics']
         
         for child in children:
-            self._process_topic(child, current_path, result, level + 1)
+            self._process_topic(child, current_path, result, level + 1, registry)
     
     def _write_headers(self, ws):
         """写入Excel表头"""
@@ -242,36 +271,23 @@ class XMindToExcelConverter:
         valid_data = [node for node in hierarchy_data if node.get('path') and len(node.get('path', [])) > 0]
         sorted_data = valid_data
         # 写入数据行
-        for node in sorted_data:
-            level = min(node['level'], self.max_levels)
+        with stage_timer('write_sheet', 'openpyxl'):
+            for index, node in enumerate(sorted_data, 1):
+                check_cancelled()
+                report_count('write_rows', index, len(sorted_data))
+                level = min(node['level'], self.max_levels)
             
-            # 写入节点标题到对应的层级列
-            for i in range(1, self.max_levels + 1):
-                if i == level:
-                    # 在当前节点级别写入标题
-                    cell = ws.cell(row=current_row, column=i, value=node['title'])
+                # 写入节点标题到对应的层级列
+                for i in range(1, self.max_levels + 1):
+                    if i == level:
+                        # 在当前节点级别写入标题
+                        cell = ws.cell(row=current_row, column=i, value=node['title'])
                     
-                    # 根据层级设置背景色
-                    level_color = self.level_colors.get(level, 'FFFFFF')
-                    cell.fill = PatternFill(start_color=level_color, end_color=level_color, fill_type='solid')
+                        # 根据层级设置背景色
+                        level_color = self.level_colors.get(level, 'FFFFFF')
+                        cell.fill = PatternFill(start_color=level_color, end_color=level_color, fill_type='solid')
                     
-                    # 设置边框和对齐方式
-                    cell.alignment = Alignment(vertical='center', wrap_text=True)
-                    cell.border = Border(
-                        left=Side(style='thin', color='D4D4D4'),
-                        right=Side(style='thin', color='D4D4D4'),
-                        top=Side(style='thin', color='D4D4D4'),
-                        bottom=Side(style='thin', color='D4D4D4')
-                    )
-                elif i < level:
-                    # 从路径中获取上级节点标题
-                    if i-1 < len(node['path']) - 1:  # 减1是因为path中的最后一个是当前节点
-                        parent_title = node['path'][i-1]
-                        cell = ws.cell(row=current_row, column=i, value=parent_title)
-                        
-                        # 设置样式
-                        parent_level_color = self.level_colors.get(i, 'FFFFFF')
-                        cell.fill = PatternFill(start_color=parent_level_color, end_color=parent_level_color, fill_type='solid')
+                        # 设置边框和对齐方式
                         cell.alignment = Alignment(vertical='center', wrap_text=True)
                         cell.border = Border(
                             left=Side(style='thin', color='D4D4D4'),
@@ -279,43 +295,61 @@ class XMindToExcelConverter:
                             top=Side(style='thin', color='D4D4D4'),
                             bottom=Side(style='thin', color='D4D4D4')
                         )
+                    elif i < level:
+                        # 从路径中获取上级节点标题
+                        if i-1 < len(node['path']) - 1:  # 减1是因为path中的最后一个是当前节点
+                            parent_title = node['path'][i-1]
+                            cell = ws.cell(row=current_row, column=i, value=parent_title)
+                        
+                            # 设置样式
+                            parent_level_color = self.level_colors.get(i, 'FFFFFF')
+                            cell.fill = PatternFill(start_color=parent_level_color, end_color=parent_level_color, fill_type='solid')
+                            cell.alignment = Alignment(vertical='center', wrap_text=True)
+                            cell.border = Border(
+                                left=Side(style='thin', color='D4D4D4'),
+                                right=Side(style='thin', color='D4D4D4'),
+                                top=Side(style='thin', color='D4D4D4'),
+                                bottom=Side(style='thin', color='D4D4D4')
+                            )
             
-            # 写入其他业务列
-            business_columns = {
-                6: self._get_service_api(node),           # 端/API/服务
-                7: "",                                    # 冒烟结果
-                8: "",                                    # 研发对应负责人
-                9: "",                                    # showcase问题
-                10: "是" if self._is_core_function(node) else "否",  # 是否核心功能
-                11: "是" if self._affects_main_flow(node) else "否",  # 是否影响主流程
-                12: "< 2分钟"                             # 执行时间
-            }
+                # 写入其他业务列
+                business_columns = {
+                    6: self._get_service_api(node),           # 端/API/服务
+                    7: "",                                    # 冒烟结果
+                    8: "",                                    # 研发对应负责人
+                    9: "",                                    # showcase问题
+                    10: "是" if self._is_core_function(node) else "否",  # 是否核心功能
+                    11: "是" if self._affects_main_flow(node) else "否",  # 是否影响主流程
+                    12: "< 2分钟"                             # 执行时间
+                }
             
-            for col, value in business_columns.items():
-                cell = ws.cell(row=current_row, column=col, value=value)
-                cell.fill = PatternFill(start_color=self.business_column_color, end_color=self.business_column_color, fill_type='solid')
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
-                cell.border = Border(
-                    left=Side(style='thin', color='D4D4D4'),
-                    right=Side(style='thin', color='D4D4D4'),
-                    top=Side(style='thin', color='D4D4D4'),
-                    bottom=Side(style='thin', color='D4D4D4')
-                )
+                for col, value in business_columns.items():
+                    cell = ws.cell(row=current_row, column=col, value=value)
+                    cell.fill = PatternFill(start_color=self.business_column_color, end_color=self.business_column_color, fill_type='solid')
+                    cell.alignment = Alignment(vertical='center', wrap_text=True)
+                    cell.border = Border(
+                        left=Side(style='thin', color='D4D4D4'),
+                        right=Side(style='thin', color='D4D4D4'),
+                        top=Side(style='thin', color='D4D4D4'),
+                        bottom=Side(style='thin', color='D4D4D4')
+                    )
             
-            # 记录每行的节点信息
-            row_mappings[current_row] = {
-                'node': node,
-                'path': node['path'],
-                'level': level
-            }
+                # 记录每行的节点信息
+                row_mappings[current_row] = {
+                    'node': node,
+                    'path': node['path'],
+                    'level': level
+                }
             
-            current_row += 1
+                current_row += 1
         
         # 应用增强的单元格合并
         self._apply_enhanced_merges(ws, row_mappings)
         
         return current_row
     
+    @timed_stage('merge_cells', 'openpyxl')
+    @traced()
     def _apply_enhanced_merges(self, ws, row_mappings):
         """
         增强版单元格合并算法 - 更精确地识别和合并路径单元格
@@ -338,6 +372,7 @@ class XMindToExcelConverter:
             self._merge_cells_at_level(ws, path_tree[level], level)
         
         logger.info("✅ 单元格合并处理完成")
+        set_attributes(rows=len(row_mappings), merges=len(ws.merged_cells.ranges))
 
     def _build_path_tree(self, row_mappings) -> Dict:
         """
@@ -505,12 +540,8 @@ class XMindToExcelConverter:
     
     def _is_core_function(self, node: Dict) -> bool:
         """判断节点是否为核心功能"""
-        # 根据标识符和标题判断
-        markers = node.get('markers', [])
-        
-        # 核心功能的标识符
-        core_markers = ['important', 'priority-1', 'flag-red', 'star-red']
-        if any(marker in core_markers for marker in markers):
+        # 根据标识符和标题判断（核心功能标识符的位序号固定，一次按位与）
+        if node.get('marker_mask', 0) & CORE_MARKER_MASK:
             return True
         
         # 从标题判断